@@ -0,0 +1,143 @@
+"""Local verification of access tokens issued by the authentication service (main.py).
+
+The service publishes its public signing keys at /.well-known/jwks.json. Other
+services fetch that document once, cache the keys by ``kid`` and verify tokens
+in-process, so authenticating a request never needs a call back to main.py.
+The occasional refetch runs on a worker thread, so a slow or unreachable auth
+service never stalls the event loop.
+
+Revocations reach the verifier the same way: it polls the auth service's
+/tokens/revoked list every ``REVOCATION_REFRESH_SECONDS`` and rejects tokens
+whose ``jti`` is on it. A revoked token is therefore refused here within that
+interval, not instantly. If the list cannot be fetched, the last copy is kept.
+
+Every service maps a bearer token to a user the same way (``authenticate()``):
+``mock_token_<id>`` names one of the service's own fixture users, and an auth
+service JWT names the account in its ``sub`` claim. What that user may do is
+decided by the service's own records: instructor endpoints require the id to
+be a registered instructor, and an auth-service account without a record gets
+the service's defaults.
+"""
+import asyncio
+import json
+import os
+import time
+import urllib.request
+from typing import Any, Container, Dict, Optional
+
+from jose import JWTError, jwk, jwt
+
+# Configuration
+AUTH_JWKS_URL = os.getenv("AUTH_JWKS_URL", "http://localhost:8000/.well-known/jwks.json")
+AUTH_REVOKED_URL = os.getenv("AUTH_REVOKED_URL", "http://localhost:8000/tokens/revoked")
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "5"))
+JWKS_CACHE_SECONDS = int(os.getenv("JWKS_CACHE_SECONDS", "3600"))
+JWKS_MIN_REFRESH_SECONDS = int(os.getenv("JWKS_MIN_REFRESH_SECONDS", "30"))
+JWKS_FETCH_TIMEOUT_SECONDS = 5
+SUPPORTED_ALGORITHMS = ["RS256"]
+
+class TokenVerifier:
+    """Verifies JWTs against a cached copy of the auth service's JWKS"""
+
+    def __init__(
+        self,
+        jwks_url: str,
+        revoked_url: str,
+        cache_seconds: int = JWKS_CACHE_SECONDS,
+        min_refresh_seconds: int = JWKS_MIN_REFRESH_SECONDS,
+        revocation_refresh_seconds: float = REVOCATION_REFRESH_SECONDS,
+    ):
+        self.jwks_url = jwks_url
+        self.revoked_url = revoked_url
+        self.cache_seconds = cache_seconds
+        self.min_refresh_seconds = min_refresh_seconds
+        self.revocation_refresh_seconds = revocation_refresh_seconds
+        self.keys: Dict[str, Any] = {}
+        self.fetched_at: Optional[float] = None
+        self.lock = asyncio.Lock()
+        # Revoked jti -> expiry (unix time), as last published by the auth service
+        self.revoked: Dict[str, float] = {}
+        self.revoked_fetched_at: Optional[float] = None
+        self.revoked_lock = asyncio.Lock()
+
+    def _refresh_keys(self) -> None:
+        with urllib.request.urlopen(self.jwks_url, timeout=JWKS_FETCH_TIMEOUT_SECONDS) as response:
+            document = json.load(response)
+        self.keys = {
+            key_data["kid"]: jwk.construct(key_data, key_data.get("alg", SUPPORTED_ALGORITHMS[0]))
+            for key_data in document.get("keys", [])
+            if key_data.get("alg", SUPPORTED_ALGORITHMS[0]) in SUPPORTED_ALGORITHMS
+        }
+
+    async def get_key(self, kid: Optional[str]) -> Any:
+        """Return the key for ``kid``, refetching the JWKS when it is stale or the kid is unknown"""
+        key = self.keys.get(kid)
+        stale = self.fetched_at is None or time.monotonic() - self.fetched_at > self.cache_seconds
+        if key is not None and (not stale or self.lock.locked()):
+            # A cached key is served while another request refetches
+            return key
+
+        async with self.lock:
+            now = time.monotonic()
+            # Rate-limit refetches so unknown kids cannot turn into a request flood
+            if self.fetched_at is None or now - self.fetched_at >= self.min_refresh_seconds:
+                try:
+                    await asyncio.to_thread(self._refresh_keys)
+                except (OSError, ValueError, KeyError) as exc:
+                    if key is None:
+                        raise JWTError(f"Unable to fetch signing keys: {exc}")
+                finally:
+                    self.fetched_at = now
+        return self.keys.get(kid)
+
+    def _refresh_revoked(self) -> None:
+        with urllib.request.urlopen(self.revoked_url, timeout=JWKS_FETCH_TIMEOUT_SECONDS) as response:
+            document = json.load(response)
+        self.revoked = {jti: float(expires_at) for jti, expires_at in document["revoked"].items()}
+
+    async def refresh_revoked(self) -> None:
+        """Refetch the revocation list when it is older than the refresh interval"""
+        fetched_at = self.revoked_fetched_at
+        if self.revoked_lock.locked() or (
+            fetched_at is not None and time.monotonic() - fetched_at < self.revocation_refresh_seconds
+        ):
+            return
+
+        async with self.revoked_lock:
+            try:
+                await asyncio.to_thread(self._refresh_revoked)
+            except (OSError, ValueError, KeyError, AttributeError):
+                # Keep the last list; an unreachable auth service must not lock everyone out
+                pass
+            finally:
+                self.revoked_fetched_at = time.monotonic()
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """Verify a token's signature, expiry and revocation, returning its claims"""
+        header = jwt.get_unverified_header(token)
+        key = await self.get_key(header.get("kid"))
+        if key is None:
+            raise JWTError("Unknown signing key")
+        claims = jwt.decode(token, key, algorithms=SUPPORTED_ALGORITHMS)
+        if claims.get("type") == "refresh":
+            raise JWTError("Refresh tokens cannot be used as access tokens")
+        await self.refresh_revoked()
+        if claims.get("jti") in self.revoked:
+            raise JWTError("Token has been revoked")
+        return claims
+
+token_verifier = TokenVerifier(AUTH_JWKS_URL, AUTH_REVOKED_URL)
+
+MOCK_TOKEN_PREFIX = "mock_token_"
+
+async def authenticate(token: str, mock_user_ids: Container[str]) -> str:
+    """The user id a bearer token names: a mock token's id if it is in ``mock_user_ids``, else a JWT's ``sub``"""
+    if token.startswith(MOCK_TOKEN_PREFIX):
+        user_id = token[len(MOCK_TOKEN_PREFIX):]
+        if user_id not in mock_user_ids:
+            raise JWTError("Unknown mock user")
+        return user_id
+    user_id = (await token_verifier.verify(token)).get("sub")
+    if not user_id:
+        raise JWTError("Token has no subject")
+    return user_id
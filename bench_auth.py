@@ -0,0 +1,230 @@
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import httpx
+import uvicorn
+from fastapi.security import HTTPAuthorizationCredentials
+
+import main
+import oauth_provider_stub
+from oauth_verifier import HTTPOAuthVerifier, OAuthProvider
+from user_store import InMemoryUserStore, SQLiteUserStore
+
+# Sizes of the user table to benchmark against
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+BENCH_PASSWORD = "benchmark-password"
+# Rows per add_many() call while populating
+POPULATE_BATCH_SIZE = 10_000
+
+def populate_users(loop, store, count: int):
+    """Fill a store with synthetic accounts sharing one low-cost hash"""
+    main.user_store = store
+
+    # A single rounds=4 hash keeps setup fast and makes the lookup cost visible
+    hashed_password = main.pwd_context.hash(BENCH_PASSWORD, rounds=4)
+    created_at = datetime.utcnow()
+    for start in range(0, count, POPULATE_BATCH_SIZE):
+        batch = [
+            {
+                "id": str(uuid.uuid4()),
+                "email": f"user{i}@example.com",
+                "full_name": f"User {i}",
+                "hashed_password": hashed_password,
+                "is_verified": False,
+                "two_fa_enabled": False,
+                "created_at": created_at,
+                "oauth_provider": None
+            }
+            for i in range(start, min(start + POPULATE_BATCH_SIZE, count))
+        ]
+        loop.run_until_complete(store.add_many(batch))
+
+def linear_scan_lookup(store: InMemoryUserStore, email: str):
+    """The original O(n) lookup, kept for comparison"""
+    for user_id, user_data in store.users.items():
+        if user_data["email"] == email:
+            return {"id": user_id, **user_data}
+    return None
+
+def time_per_call(func, iterations: int) -> float:
+    """Return average milliseconds per call"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) * 1000 / iterations
+
+def bench_login_latency(loop, count: int):
+    print(f"\nUsers: {count:,}")
+    main.configure_password_hashing(4, source="benchmark")
+    store = InMemoryUserStore()
+    populate_users(loop, store, count)
+
+    # Worst case for the linear scan: the most recently registered user
+    email = f"user{count - 1}@example.com"
+
+    scan_ms = time_per_call(lambda: linear_scan_lookup(store, email), 5)
+    index_ms = time_per_call(lambda: loop.run_until_complete(store.get_by_email(email)), 10_000)
+    login_ms = time_per_call(lambda: loop.run_until_complete(main.authenticate_user(email, BENCH_PASSWORD)), 200)
+
+    print(f"  linear scan lookup:  {scan_ms:10.4f} ms")
+    print(f"  indexed lookup:      {index_ms:10.4f} ms")
+    print(f"  login (rounds=4):    {login_ms:10.4f} ms")
+
+def bench_authenticated_requests(loop, iterations: int = 20_000):
+    """Throughput of get_current_user + /profile with and without the claims cache"""
+    print("\nAuthenticated request throughput")
+    store = InMemoryUserStore()
+    populate_users(loop, store, 1)
+    user_id = next(iter(store.users))
+    token = main.create_access_token(data={"sub": user_id}, expires_delta=timedelta(minutes=30))
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+    async def run_requests():
+        for _ in range(iterations):
+            current_user = await main.get_current_user(credentials)
+            await main.get_profile(current_user)
+
+    original_size = main.token_claims_cache.max_size
+    for label, cache_size in (("without cache", 0), ("with cache", original_size)):
+        main.token_claims_cache = main.TokenClaimsCache(cache_size)
+        start = time.perf_counter()
+        loop.run_until_complete(run_requests())
+        elapsed = time.perf_counter() - start
+        stats = main.token_claims_cache.stats()
+        print(f"  {label:<14} {iterations / elapsed:10.0f} req/s   hit rate {stats['hit_rate']:.2%}")
+    main.token_claims_cache = main.TokenClaimsCache(original_size)
+
+def bench_store_backends(loop, requests: int = 2_000, concurrency: int = 32):
+    """Signup and login throughput for each storage backend (bcrypt at rounds=4)"""
+    print("\nSignup/login throughput by storage backend")
+    main.configure_password_hashing(4, source="benchmark")
+
+    async def run_batches(make_request):
+        for start in range(0, requests, concurrency):
+            await asyncio.gather(*[make_request(i) for i in range(start, min(start + concurrency, requests))])
+
+    async def signup(i):
+        await main.signup(main.UserSignup(email=f"bench{i}@example.com", password=BENCH_PASSWORD, full_name="Bench"))
+
+    async def login(i):
+        await main.login(main.UserLogin(email=f"bench{i}@example.com", password=BENCH_PASSWORD))
+
+    with tempfile.TemporaryDirectory() as directory:
+        for store in (InMemoryUserStore(), SQLiteUserStore(os.path.join(directory, "bench_users.db"))):
+            main.user_store = store
+            results = []
+            for make_request in (signup, login):
+                start = time.perf_counter()
+                loop.run_until_complete(run_batches(make_request))
+                results.append(requests / (time.perf_counter() - start))
+            loop.run_until_complete(store.close())
+            print(f"  {store.name:<8} signup {results[0]:8.0f} req/s   login {results[1]:8.0f} req/s")
+
+def bench_bulk_import(loop, rows: int = 2_000):
+    """Bulk import throughput by number of hashing processes (bcrypt at rounds=4)"""
+    print("\nBulk import throughput by hashing processes")
+    main.configure_password_hashing(4, source="benchmark")
+    lines = [b"email,password,full_name\n"]
+    lines += [f"import{i}@example.com,{BENCH_PASSWORD},Import {i}\n".encode() for i in range(rows)]
+
+    class StreamedRequest:
+        headers = {"content-type": "text/csv"}
+
+        async def stream(self):
+            for line in lines:
+                yield line
+
+    for processes in sorted({1, 2, 4, os.cpu_count() or 1}):
+        main.user_store = InMemoryUserStore()
+        main.IMPORT_HASH_PROCESSES = processes
+        main.import_hash_pool = None
+        start = time.perf_counter()
+        result = loop.run_until_complete(main.import_users(StreamedRequest()))
+        elapsed = time.perf_counter() - start
+        main.import_hash_pool.shutdown()
+        print(f"  {processes:>2} processes   {result['created'] / elapsed:8.0f} rows/s")
+
+class PerRequestClientVerifier(HTTPOAuthVerifier):
+    """The naive approach: a fresh HTTP client, and so a fresh connection, per verification"""
+
+    async def fetch_identity(self, provider, access_token):
+        self.provider_calls += 1
+        async with httpx.AsyncClient() as client:
+            response = await client.get(
+                provider.tokeninfo_url,
+                params={**provider.params, "access_token": access_token},
+                timeout=provider.timeout_seconds
+            )
+        return self.parse_identity(provider, response)
+
+def start_oauth_provider_stub(port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(oauth_provider_stub.app, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+def bench_oauth_verification(loop, requests: int = 1_000, distinct_tokens: int = 100, concurrency: int = 32, port: int = 8010):
+    """/oauth throughput against the local provider stub, by verifier strategy"""
+    print(f"\n/oauth throughput ({requests} logins, {distinct_tokens} distinct tokens, "
+          f"stub latency {oauth_provider_stub.STUB_LATENCY_MS:.0f} ms)")
+    server = start_oauth_provider_stub(port)
+    providers = {"google": OAuthProvider(
+        "google", f"http://127.0.0.1:{port}/google/tokeninfo", 2.0,
+        client_id=oauth_provider_stub.STUB_CLIENT_ID, audience_fields=("aud", "azp"),
+    )}
+
+    tokens = []
+    with httpx.Client() as client:
+        for i in range(distinct_tokens):
+            email = f"oauth{i}@example.com"
+            response = client.post(f"http://127.0.0.1:{port}/tokens", json={"provider": "google", "email": email})
+            tokens.append((email, response.json()["access_token"]))
+
+    async def run_logins():
+        for start in range(0, requests, concurrency):
+            await asyncio.gather(*[
+                main.oauth_login(main.OAuthRequest(
+                    provider="google", access_token=tokens[i % distinct_tokens][1],
+                    email=tokens[i % distinct_tokens][0], full_name="OAuth Bench"
+                ))
+                for i in range(start, min(start + concurrency, requests))
+            ])
+
+    original_verifier = main.oauth_verifier
+    strategies = (
+        ("client per request", PerRequestClientVerifier(providers, cache_size=0)),
+        ("pooled client", HTTPOAuthVerifier(providers, cache_size=0)),
+        ("pooled + cache", HTTPOAuthVerifier(providers)),
+    )
+    for label, verifier in strategies:
+        main.user_store = InMemoryUserStore()
+        main.oauth_verifier = verifier
+        start = time.perf_counter()
+        loop.run_until_complete(run_logins())
+        elapsed = time.perf_counter() - start
+        loop.run_until_complete(verifier.close())
+        print(f"  {label:<20} {requests / elapsed:8.0f} req/s   provider calls {verifier.provider_calls}")
+    main.oauth_verifier = original_verifier
+    server.should_exit = True
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+
+    loop = asyncio.new_event_loop()
+
+    print("Authentication Service Benchmarks")
+    print("=" * 50)
+    for size in sizes:
+        bench_login_latency(loop, size)
+
+    bench_authenticated_requests(loop)
+    bench_store_backends(loop)
+    bench_bulk_import(loop)
+    bench_oauth_verification(loop)
@@ -0,0 +1,165 @@
+import asyncio
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from durable_store import DurableStore
+
+DEFAULT_RECORD_COUNT = 1_000_000
+TAIL_FRACTION = 0.1
+
+def review(i: int) -> dict:
+    """A record shaped like the reviews service's, about 300 bytes pickled"""
+    created_at = datetime(2024, 1, 1) + timedelta(seconds=i)
+    return {
+        "review_id": f"review_{i:08d}",
+        "course_id": f"course_{i % 5000:05d}",
+        "user_id": f"user_{i % 200_000:06d}",
+        "user_name": f"Learner {i % 200_000}",
+        "user_avatar": None,
+        "rating": i % 5 + 1,
+        "comment": "Clear explanations and well paced lessons, the projects were the best part of the course.",
+        "helpful_count": i % 17,
+        "created_at": created_at,
+        "updated_at": created_at,
+    }
+
+def store_bytes(data_dir: str, store_name: str) -> int:
+    """Size of a store's snapshot and log segments"""
+    return sum(
+        os.path.getsize(os.path.join(data_dir, filename)) for filename in os.listdir(data_dir)
+        if filename.startswith(f"{store_name}.")
+    )
+
+def bench_write_overhead(data_dir: str, writes: int = 200_000):
+    """Cost a put() adds to a request, on top of the dict assignment it accompanies"""
+    print(f"\nPer-write overhead ({writes:,} writes)")
+    records = [review(i) for i in range(writes)]
+    plain = {}
+    start = time.perf_counter()
+    for record in records:
+        plain[record["review_id"]] = record
+    dict_us = (time.perf_counter() - start) / writes * 1e6
+
+    reviews = {}
+    store = DurableStore("overhead", {"reviews": reviews}, data_dir)
+    store.load()
+    start = time.perf_counter()
+    for record in records:
+        reviews[record["review_id"]] = record
+        store.put("reviews", record["review_id"], record)
+    put_us = (time.perf_counter() - start) / writes * 1e6
+    store.close()
+    print(f"  dict assignment      {dict_us:6.2f} us")
+    print(f"  + durable put()      {put_us:6.2f} us   (encode and queue; the writer thread does the I/O)")
+
+def bench_acknowledged_writes(data_dir: str, writers_options=(1, 16, 64), seconds: float = 3.0):
+    """Writes per second when every write waits for its commit, as requests behind StoreMiddleware do"""
+    print(f"\nAcknowledged writes (put, then wait until durable)")
+    for fsync in (True, False):
+        for writers in writers_options:
+            reviews = {}
+            store = DurableStore(f"ack-{fsync}-{writers}", {"reviews": reviews}, data_dir, fsync=fsync)
+            store.load()
+            done = 0
+
+            async def writer(worker: int):
+                nonlocal done
+                i = 0
+                deadline = time.perf_counter() + seconds
+                while time.perf_counter() < deadline:
+                    record = review(worker * 10_000_000 + i)
+                    reviews[record["review_id"]] = record
+                    store.put("reviews", record["review_id"], record)
+                    await store.sync()
+                    done += 1
+                    i += 1
+
+            async def run():
+                await asyncio.gather(*(writer(worker) for worker in range(writers)))
+
+            start = time.perf_counter()
+            asyncio.run(run())
+            elapsed = time.perf_counter() - start
+            stats = store.stats()
+            store.close()
+            print(f"  fsync={'on ' if fsync else 'off'} {writers:>3} writers   {done / elapsed:9,.0f} writes/s   "
+                  f"{stats['records_per_commit']:7.1f} records per commit")
+
+def bench_restart(data_dir: str, count: int):
+    """Restart time at ``count`` records: snapshot plus log tail vs replaying the whole log"""
+    tail = int(count * TAIL_FRACTION)
+    print(f"\nRestart with {count:,} records (snapshot plus a {tail:,}-write log tail)")
+
+    reviews = {}
+    store = DurableStore("restart", {"reviews": reviews}, data_dir, snapshot_wal_bytes=1 << 40)
+    store.load()
+    start = time.perf_counter()
+    for i in range(count):
+        record = review(i)
+        reviews[record["review_id"]] = record
+        store.put("reviews", record["review_id"], record)
+    queued = time.perf_counter() - start
+    start = time.perf_counter()
+    store.snapshot()
+    snapshot_seconds = time.perf_counter() - start
+    for i in range(0, count, max(count // tail, 1)):
+        record = reviews[f"review_{i:08d}"]
+        record["helpful_count"] += 1
+        store.put("reviews", record["review_id"], record)
+    store.close()
+    print(f"  write {count:,} records    {queued:7.2f} s   ({count / queued:,.0f} puts/s)")
+    print(f"  snapshot                {snapshot_seconds:7.2f} s   {store.stats()['snapshot_bytes'] / 1e6:7.1f} MB")
+    expected = len(reviews)
+    snapshot_layout_bytes = store_bytes(data_dir, "restart")
+    del reviews
+    gc.collect()
+
+    restored = {}
+    start = time.perf_counter()
+    restarted = DurableStore("restart", {"reviews": restored}, data_dir)
+    restarted.load()
+    restart_seconds = time.perf_counter() - start
+    restarted.close()
+    assert len(restored) == expected
+    print(f"  restart from snapshot   {restart_seconds:7.2f} s   {snapshot_layout_bytes / 1e6:7.1f} MB on disk   "
+          f"(replayed {restarted.replayed_records:,} log records)")
+    del restored
+    gc.collect()
+
+    # The same data with no snapshot: every write has to be replayed
+    reviews = {}
+    store = DurableStore("log-only", {"reviews": reviews}, data_dir, snapshot_wal_bytes=1 << 40)
+    store.load()
+    for i in range(count):
+        record = review(i)
+        store.put("reviews", record["review_id"], record)
+    for i in range(0, count, max(count // tail, 1)):
+        store.put("reviews", f"review_{i:08d}", review(i))
+    store.close()
+    log_layout_bytes = store_bytes(data_dir, "log-only")
+    restored = {}
+    start = time.perf_counter()
+    replayed = DurableStore("log-only", {"reviews": restored}, data_dir)
+    replayed.load()
+    replay_seconds = time.perf_counter() - start
+    replayed.close()
+    print(f"  restart from log only   {replay_seconds:7.2f} s   {log_layout_bytes / 1e6:7.1f} MB on disk   "
+          f"(replayed {replayed.replayed_records:,} log records)")
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_RECORD_COUNT
+    data_dir = tempfile.mkdtemp(prefix="bench_durable_store_")
+
+    print("Durable Store Benchmarks")
+    print("=" * 50)
+    try:
+        bench_write_overhead(data_dir)
+        bench_acknowledged_writes(data_dir)
+        bench_restart(data_dir, count)
+    finally:
+        shutil.rmtree(data_dir)
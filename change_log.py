@@ -0,0 +1,151 @@
+"""Sequence-numbered change feed that downstream caches follow instead of re-fetching.
+
+Every write appends an entry carrying a new sequence number and the entity's
+pre-encoded JSON. Followers ask for everything after the last sequence they
+applied and long-poll when they are caught up.
+
+The buffer is bounded. When it fills up it is first compacted: entries
+superseded by a newer entry for the same entity are dropped, which leaves a
+follower's end state unchanged. If that does not free enough room, the oldest
+entries are truncated, and followers that had not read past them are told to
+reset, i.e. reload the full collection and continue from the current sequence.
+
+A service with several workers numbers entries by their position in the
+shared change list instead (see ``restart``), so a follower can move between
+workers without a reset.
+"""
+import asyncio
+import json
+import os
+import uuid
+from bisect import bisect_right
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# Entries kept before the change log compacts and truncates
+CHANGE_LOG_SIZE = int(os.getenv("CHANGE_LOG_SIZE", "10000"))
+
+class ChangeLog:
+    """Append-only change entries for one kind of entity, with long-poll wake-ups"""
+
+    def __init__(self, name: str, id_field: str, body_field: str, max_entries: int = CHANGE_LOG_SIZE):
+        self.name = name
+        self.id_field = id_field
+        self.body_field = body_field
+        self.max_entries = max(max_entries, 4)
+        # Sequence numbers restart with the process, so followers check the epoch too
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        # Parallel lists in sequence order: seqs for bisecting, entries as (entity id, encoded JSON)
+        self.seqs: List[int] = []
+        self.entries: List[Tuple[str, bytes]] = []
+        # entity id -> sequence of its newest entry still in the buffer
+        self.newest: Dict[str, int] = {}
+        # Entries up to this sequence may have been dropped without a newer replacement
+        self.truncated_seq = 0
+        self.changed = asyncio.Event()
+        self.waiting = 0
+        self.appended = 0
+        self.compactions = 0
+        self.compacted = 0
+        self.truncated = 0
+        self.resets = 0
+
+    def append(self, entity_id: str, op: str, body: Optional[bytes] = None, seq: Optional[int] = None) -> int:
+        """Record a change to an entity; ``body`` is its JSON after the change, None when deleted.
+
+        ``seq`` numbers the entry from an outside sequence (it must be above the
+        current one); by default it is the next number.
+        """
+        if len(self.seqs) >= self.max_entries:
+            self.compact()
+        self.seq = self.seq + 1 if seq is None else seq
+        head = json.dumps(
+            {"seq": self.seq, "op": op, self.id_field: entity_id, "at": datetime.utcnow().isoformat()},
+            separators=(",", ":"),
+        )[:-1].encode()
+        if body is not None:
+            head += b',"' + self.body_field.encode() + b'":' + body
+        self.seqs.append(self.seq)
+        self.entries.append((entity_id, head + b"}"))
+        self.newest[entity_id] = self.seq
+        self.appended += 1
+        self.wake()
+        return self.seq
+
+    def restart(self, epoch: str, seq: int):
+        """Continue at ``seq`` of the sequence ``epoch``, e.g. after rejoining a shared change list.
+
+        Entries up to ``seq`` are no longer available, so followers behind it reset.
+        """
+        self.epoch = epoch
+        self.seq = seq
+        self.seqs = []
+        self.entries = []
+        self.newest = {}
+        self.truncated_seq = seq
+        self.wake()
+
+    def wake(self):
+        if self.waiting:
+            # Wake every pending long-poll; later waiters get a fresh event
+            self.changed.set()
+            self.changed = asyncio.Event()
+
+    def compact(self):
+        """Drop superseded entries, then truncate the oldest if the buffer is still over three-quarters full"""
+        newest = self.newest
+        kept = [index for index, (entity_id, _) in enumerate(self.entries) if newest[entity_id] == self.seqs[index]]
+        self.compactions += 1
+        self.compacted += len(self.seqs) - len(kept)
+        # Leave a quarter of the buffer free so compaction runs at most once per max_entries / 4 appends
+        excess = len(kept) - (self.max_entries - self.max_entries // 4)
+        if excess > 0:
+            for index in kept[:excess]:
+                del newest[self.entries[index][0]]
+            self.truncated_seq = self.seqs[kept[excess - 1]]
+            self.truncated += excess
+            kept = kept[excess:]
+        self.seqs = [self.seqs[index] for index in kept]
+        self.entries = [self.entries[index] for index in kept]
+
+    def is_stale(self, since: int, epoch: Optional[str] = None) -> bool:
+        """Whether a follower at ``since`` may have missed entries and has to reset"""
+        return (epoch is not None and epoch != self.epoch) or since < self.truncated_seq or since > self.seq
+
+    def read(self, since: int, limit: int) -> Tuple[List[bytes], int, bool]:
+        """Encoded entries after ``since`` (at most ``limit``), the sequence to resume from, and whether more remain"""
+        start = bisect_right(self.seqs, since)
+        end = min(start + limit, len(self.seqs))
+        if start == end:
+            return [], since, False
+        fragments = [body for _, body in self.entries[start:end]]
+        return fragments, self.seqs[end - 1], end < len(self.seqs)
+
+    async def wait(self, since: int, timeout: float):
+        """Return once there are entries after ``since``, or after ``timeout`` seconds"""
+        if self.seq > since or timeout <= 0:
+            return
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.waiting -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "epoch": self.epoch,
+            "latest_seq": self.seq,
+            "entries": len(self.seqs),
+            "max_entries": self.max_entries,
+            "oldest_seq": self.seqs[0] if self.seqs else self.seq,
+            "truncated_seq": self.truncated_seq,
+            "appended": self.appended,
+            "compactions": self.compactions,
+            "compacted": self.compacted,
+            "truncated": self.truncated,
+            "resets": self.resets,
+            "waiting": self.waiting,
+        }
@@ -0,0 +1,61 @@
+"""Content-based ETags and conditional GET handling shared by the services.
+
+Each service keeps an ``EntityVersions`` per polled resource. An entity's ETag
+is a digest of the data its response is built from, so every worker - and
+every restart - hands out the same tag for the same content. The digest is
+cached until the entity changes (``bump()``, called from the store watchers on
+every worker), so read endpoints check ``If-None-Match`` against it before
+building a response, and an unchanged resource costs a dictionary lookup and
+an empty ``304 Not Modified``.
+"""
+import hashlib
+import json
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import Response, status
+
+class EntityVersions:
+    """Cached content ETags per entity id, plus hit counters for conditional requests"""
+
+    def __init__(self, name: str, fingerprint: Callable[[str], Any]):
+        self.name = name
+        # The data an entity's response is built from: bytes, or anything json.dumps() can encode
+        self.fingerprint = fingerprint
+        self.etags: Dict[str, str] = {}
+        self.requests = 0
+        self.conditional_requests = 0
+        self.not_modified = 0
+
+    def bump(self, entity_id: str):
+        self.etags.pop(entity_id, None)
+
+    def etag(self, entity_id: str) -> str:
+        etag = self.etags.get(entity_id)
+        if etag is None:
+            content = self.fingerprint(entity_id)
+            if not isinstance(content, bytes):
+                content = json.dumps(content, sort_keys=True, default=str).encode()
+            etag = self.etags[entity_id] = f'W/"{self.name}-{hashlib.blake2b(content, digest_size=8).hexdigest()}"'
+        return etag
+
+    def not_modified_response(self, entity_id: str, if_none_match: Optional[str]) -> Optional[Response]:
+        """A 304 response when the client already holds the current version, otherwise None"""
+        self.requests += 1
+        if not if_none_match:
+            return None
+        self.conditional_requests += 1
+        etag = self.etag(entity_id)
+        # Weak comparison (RFC 9110 13.1.2): ignore the W/ prefix on either side
+        presented = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if "*" in presented or etag.removeprefix("W/") in presented:
+            self.not_modified += 1
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "conditional_requests": self.conditional_requests,
+            "not_modified": self.not_modified,
+            "hit_rate": round(self.not_modified / self.conditional_requests, 4) if self.conditional_requests else 0.0,
+        }
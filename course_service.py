@@ -1,12 +1,40 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, status, Query, Response, Header, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, HttpUrl, ValidationError, field_validator
 from datetime import datetime
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Set, Iterable, Iterator, Callable, Tuple
 from enum import Enum
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, OrderedDict
+from functools import lru_cache
+import asyncio
+import base64
+import binascii
+import heapq
+import itertools
+import json
+import math
+import os
+import re
 import uuid
 
+from auth_verifier import authenticate
+from change_log import ChangeLog
+from conditional_get import EntityVersions
+from durable_store import StoreMiddleware, create_store
+from request_body import iter_body_lines
+from write_behind_counter import WriteBehindCounter
+
+# Listing pages kept by the filtered-list result cache
+COURSE_LIST_CACHE_SIZE = int(os.getenv("COURSE_LIST_CACHE_SIZE", "1024"))
+# Largest batch accepted by the /courses/batch endpoints
+COURSE_BATCH_MAX_ITEMS = int(os.getenv("COURSE_BATCH_MAX_ITEMS", "10000"))
+# How often counted enrollments are written to the course records
+ENROLLMENT_FLUSH_SECONDS = float(os.getenv("ENROLLMENT_FLUSH_SECONDS", "1.0"))
+# Longest a GET /changes long-poll may wait for a new change
+CHANGES_MAX_WAIT_SECONDS = float(os.getenv("CHANGES_MAX_WAIT_SECONDS", "30"))
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Course Management Microservice",
@@ -48,6 +76,15 @@ class CourseStatus(str, Enum):
     PUBLISHED = "published"
     ARCHIVED = "archived"
 
+class SortBy(str, Enum):
+    DATE_OLD = "date_old"
+    DATE_NEW = "date_new"
+    RATING_HIGH = "rating_high"
+    RATING_LOW = "rating_low"
+    POPULAR = "popular"
+    PRICE_LOW = "price_low"
+    PRICE_HIGH = "price_high"
+
 # Pydantic models
 class CourseCreate(BaseModel):
     title: str
@@ -72,6 +109,14 @@ class CourseUpdate(BaseModel):
     learning_objectives: Optional[List[str]] = None
     status: Optional[CourseStatus] = None
 
+    @field_validator("title", "description", "category", "level", "price", "prerequisites", "learning_objectives", "status")
+    @classmethod
+    def reject_null(cls, value):
+        # Leaving a field out keeps its value; only thumbnail_url and duration_hours can be cleared
+        if value is None:
+            raise ValueError("cannot be null")
+        return value
+
 class Course(BaseModel):
     course_id: str
     instructor_id: str
@@ -90,11 +135,44 @@ class Course(BaseModel):
     created_at: datetime
     updated_at: datetime
 
+class CourseSearchResult(Course):
+    score: float
+
+class CourseSearchResponse(BaseModel):
+    query: str
+    total: int
+    courses: List[CourseSearchResult]
+    page: int
+    limit: int
+
 class CourseListResponse(BaseModel):
     total: int
     courses: List[Course]
     page: int
     limit: int
+    next_cursor: Optional[str] = None
+
+class CourseFacetsResponse(BaseModel):
+    total: int
+    facets: Dict[str, Dict[str, int]]
+
+class CourseBatchUpdate(CourseUpdate):
+    course_id: str
+
+class CourseBatchPublish(BaseModel):
+    course_id: str
+
+class CourseBatchItemResult(BaseModel):
+    index: int
+    course_id: Optional[str] = None
+    status: str  # "created", "updated", "published", "valid" or "error"
+    detail: Optional[str] = None
+
+class CourseBatchResponse(BaseModel):
+    applied: bool
+    succeeded: int
+    failed: int
+    results: List[CourseBatchItemResult]
 
 # Mock instructor data for validation
 mock_instructors = {
@@ -104,6 +182,18 @@ mock_instructors = {
     "instructor_004": {"name": "David Wilson", "email": "david@example.com"},
 }
 
+# Mock learner data for validation, the same users as the profile and reviews services
+mock_users = {
+    "user_001": {"name": "Alice Johnson", "email": "alice@example.com"},
+    "user_002": {"name": "Bob Smith", "email": "bob@example.com"},
+    "user_003": {"name": "Carol Davis", "email": "carol@example.com"},
+    "user_004": {"name": "David Wilson", "email": "david@example.com"},
+    "user_005": {"name": "Emma Brown", "email": "emma@example.com"},
+    "user_006": {"name": "Frank Miller", "email": "frank@example.com"},
+    "user_007": {"name": "Grace Lee", "email": "grace@example.com"},
+    "user_008": {"name": "Henry Chen", "email": "henry@example.com"},
+}
+
 # In-memory course storage
 courses_db: Dict[str, Dict[str, Any]] = {
     "course_001": {
@@ -200,9 +290,967 @@ courses_db: Dict[str, Dict[str, Any]] = {
     }
 }
 
+# Enrollment records keyed "<course_id>:<user_id>"
+enrollments_db: Dict[str, Dict[str, Any]] = {}
+
+# Shared between workers under SHARED_STATE_URL, else persisted under DATA_DIR; loaded before the indexes below are built
+course_store = create_store(
+    "courses", {"courses": courses_db, "enrollments": enrollments_db}, enums=[CourseCategory, CourseLevel, CourseStatus]
+)
+course_store.load()
+if course_store.durable or course_store.shared:
+    app.add_middleware(StoreMiddleware, store=course_store)
+
+# Course fields with secondary indexes for list filters
+INDEXED_FIELDS = ("category", "level", "status", "instructor_id")
+# Indexed fields reported by /courses/facets, with every value they can take
+FACET_FIELDS = {"category": CourseCategory, "level": CourseLevel, "status": CourseStatus}
+
+def index_key(value: Any) -> Any:
+    # str enums hash by member name, so index them by their plain value
+    return getattr(value, "value", value)
+
+class SortedView:
+    """Course ids ordered by a sort key, kept sorted as courses change.
+
+    Keys are (value, course_id) tuples held in a list of bounded chunks, the
+    layout sortedcontainers uses: an insert or removal touches one small chunk
+    and a seek is a bisect over the chunk maxima, so both stay O(log n).
+    Courses whose key is None (no value for the field) are left out.
+    """
+
+    CHUNK_SIZE = 1000
+
+    def __init__(self, key_func: Callable[[Dict[str, Any]], tuple]):
+        self.key_func = key_func
+        self.chunks: List[List[tuple]] = []
+        self.maxes: List[tuple] = []
+        self.keys: Dict[str, tuple] = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def key(self, course_id: str) -> tuple:
+        return self.keys[course_id]
+
+    def add(self, course: Dict[str, Any]):
+        course_id = course["course_id"]
+        self.discard(course_id)
+        key = self.key_func(course)
+        if key is None:
+            return
+        self.keys[course_id] = key
+        if not self.chunks:
+            self.chunks.append([key])
+            self.maxes.append(key)
+            return
+        
+        position = min(bisect_left(self.maxes, key), len(self.chunks) - 1)
+        chunk = self.chunks[position]
+        insort(chunk, key)
+        self.maxes[position] = chunk[-1]
+        if len(chunk) > 2 * self.CHUNK_SIZE:
+            self.chunks[position:position + 1] = [chunk[:self.CHUNK_SIZE], chunk[self.CHUNK_SIZE:]]
+            self.maxes[position:position + 1] = [chunk[self.CHUNK_SIZE - 1], chunk[-1]]
+
+    def add_many(self, courses: List[Dict[str, Any]]):
+        """Add or re-key many courses; large batches rebuild the chunks in one merge"""
+        if len(courses) * 8 < len(self.keys):
+            for course in courses:
+                self.add(course)
+            return
+        
+        new_keys = sorted(key for key in map(self.key_func, courses) if key is not None)
+        replaced = {course["course_id"] for course in courses}
+        # Both runs are already sorted, so this sort is a linear merge
+        ordered = sorted(itertools.chain(
+            (key for chunk in self.chunks for key in chunk if key[1] not in replaced), new_keys
+        ))
+        for course_id in replaced:
+            self.keys.pop(course_id, None)
+        self.keys.update((key[1], key) for key in new_keys)
+        self.chunks = [ordered[start:start + self.CHUNK_SIZE] for start in range(0, len(ordered), self.CHUNK_SIZE)]
+        self.maxes = [chunk[-1] for chunk in self.chunks]
+
+    def discard(self, course_id: str):
+        key = self.keys.pop(course_id, None)
+        if key is None:
+            return
+        position = bisect_left(self.maxes, key)
+        chunk = self.chunks[position]
+        del chunk[bisect_left(chunk, key)]
+        if chunk:
+            self.maxes[position] = chunk[-1]
+        else:
+            del self.chunks[position]
+            del self.maxes[position]
+
+    def rank(self, key: tuple) -> int:
+        """Number of keys below ``key``"""
+        position = bisect_left(self.maxes, key)
+        if position == len(self.chunks):
+            return len(self.keys)
+        return sum(len(chunk) for chunk in self.chunks[:position]) + bisect_left(self.chunks[position], key)
+
+    def count_range(self, low: Any = None, high: Any = None) -> int:
+        """Number of keys whose value is within [low, high]; None leaves that side open"""
+        below_high = len(self.keys) if high is None else self.rank((high, MAX_COURSE_ID))
+        below_low = 0 if low is None else self.rank((low,))
+        return max(below_high - below_low, 0)
+
+    def iter_range(self, low: Any = None, high: Any = None) -> Iterator[tuple]:
+        """Keys whose value is within [low, high], in ascending order"""
+        # (low,) sorts before every (low, course_id) key
+        for key in self.iter_from((low,) if low is not None else None):
+            if high is not None and key[0] > high:
+                return
+            yield key
+
+    def iter_from(self, after: Optional[tuple] = None, offset: int = 0, reverse: bool = False) -> Iterator[tuple]:
+        """Keys in order, starting after ``after`` (or at position ``offset``)"""
+        if reverse:
+            yield from self.iter_reversed_from(after, offset)
+            return
+        if after is not None:
+            position = bisect_right(self.maxes, after)
+            if position == len(self.chunks):
+                return
+            start = bisect_right(self.chunks[position], after)
+        else:
+            position = 0
+            while position < len(self.chunks) and offset >= len(self.chunks[position]):
+                offset -= len(self.chunks[position])
+                position += 1
+            start = offset
+        
+        for chunk in self.chunks[position:]:
+            for index in range(start, len(chunk)):
+                yield chunk[index]
+            start = 0
+
+    def iter_reversed_from(self, before: Optional[tuple] = None, offset: int = 0) -> Iterator[tuple]:
+        """Keys in descending order, starting below ``before`` (or ``offset`` from the top)"""
+        if not self.chunks:
+            return
+        if before is not None:
+            position = bisect_left(self.maxes, before)
+            if position == len(self.chunks):
+                position -= 1
+                start = len(self.chunks[position]) - 1
+            else:
+                start = bisect_left(self.chunks[position], before) - 1
+        else:
+            position = len(self.chunks) - 1
+            while position >= 0 and offset >= len(self.chunks[position]):
+                offset -= len(self.chunks[position])
+                position -= 1
+            if position < 0:
+                return
+            start = len(self.chunks[position]) - 1 - offset
+        
+        while position >= 0:
+            chunk = self.chunks[position]
+            for index in range(start, -1, -1):
+                yield chunk[index]
+            position -= 1
+            start = len(self.chunks[position]) - 1 if position >= 0 else 0
+
+def field_sort_key(field: str) -> Callable[[Dict[str, Any]], Optional[tuple]]:
+    def sort_key(course: Dict[str, Any]) -> Optional[tuple]:
+        if course[field] is None:
+            return None
+        return (course[field], course["course_id"])
+    return sort_key
+
+class RangeMatches:
+    """Courses whose ``field`` lies within [low, high], read from its sorted view.
+
+    Supports len(), ``in`` and iteration like a set of course ids, without
+    materializing the range, so the query planner can walk another view and
+    test membership instead.
+    """
+
+    def __init__(self, view: SortedView, low: Any, high: Any):
+        self.view = view
+        self.low = low
+        self.high = high
+        self.count = view.count_range(low, high)
+        # Open bounds as infinities, so membership is two comparisons
+        self.lower = -math.inf if low is None else low
+        self.upper = math.inf if high is None else high
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, course_id: str) -> bool:
+        key = self.view.keys.get(course_id)
+        return key is not None and self.lower <= key[0] <= self.upper
+
+    def __iter__(self) -> Iterator[str]:
+        return (course_id for _, course_id in self.view.iter_range(self.low, self.high))
+
+    def filter(self, course_ids: Iterable[str]) -> Set[str]:
+        """The given course ids that fall within the range"""
+        keys = self.view.keys
+        lower, upper = self.lower, self.upper
+        return {
+            course_id for course_id in course_ids
+            if (key := keys.get(course_id)) is not None and lower <= key[0] <= upper
+        }
+
+    def iter_keys(self, after: Optional[tuple] = None, reverse: bool = False) -> Iterator[tuple]:
+        """The view's keys within the range, in order, starting after ``after``"""
+        if reverse:
+            top = None if self.high is None else (self.high, MAX_COURSE_ID)
+            if top is not None and (after is None or top < after):
+                after = top
+            keys = self.view.iter_from(after, reverse=True)
+            return itertools.takewhile(lambda key: key[0] >= self.lower, keys)
+        bottom = None if self.low is None else (self.low,)
+        if bottom is not None and (after is None or after < bottom):
+            after = bottom
+        return itertools.takewhile(lambda key: key[0] <= self.upper, self.view.iter_from(after))
+
+# Sortable fields and the view order behind each sort option: (field, descending)
+SORTED_FIELDS = ("created_at", "rating", "enrollment_count", "price")
+# Fields filtered by value range; each is backed by a sorted view as well
+RANGE_FIELDS = ("price", "duration_hours")
+# Sorts after every course id, for range bounds on (value, course_id) keys
+MAX_COURSE_ID = "\U0010ffff"
+SORT_ORDERS = {
+    SortBy.DATE_OLD: ("created_at", False),
+    SortBy.DATE_NEW: ("created_at", True),
+    SortBy.RATING_HIGH: ("rating", True),
+    SortBy.RATING_LOW: ("rating", False),
+    SortBy.POPULAR: ("enrollment_count", True),
+    SortBy.PRICE_LOW: ("price", False),
+    SortBy.PRICE_HIGH: ("price", True),
+}
+
+# Full-text search
+SEARCH_FIELDS = ("title", "description", "prerequisites", "learning_objectives")
+# Title terms count this many times, so a match in the title outranks one in the body
+TITLE_BOOST = 2
+BM25_K1 = 1.2
+BM25_B = 0.75
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "into",
+    "is", "it", "no", "of", "on", "or", "the", "to", "with", "you", "your"
+}
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STEM_SUFFIXES = ("ations", "ation", "ments", "ment", "ness", "ings", "ing", "ers", "er", "ed", "es", "ly", "s")
+
+@lru_cache(maxsize=100_000)
+def stem(word: str) -> str:
+    """Light suffix-stripping stemmer: "courses", "course" -> "cours"; "programming" -> "program" """
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    for suffix in STEM_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            if suffix == "s" and word.endswith("ss"):
+                return word
+            word = word[:-len(suffix)]
+            # "running" -> "runn" -> "run"
+            if len(word) > 3 and word[-1] == word[-2] and word[-1] not in "lsz":
+                word = word[:-1]
+            return word
+    return word[:-1] if word.endswith("e") and len(word) > 4 else word
+
+def tokenize(text: str) -> List[str]:
+    return [stem(token) for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def course_terms(course: Dict[str, Any]) -> Counter:
+    """Term frequencies of a course's searchable text"""
+    terms = Counter()
+    for field in SEARCH_FIELDS:
+        value = course.get(field) or ""
+        text = " ".join(value) if isinstance(value, list) else value
+        field_terms = tokenize(text)
+        for _ in range(TITLE_BOOST if field == "title" else 1):
+            terms.update(field_terms)
+    return terms
+
+class SearchIndex:
+    """Inverted index over course text, ranked with BM25"""
+
+    def __init__(self):
+        # term -> {course_id: term frequency}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_terms: Dict[str, Counter] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+    def add(self, course: Dict[str, Any]):
+        course_id = course["course_id"]
+        self.remove(course_id)
+        terms = course_terms(course)
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[course_id] = frequency
+        self.doc_terms[course_id] = terms
+        length = sum(terms.values())
+        self.doc_lengths[course_id] = length
+        self.total_length += length
+
+    def remove(self, course_id: str):
+        terms = self.doc_terms.pop(course_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self.postings[term]
+            del postings[course_id]
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(course_id)
+
+    def search(self, query: str, candidates: Optional[Set[str]] = None, top: int = 10) -> Tuple[List[Tuple[str, float]], int]:
+        """Best ``top`` (course_id, score) pairs for the query, and the number of matching courses.
+
+        Only courses in ``candidates`` are scored when it is given. Terms are
+        scored rarest first; once no course outside the running top ``top`` could
+        catch up on the remaining terms alone (their BM25 upper bound is below the
+        current cut-off), those terms only update courses already scored.
+        """
+        doc_count = len(self.doc_lengths)
+        term_postings = [self.postings[term] for term in set(tokenize(query)) if term in self.postings]
+        if not term_postings:
+            return [], 0
+        
+        # Matching courses are counted with C-level set operations rather than while scoring
+        matching = set().union(*term_postings)
+        if candidates is not None:
+            matching = matching & candidates if len(matching) < len(candidates) else candidates & matching
+        if not matching:
+            return [], 0
+        
+        term_postings.sort(key=len)
+        idfs = [math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5)) for postings in term_postings]
+        # tf / (tf + norm) < 1, so a term adds at most idf * (k1 + 1) to any score
+        remaining_bound = sum(idfs) * (BM25_K1 + 1)
+        length_weight = BM25_K1 * BM25_B * doc_count / self.total_length
+        base_norm = BM25_K1 * (1 - BM25_B)
+        doc_lengths = self.doc_lengths
+        
+        scores: Dict[str, float] = {}
+        for postings, idf in zip(term_postings, idfs):
+            cutoff = heapq.nlargest(top, scores.values())[-1] if len(scores) >= top else 0.0
+            weight = idf * (BM25_K1 + 1)
+            if cutoff > remaining_bound and len(scores) < len(postings):
+                # Courses not yet scored can no longer reach the top: only update scored ones
+                for course_id in scores:
+                    frequency = postings.get(course_id)
+                    if frequency:
+                        scores[course_id] += weight * frequency / (frequency + base_norm + length_weight * doc_lengths[course_id])
+            else:
+                if candidates is not None:
+                    # Restrict to filtered courses, iterating whichever side is smaller
+                    if len(matching) < len(postings):
+                        postings = {course_id: postings[course_id] for course_id in matching if course_id in postings}
+                    else:
+                        postings = {course_id: frequency for course_id, frequency in postings.items() if course_id in matching}
+                get_score = scores.get
+                for course_id, frequency in postings.items():
+                    scores[course_id] = get_score(course_id, 0.0) + (
+                        weight * frequency / (frequency + base_norm + length_weight * doc_lengths[course_id])
+                    )
+            remaining_bound -= weight
+        
+        best = heapq.nlargest(top, scores.items(), key=lambda item: (item[1], item[0]))
+        return best, len(matching)
+
+class CourseIndex:
+    """Secondary indexes over courses_db.
+
+    One set of course ids per filter field value, plus the catalogue in stable
+    (value, course_id) order for every sortable field, and a count of courses
+    per combination of facet values. Every mutation of a course goes through
+    remove() before and add() after, so queries never scan or sort the
+    catalogue.
+    """
+
+    def __init__(self, fields: Iterable[str], facet_fields: Iterable[str] = tuple(FACET_FIELDS)):
+        self.buckets: Dict[str, Dict[Any, Set[str]]] = {field: {} for field in fields}
+        self.sorted_views = {field: SortedView(field_sort_key(field)) for field in dict.fromkeys(SORTED_FIELDS + RANGE_FIELDS)}
+        self.search_index = SearchIndex()
+        self.facet_fields = tuple(facet_fields)
+        # (category, level, status) -> number of courses with exactly those values
+        self.facet_combinations: Counter = Counter()
+        self.facet_keys: Dict[str, tuple] = {}
+
+    def index_filters(self, course: Dict[str, Any]):
+        course_id = course["course_id"]
+        for field, buckets in self.buckets.items():
+            buckets.setdefault(index_key(course[field]), set()).add(course_id)
+        self.uncount_facets(course_id)
+        facet_key = tuple(index_key(course[field]) for field in self.facet_fields)
+        self.facet_keys[course_id] = facet_key
+        self.facet_combinations[facet_key] += 1
+
+    def uncount_facets(self, course_id: str):
+        facet_key = self.facet_keys.pop(course_id, None)
+        if facet_key is not None:
+            self.facet_combinations[facet_key] -= 1
+            if not self.facet_combinations[facet_key]:
+                del self.facet_combinations[facet_key]
+
+    def add(self, course: Dict[str, Any]):
+        self.index_filters(course)
+        for view in self.sorted_views.values():
+            view.add(course)
+        self.search_index.add(course)
+
+    def add_many(self, courses: List[Dict[str, Any]]):
+        """add() for a batch of courses, reordering each sorted view once"""
+        for course in courses:
+            self.index_filters(course)
+            self.search_index.add(course)
+        for view in self.sorted_views.values():
+            view.add_many(courses)
+
+    def remove(self, course: Dict[str, Any], deleted: bool = False):
+        course_id = course["course_id"]
+        for field, buckets in self.buckets.items():
+            key = index_key(course[field])
+            bucket = buckets.get(key)
+            if bucket is not None:
+                bucket.discard(course_id)
+                if not bucket:
+                    del buckets[key]
+        self.uncount_facets(course_id)
+        self.search_index.remove(course_id)
+        if deleted:
+            for view in self.sorted_views.values():
+                view.discard(course_id)
+
+    def match(self, filters: Dict[str, Any]) -> Optional[Set[str]]:
+        """Ids of courses matching every non-None filter (None when nothing is filtered)"""
+        sets = []
+        for field, value in filters.items():
+            if value is None:
+                continue
+            bucket = self.buckets[field].get(index_key(value))
+            if not bucket:
+                return set()
+            sets.append(bucket)
+        
+        if not sets:
+            return None
+        
+        # Start from the smallest set so the work is bounded by the result size
+        sets.sort(key=len)
+        matches = sets[0]
+        for other in sets[1:]:
+            matches = matches.intersection(other)
+            if not matches:
+                break
+        return matches
+
+    def match_ranges(self, candidates: Optional[Set[str]], ranges: Dict[str, Tuple[Any, Any]]):
+        """Narrow ``candidates`` (None for the whole catalogue) to courses within every (low, high) range.
+
+        A single range over the whole catalogue stays lazy; otherwise ranges are
+        applied smallest first, each time iterating whichever side is smaller.
+        """
+        matchers = sorted((RangeMatches(self.sorted_views[field], low, high) for field, (low, high) in ranges.items()), key=len)
+        if candidates is None:
+            if len(matchers) == 1:
+                return matchers[0]
+            candidates = set(matchers[0])
+            matchers = matchers[1:]
+        for matcher in matchers:
+            if len(candidates) <= len(matcher):
+                candidates = matcher.filter(candidates)
+            else:
+                candidates = {course_id for course_id in matcher if course_id in candidates}
+        return candidates
+
+    def facets(self, filters: Dict[str, Any]) -> Tuple[int, Dict[str, Dict[Any, int]]]:
+        """Courses matching all filters, and per facet field the courses per value.
+
+        Each facet leaves out its own filter, so its counts show what selecting
+        another value would return. When only facet fields are filtered the
+        counts come from the per-combination counters; otherwise from
+        intersecting the filter buckets.
+        """
+        selected = {field: index_key(value) for field, value in filters.items() if value is not None}
+        if selected.keys() <= set(self.facet_fields):
+            positions = [(self.facet_fields.index(field), value) for field, value in selected.items()]
+            total = 0
+            counts: Dict[str, Dict[Any, int]] = {field: {} for field in self.facet_fields}
+            for combination, count in self.facet_combinations.items():
+                mismatched = [position for position, value in positions if combination[position] != value]
+                if not mismatched:
+                    total += count
+                if len(mismatched) > 1:
+                    continue
+                for position, field in enumerate(self.facet_fields):
+                    # Counts for a facet ignore its own filter
+                    if not mismatched or mismatched[0] == position:
+                        field_counts = counts[field]
+                        field_counts[combination[position]] = field_counts.get(combination[position], 0) + count
+            return total, counts
+        
+        matches = self.match(filters)
+        counts = {}
+        for field in self.facet_fields:
+            candidates = self.match({name: value for name, value in filters.items() if name != field})
+            # set.intersection walks the smaller side
+            counts[field] = {value: len(candidates.intersection(bucket)) for value, bucket in self.buckets[field].items()}
+        return len(matches), counts
+
+    def query(
+        self,
+        filters: Dict[str, Any],
+        limit: Optional[int] = None,
+        after: Optional[tuple] = None,
+        offset: int = 0,
+        sort_by: SortBy = SortBy.DATE_OLD,
+        ranges: Optional[Dict[str, Tuple[Any, Any]]] = None
+    ) -> Tuple[List[str], int, Optional[tuple]]:
+        """One page of matching course ids in ``sort_by`` order.
+
+        Returns (course ids, total matches, sort key to resume after or None on
+        the last page). Pass ``after`` for keyset paging or ``offset`` for pages,
+        and ``ranges`` as {field: (low, high)} for range filters.
+        """
+        field, descending = SORT_ORDERS[sort_by]
+        view = self.sorted_views[field]
+        candidates = self.match(filters)
+        if ranges:
+            candidates = self.match_ranges(candidates, ranges)
+        total = len(view) if candidates is None else len(candidates)
+        wanted = math.inf if limit is None else offset + limit + 1
+        
+        if candidates is None:
+            keys = view.iter_from(after, offset, reverse=descending)
+            offset = 0
+        elif isinstance(candidates, RangeMatches) and candidates.view is view:
+            # Range on the sort field itself: the matches are one slice of the view
+            keys = candidates.iter_keys(after, reverse=descending)
+        elif limit is not None and wanted * len(view) / max(total, 1) < total * math.log2(total + 1):
+            # Dense result: walking the ordered catalogue finds a page sooner than sorting every match
+            keys = (key for key in view.iter_from(after, reverse=descending) if key[1] in candidates)
+        else:
+            # Sparse result: sort just the matches
+            sorted_keys = sorted(view.key(course_id) for course_id in candidates)
+            if descending:
+                end = bisect_left(sorted_keys, after) if after is not None else len(sorted_keys)
+                keys = reversed(sorted_keys[:end])
+            else:
+                keys = iter(sorted_keys[bisect_right(sorted_keys, after):] if after is not None else sorted_keys)
+        
+        page: List[tuple] = []
+        for key in keys:
+            if offset:
+                offset -= 1
+                continue
+            page.append(key)
+            if limit is not None and len(page) > limit:
+                break
+        
+        next_key = None
+        if limit is not None and len(page) > limit:
+            page = page[:limit]
+            next_key = page[-1]
+        return [course_id for _, course_id in page], total, next_key
+
+course_index = CourseIndex(INDEXED_FIELDS)
+course_index.add_many(list(courses_db.values()))
+
+class CourseJSONCache:
+    """Pre-encoded JSON for each course, reused until the course changes.
+
+    Entries carry the course's updated_at and are only served while it still
+    matches; mutations also drop them explicitly through invalidate().
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, Tuple[datetime, bytes]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, course: Dict[str, Any]) -> bytes:
+        entry = self.entries.get(course["course_id"])
+        if entry is not None and entry[0] == course["updated_at"]:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        encoded = Course(**course).model_dump_json().encode()
+        self.entries[course["course_id"]] = (course["updated_at"], encoded)
+        return encoded
+
+    def invalidate(self, course_id: str):
+        self.entries.pop(course_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+def filter_values(filters: Dict[str, Any]) -> tuple:
+    """Filter or course values in INDEXED_FIELDS order, None where a filter is unset"""
+    return tuple(index_key(filters.get(field)) for field in INDEXED_FIELDS)
+
+class CourseListCache:
+    """Rendered listing pages, keyed by normalized filters, sort order and page position.
+
+    Entries are grouped by their filter tuple. A course can only appear in, or
+    count towards, listings whose every set filter equals the course's value,
+    so a write drops just the groups that are generalizations of the course's
+    values before and after the change; other listings stay cached.
+    """
+
+    def __init__(self, max_entries: int = COURSE_LIST_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+        # filter tuple -> keys of the cached pages for those filters
+        self.dependents: Dict[tuple, Set[tuple]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, key: tuple) -> Optional[bytes]:
+        body = self.entries.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return body
+
+    def put(self, key: tuple, body: bytes):
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = body
+        self.entries.move_to_end(key)
+        self.dependents.setdefault(key[0], set()).add(key)
+        while len(self.entries) > self.max_entries:
+            evicted, _ = self.entries.popitem(last=False)
+            self.forget(evicted)
+            self.evictions += 1
+
+    def forget(self, key: tuple):
+        keys = self.dependents.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.dependents[key[0]]
+
+    def invalidate(self, course: Dict[str, Any]):
+        """Drop every cached page whose filters match the course as it is now"""
+        if not self.dependents:
+            return
+        values = filter_values(course)
+        # Each filter is either unset or equal to the course's value: 2^len(INDEXED_FIELDS) tuples
+        for filters in itertools.product(*((None, value) for value in values)):
+            for key in self.dependents.pop(filters, ()):
+                del self.entries[key]
+                self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "filter_groups": len(self.dependents),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+        }
+
+course_json_cache = CourseJSONCache()
+course_list_cache = CourseListCache()
+# ETags for GET /courses/{course_id}, a digest of the cached response body
+course_versions = EntityVersions("course", lambda course_id: course_json_cache.get(courses_db[course_id]))
+
+def course_changing(course: Dict[str, Any], deleted: bool = False):
+    """Take a course out of the indexes and cached listings before it is modified or deleted"""
+    course_index.remove(course, deleted=deleted)
+    course_list_cache.invalidate(course)
+
+def course_changed(course: Dict[str, Any]):
+    """Drop derived state for a course after it is updated, published or deleted"""
+    course_json_cache.invalidate(course["course_id"])
+    course_versions.bump(course["course_id"])
+    course_list_cache.invalidate(course)
+
+# Feed of course writes for downstream caches, served by GET /changes
+course_changes = ChangeLog("course", "course_id", "course")
+# With shared state the feed is appended to in change-list order as writes are pulled, so every
+# worker numbers it the same way. course_id -> op of its latest write not in the feed yet.
+unfed_ops: Dict[str, str] = {}
+
+def record_change(op: str, course: Dict[str, Any]):
+    """Append a write to the change feed and the store, with the course as it is now unless it was deleted"""
+    course_id = course["course_id"]
+    if op == "delete":
+        course_store.delete("courses", course_id)
+    else:
+        course_store.put("courses", course_id, stored_course(course))
+    if course_store.shared:
+        # A create stays a create until it reaches the feed
+        unfed_ops[course_id] = "create" if unfed_ops.get(course_id) == "create" and op != "delete" else op
+    elif op == "delete":
+        course_changes.append(course_id, op)
+    else:
+        course_changes.append(course_id, op, course_json_cache.get(course))
+
+def stored_course(course: Dict[str, Any]) -> Dict[str, Any]:
+    """The course as written to the store: its enrollment_count leaves out the enrollments in enrollments_db"""
+    counted = enrollment_counter.collected(course["course_id"])
+    return {**course, "enrollment_count": course["enrollment_count"] - counted} if counted else course
+
+def apply_course_change(course_id: str, old: Optional[Dict[str, Any]], course: Optional[Dict[str, Any]]):
+    """Bring the indexes, caches and change feed up to date with a write from another worker"""
+    if course is not None:
+        course["enrollment_count"] += enrollment_counter.collected(course_id)
+        if course == old:
+            return  # Unchanged, e.g. the same record downloaded again
+    if old is not None:
+        course_changing(old, deleted=course is None)
+    if course is None:
+        course_enrollments.pop(course_id, None)
+        course_changed(old)
+    else:
+        course_index.add(course)
+        course_changed(course)
+        unfed_ops[course_id] = "create" if old is None else "update"
+
+def feed_course_change(course_id: str, position: int, course: Optional[Dict[str, Any]]):
+    """Append a pulled write, this worker's or another's, to the change feed at its change-list position"""
+    op = unfed_ops.pop(course_id, "update")
+    if course is None:
+        course_changes.append(course_id, "delete", seq=position)
+        return
+    current = courses_db.get(course_id)
+    if current is not None and current["updated_at"] == course["updated_at"]:
+        body = course_json_cache.get(current)
+    else:
+        # Written again locally since; the entry carries the course as this write left it
+        course = {**course, "enrollment_count": course["enrollment_count"] + enrollment_counter.collected(course_id)}
+        body = Course(**course).model_dump_json().encode()
+    course_changes.append(course_id, "update" if op == "delete" else op, body, seq=position)
+
+def restart_course_changes(epoch: str, position: int):
+    """Start the feed over at the position this worker (re)joined the shared change list"""
+    unfed_ops.clear()
+    course_changes.restart(epoch, position)
+
+course_store.watch("courses", apply_course_change)
+course_store.follow("courses", feed_course_change, restart_course_changes)
+
+# Enrollments are buffered in memory and added to enrollment_count in batches. Stored course
+# records keep the count they were written with; every worker adds the enrollments in
+# enrollments_db to it, so counts never depend on which worker wrote a course last.
+enrollment_counter = WriteBehindCounter("enrollments")
+# Users enrolled in each course, indexed from enrollments_db
+course_enrollments: Dict[str, Set[str]] = {}
+for enrollment in enrollments_db.values():
+    course_enrollments.setdefault(enrollment["course_id"], set()).add(enrollment["user_id"])
+    enrollment_counter.increment(enrollment["course_id"])
+
+def apply_enrollment_change(key: str, old: Optional[Dict[str, Any]], enrollment: Optional[Dict[str, Any]]):
+    """Index and count an enrollment made, or drop one deleted with its course, by another worker"""
+    if enrollment is not None:
+        course_enrollments.setdefault(enrollment["course_id"], set()).add(enrollment["user_id"])
+        if old is None:
+            enrollment_counter.increment(enrollment["course_id"])
+    elif old is not None:
+        course_enrollments.get(old["course_id"], set()).discard(old["user_id"])
+
+course_store.watch("enrollments", apply_enrollment_change)
+
+def drop_enrollments(course_id: str):
+    """Remove the enrollment records of a deleted course"""
+    for user_id in course_enrollments.pop(course_id, ()):
+        key = f"{course_id}:{user_id}"
+        del enrollments_db[key]
+        course_store.delete("enrollments", key)
+enrollment_flush_task: Optional[asyncio.Task] = None
+
+def live_enrollment_count(course: Dict[str, Any]) -> int:
+    """The course's enrollment_count plus enrollments not yet flushed to it"""
+    return course["enrollment_count"] + enrollment_counter.pending(course["course_id"])
+
+def flush_enrollments():
+    """Add counted enrollments to the courses' enrollment_count and the popularity order"""
+    popular_view = course_index.sorted_views["enrollment_count"]
+    for course_id, count in enrollment_counter.collect().items():
+        course = courses_db.get(course_id)
+        if course is None:
+            continue  # Deleted since, or (with shared state) not pulled yet; stored_course() accounts for it
+        # Filter values are unchanged, so only the popularity view needs re-keying
+        course["enrollment_count"] += count
+        popular_view.add(course)
+        course_changed(course)
+
+# Enrollments loaded with the store count from the start
+flush_enrollments()
+
+async def flush_enrollments_periodically():
+    while True:
+        await asyncio.sleep(ENROLLMENT_FLUSH_SECONDS)
+        # With shared state, count enrollments other workers made even when no requests arrive
+        await course_store.refresh()
+        flush_enrollments()
+
+def json_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+def course_list_body(
+    before: Dict[str, Any], fragments: Iterable[bytes], after: Dict[str, Any], key: str = "courses"
+) -> bytes:
+    """JSON object of the ``before`` fields, a ``key`` array of cached fragments, then the ``after`` fields"""
+    head = json.dumps(before, separators=(",", ":"))[:-1]
+    tail = json.dumps(after, separators=(",", ":"))[1:]
+    return head.encode() + b',"' + key.encode() + b'":[' + b",".join(fragments) + b"]," + tail.encode()
+
+def encode_cursor(sort_by: SortBy, sort_key: tuple) -> str:
+    value, course_id = sort_key
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([sort_by.value, value, course_id]).encode()).decode()
+
+def decode_cursor(cursor: str, sort_by: SortBy) -> tuple:
+    """Sort key encoded in a cursor; cursors only resume the sort order they came from"""
+    try:
+        cursor_sort, value, course_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if cursor_sort != sort_by.value:
+            raise ValueError("cursor belongs to another sort order")
+        if SORT_ORDERS[sort_by][0] == "created_at":
+            value = datetime.fromisoformat(value)
+        elif not isinstance(value, (int, float)):
+            raise ValueError("invalid sort value")
+        return (value, str(course_id))
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+async def read_batch_items(request: Request) -> List[Any]:
+    """Items of a batch body: a JSON array, or one JSON value per line for application/x-ndjson"""
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        items = []
+        async for line in iter_body_lines(request):
+            if not line.strip():
+                continue
+            if len(items) >= COURSE_BATCH_MAX_ITEMS:
+                break
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                # Reported against the item's position during validation
+                items.append(None)
+        else:
+            return items
+    else:
+        try:
+            items = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Batch body must be a JSON array or NDJSON"
+            )
+        if not isinstance(items, list):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Batch body must be a JSON array or NDJSON"
+            )
+        if len(items) <= COURSE_BATCH_MAX_ITEMS:
+            return items
+    raise HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Batches are limited to {COURSE_BATCH_MAX_ITEMS} items"
+    )
+
+def parse_batch_items(items: List[Any], model: type, results: List[Dict[str, Any]]) -> List[Tuple[int, BaseModel]]:
+    """Validate every item against ``model``; failures are appended to ``results``"""
+    parsed = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results.append({"index": index, "status": "error", "detail": "Expected a JSON object"})
+            continue
+        try:
+            parsed.append((index, model(**item)))
+        except ValidationError as exc:
+            results.append({
+                "index": index,
+                "course_id": item.get("course_id"),
+                "status": "error",
+                "detail": "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in exc.errors())
+            })
+    return parsed
+
+def owned_batch_courses(
+    parsed: List[Tuple[int, BaseModel]], instructor_id: str, results: List[Dict[str, Any]]
+) -> List[Tuple[int, BaseModel, Dict[str, Any]]]:
+    """Look up each item's course, rejecting unknown, foreign and repeated course ids"""
+    owned = []
+    seen = set()
+    for index, item in parsed:
+        course = get_course_by_id(item.course_id)
+        if not course:
+            detail = "Course not found"
+        elif course["instructor_id"] != instructor_id:
+            detail = "You can only change your own courses"
+        elif item.course_id in seen:
+            detail = "Course appears more than once in the batch"
+        else:
+            seen.add(item.course_id)
+            owned.append((index, item, course))
+            continue
+        results.append({"index": index, "course_id": item.course_id, "status": "error", "detail": detail})
+    return owned
+
+def batch_response(response: Response, results: List[Dict[str, Any]], succeeded: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """All-or-nothing outcome: applied when no item failed, otherwise 422 and nothing changed"""
+    if results:
+        response.status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+        failed = len(results)
+        results.extend({**result, "status": "valid"} for result in succeeded)
+        results.sort(key=lambda result: result["index"])
+        return {"applied": False, "succeeded": 0, "failed": failed, "results": results}
+    return {"applied": True, "succeeded": len(succeeded), "failed": 0, "results": succeeded}
+
+def new_course_record(course_data: CourseCreate, instructor_id: str, created_at: datetime) -> Dict[str, Any]:
+    return {
+        "course_id": str(uuid.uuid4()),
+        "instructor_id": instructor_id,
+        "title": course_data.title,
+        "description": course_data.description,
+        "category": course_data.category,
+        "level": course_data.level,
+        "price": course_data.price or 0.0,
+        "thumbnail_url": str(course_data.thumbnail_url) if course_data.thumbnail_url else None,
+        "duration_hours": course_data.duration_hours,
+        "prerequisites": course_data.prerequisites or [],
+        "learning_objectives": course_data.learning_objectives or [],
+        "status": CourseStatus.DRAFT,
+        "enrollment_count": 0,
+        "rating": 0.0,
+        "created_at": created_at,
+        "updated_at": created_at
+    }
+
+def apply_course_update(course: Dict[str, Any], update_dict: Dict[str, Any], updated_at: datetime):
+    for field, value in update_dict.items():
+        if field == "thumbnail_url" and value:
+            course[field] = str(value)  # Convert HttpUrl to string
+        else:
+            course[field] = value
+    course["updated_at"] = updated_at
+
 # Utility functions
 async def get_current_instructor(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Mock authentication - extract instructor ID from token"""
+    """Authenticate an instructor from an auth service JWT or a mock token"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -210,15 +1258,30 @@ async def get_current_instructor(credentials: HTTPAuthorizationCredentials = Dep
     )
     
     try:
-        # Mock token format: "mock_token_instructor_001"
-        if not credentials.credentials.startswith("mock_token_"):
-            raise credentials_exception
-        
-        instructor_id = credentials.credentials.replace("mock_token_", "")
-        if instructor_id not in mock_instructors:
-            raise credentials_exception
-            
-        return instructor_id
+        # Mock token format: "mock_token_instructor_001"; auth service JWTs are verified locally
+        instructor_id = await authenticate(credentials.credentials, mock_instructors)
+    except Exception:
+        raise credentials_exception
+    
+    # Any auth service account can sign in, but only registered instructors author courses
+    if instructor_id not in mock_instructors:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Instructor access required"
+        )
+    return instructor_id
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Authenticate any user from an auth service JWT or a mock token"""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    
+    try:
+        # Mock token format: "mock_token_user_001"; auth service JWTs are verified locally
+        return await authenticate(credentials.credentials, mock_users)
     except Exception:
         raise credentials_exception
 
@@ -228,7 +1291,8 @@ def get_course_by_id(course_id: str) -> Optional[Dict[str, Any]]:
 
 def filter_courses_by_instructor(instructor_id: str) -> List[Dict[str, Any]]:
     """Get all courses by instructor"""
-    return [course for course in courses_db.values() if course["instructor_id"] == instructor_id]
+    course_ids, _, _ = course_index.query({"instructor_id": instructor_id})
+    return [courses_db[course_id] for course_id in course_ids]
 
 # Routes
 @app.get("/")
@@ -236,7 +1300,7 @@ async def root():
     return {
         "message": "Course Management Microservice",
         "version": "1.0.0",
-        "endpoints": ["/courses", "/courses/create", "/courses/{course_id}", "/courses/{course_id}/update"]
+        "endpoints": ["/courses", "/courses/search", "/courses/facets", "/courses/create", "/courses/batch/create", "/courses/batch/update", "/courses/batch/publish", "/courses/{course_id}", "/courses/{course_id}/update", "/courses/{course_id}/enroll", "/changes", "/metrics"]
     }
 
 @app.post("/courses/create", response_model=Course)
@@ -245,34 +1309,163 @@ async def create_course(
     instructor_id: str = Depends(get_current_instructor)
 ):
     """Create a new course"""
-    course_id = str(uuid.uuid4())
+    new_course = new_course_record(course_data, instructor_id, datetime.utcnow())
+    courses_db[new_course["course_id"]] = new_course
+    course_index.add(new_course)
+    course_list_cache.invalidate(new_course)
+    record_change("create", new_course)
     
-    new_course = {
-        "course_id": course_id,
-        "instructor_id": instructor_id,
-        "title": course_data.title,
-        "description": course_data.description,
-        "category": course_data.category,
-        "level": course_data.level,
-        "price": course_data.price or 0.0,
-        "thumbnail_url": str(course_data.thumbnail_url) if course_data.thumbnail_url else None,
-        "duration_hours": course_data.duration_hours,
-        "prerequisites": course_data.prerequisites or [],
-        "learning_objectives": course_data.learning_objectives or [],
-        "status": CourseStatus.DRAFT,
-        "enrollment_count": 0,
-        "rating": 0.0,
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow()
-    }
+    return Course(**new_course)
+
+@app.post("/courses/batch/create", response_model=CourseBatchResponse)
+async def batch_create_courses(
+    request: Request,
+    response: Response,
+    instructor_id: str = Depends(get_current_instructor)
+):
+    """Create many courses in one all-or-nothing batch.
+
+    The body is a JSON array of course objects, or NDJSON
+    (``Content-Type: application/x-ndjson``). If any item is invalid nothing is
+    created and the response is a 422 with a result per item.
+    """
+    results: List[Dict[str, Any]] = []
+    parsed = parse_batch_items(await read_batch_items(request), CourseCreate, results)
     
-    courses_db[course_id] = new_course
+    if not results:
+        created_at = datetime.utcnow()
+        new_courses = [new_course_record(course_data, instructor_id, created_at) for _, course_data in parsed]
+        for new_course in new_courses:
+            courses_db[new_course["course_id"]] = new_course
+        course_index.add_many(new_courses)
+        for new_course in new_courses:
+            course_list_cache.invalidate(new_course)
+            record_change("create", new_course)
+        succeeded = [
+            {"index": index, "course_id": new_course["course_id"], "status": "created"}
+            for (index, _), new_course in zip(parsed, new_courses)
+        ]
+    else:
+        succeeded = [{"index": index, "status": "created"} for index, _ in parsed]
     
-    return Course(**new_course)
+    return batch_response(response, results, succeeded)
+
+@app.post("/courses/batch/update", response_model=CourseBatchResponse)
+async def batch_update_courses(
+    request: Request,
+    response: Response,
+    instructor_id: str = Depends(get_current_instructor)
+):
+    """Update many of the caller's courses in one all-or-nothing batch.
+
+    Each item is a ``course_id`` plus the fields to change, as for
+    ``/courses/{course_id}/update``.
+    """
+    results: List[Dict[str, Any]] = []
+    parsed = parse_batch_items(await read_batch_items(request), CourseBatchUpdate, results)
+    owned = owned_batch_courses(parsed, instructor_id, results)
+    
+    if not results:
+        updated_at = datetime.utcnow()
+        for _, update_data, course in owned:
+            course_changing(course)
+            apply_course_update(course, update_data.dict(exclude_unset=True, exclude={"course_id"}), updated_at)
+        courses = [course for _, _, course in owned]
+        course_index.add_many(courses)
+        for course in courses:
+            course_changed(course)
+            record_change("update", course)
+    
+    return batch_response(
+        response, results, [{"index": index, "course_id": course["course_id"], "status": "updated"} for index, _, course in owned]
+    )
+
+@app.post("/courses/batch/publish", response_model=CourseBatchResponse)
+async def batch_publish_courses(
+    request: Request,
+    response: Response,
+    instructor_id: str = Depends(get_current_instructor)
+):
+    """Publish many of the caller's draft courses in one all-or-nothing batch.
+
+    Each item is an object with a ``course_id``.
+    """
+    results: List[Dict[str, Any]] = []
+    parsed = parse_batch_items(await read_batch_items(request), CourseBatchPublish, results)
+    owned = []
+    for index, item, course in owned_batch_courses(parsed, instructor_id, results):
+        if course["status"] != CourseStatus.DRAFT:
+            results.append({
+                "index": index, "course_id": item.course_id, "status": "error", "detail": "Only draft courses can be published"
+            })
+        else:
+            owned.append((index, course))
+    
+    if not results:
+        updated_at = datetime.utcnow()
+        for _, course in owned:
+            course_changing(course)
+            course["status"] = CourseStatus.PUBLISHED
+            course["updated_at"] = updated_at
+        courses = [course for _, course in owned]
+        course_index.add_many(courses)
+        for course in courses:
+            course_changed(course)
+            record_change("publish", course)
+    
+    return batch_response(
+        response, results, [{"index": index, "course_id": course["course_id"], "status": "published"} for index, course in owned]
+    )
+
+@app.get("/courses/search", response_model=CourseSearchResponse)
+async def search_courses(
+    q: str = Query(..., min_length=1),
+    category: Optional[CourseCategory] = None,
+    level: Optional[CourseLevel] = None,
+    status: Optional[CourseStatus] = None,
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100)
+):
+    """Full-text search over course titles, descriptions, prerequisites and objectives, best match first"""
+    candidates = course_index.match({"category": category, "level": level, "status": status})
+    hits, total = course_index.search_index.search(q, candidates, top=page * limit)
+    
+    # Each cached course object gets its score spliced in before the closing brace
+    fragments = (
+        course_json_cache.get(courses_db[course_id])[:-1] + b',"score":%s}' % json.dumps(round(score, 4)).encode()
+        for course_id, score in hits[(page - 1) * limit:]
+    )
+    return json_response(course_list_body({"query": q, "total": total}, fragments, {"page": page, "limit": limit}))
+
+@app.get("/courses/facets", response_model=CourseFacetsResponse)
+async def get_course_facets(
+    category: Optional[CourseCategory] = None,
+    level: Optional[CourseLevel] = None,
+    status: Optional[CourseStatus] = None,
+    instructor_id: Optional[str] = None
+):
+    """Course counts per category, level and status under the selected filters.
+
+    Each facet counts the courses matching every filter except its own, so
+    the numbers next to each value are what selecting it would return.
+    """
+    filters = {
+        "category": category,
+        "level": level,
+        "status": status,
+        "instructor_id": instructor_id
+    }
+    total, counts = course_index.facets(filters)
+    facets = {
+        field: {value.value: counts[field].get(value.value, 0) for value in values}
+        for field, values in FACET_FIELDS.items()
+    }
+    
+    return {"total": total, "facets": facets}
 
 @app.get("/courses/{course_id}", response_model=Course)
-async def get_course(course_id: str):
-    """Get course by ID"""
+async def get_course(course_id: str, if_none_match: Optional[str] = Header(None)):
+    """Get course by ID (answers 304 Not Modified when If-None-Match holds the current ETag)"""
     course = get_course_by_id(course_id)
     if not course:
         raise HTTPException(
@@ -280,7 +1473,13 @@ async def get_course(course_id: str):
             detail="Course not found"
         )
     
-    return Course(**course)
+    not_modified = course_versions.not_modified_response(course_id, if_none_match)
+    if not_modified:
+        return not_modified
+    
+    response = json_response(course_json_cache.get(course))
+    response.headers["ETag"] = course_versions.etag(course_id)
+    return response
 
 @app.put("/courses/{course_id}/update", response_model=Course)
 async def update_course(
@@ -305,14 +1504,11 @@ async def update_course(
     
     # Update only provided fields
     update_dict = update_data.dict(exclude_unset=True)
-    for field, value in update_dict.items():
-        if field == "thumbnail_url" and value:
-            course[field] = str(value)  # Convert HttpUrl to string
-        else:
-            course[field] = value
-    
-    # Update timestamp
-    course["updated_at"] = datetime.utcnow()
+    course_changing(course)
+    apply_course_update(course, update_dict, datetime.utcnow())
+    course_index.add(course)
+    course_changed(course)
+    record_change("update", course)
     
     return Course(**course)
 
@@ -336,71 +1532,100 @@ async def delete_course(
             detail="You can only delete your own courses"
         )
     
+    course_changing(course, deleted=True)
+    course_changed(course)
+    record_change("delete", course)
     del courses_db[course_id]
+    drop_enrollments(course_id)
     
     return {"message": "Course deleted successfully", "course_id": course_id}
 
+def range_filters(bounds: Dict[str, Tuple[Any, Any]]) -> Dict[str, Tuple[Any, Any]]:
+    """The (low, high) bounds that are set, rejecting inverted ranges"""
+    ranges = {}
+    for field, (low, high) in bounds.items():
+        if low is not None and high is not None and low > high:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Minimum {field} cannot be greater than maximum"
+            )
+        if low is not None or high is not None:
+            ranges[field] = (low, high)
+    return ranges
+
+def paginate_courses(
+    filters: Dict[str, Any],
+    page: int,
+    limit: int,
+    cursor: Optional[str],
+    sort: SortBy = SortBy.DATE_OLD,
+    ranges: Optional[Dict[str, Tuple[Any, Any]]] = None
+) -> Response:
+    """Build one page of a course listing, by cursor when given or by page number otherwise"""
+    # The filter tuple comes first: cached pages are invalidated by it
+    cache_key = (filter_values(filters), tuple(sorted(ranges.items())) if ranges else None, sort.value, cursor, page, limit)
+    body = course_list_cache.get(cache_key)
+    if body is not None:
+        return json_response(body)
+    
+    if cursor:
+        course_ids, total, next_key = course_index.query(
+            filters, limit, after=decode_cursor(cursor, sort), sort_by=sort, ranges=ranges
+        )
+    else:
+        course_ids, total, next_key = course_index.query(
+            filters, limit, offset=(page - 1) * limit, sort_by=sort, ranges=ranges
+        )
+    
+    body = course_list_body(
+        {"total": total},
+        (course_json_cache.get(courses_db[course_id]) for course_id in course_ids),
+        {"page": page, "limit": limit, "next_cursor": encode_cursor(sort, next_key) if next_key else None}
+    )
+    course_list_cache.put(cache_key, body)
+    return json_response(body)
+
 @app.get("/courses", response_model=CourseListResponse)
 async def list_courses(
     category: Optional[CourseCategory] = None,
     level: Optional[CourseLevel] = None,
     status: Optional[CourseStatus] = None,
     instructor_id: Optional[str] = None,
-    page: int = 1,
-    limit: int = 10
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    min_hours: Optional[int] = Query(None, ge=0),
+    max_hours: Optional[int] = Query(None, ge=0),
+    sort: SortBy = SortBy.DATE_OLD,
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1),
+    cursor: Optional[str] = None
 ):
-    """List courses with optional filtering"""
-    courses = list(courses_db.values())
-    
-    # Apply filters
-    if category:
-        courses = [c for c in courses if c["category"] == category]
-    if level:
-        courses = [c for c in courses if c["level"] == level]
-    if status:
-        courses = [c for c in courses if c["status"] == status]
-    if instructor_id:
-        courses = [c for c in courses if c["instructor_id"] == instructor_id]
-    
-    # Apply pagination
-    total = len(courses)
-    start = (page - 1) * limit
-    end = start + limit
-    courses = courses[start:end]
-    
-    return CourseListResponse(
-        total=total,
-        courses=[Course(**course) for course in courses],
-        page=page,
-        limit=limit
-    )
+    """List courses with optional filtering.
+
+    Courses are ordered by ``sort`` (oldest first by default). Pass the previous
+    response's ``next_cursor`` as ``cursor`` to fetch the next page; ``page`` is
+    ignored then. Price and duration bounds are inclusive; courses without a
+    duration never match an hours filter.
+    """
+    filters = {
+        "category": category,
+        "level": level,
+        "status": status,
+        "instructor_id": instructor_id
+    }
+    ranges = range_filters({"price": (min_price, max_price), "duration_hours": (min_hours, max_hours)})
+    return paginate_courses(filters, page, limit, cursor, sort, ranges)
 
 @app.get("/my-courses", response_model=CourseListResponse)
 async def get_my_courses(
     status: Optional[CourseStatus] = None,
-    page: int = 1,
-    limit: int = 10,
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1),
+    cursor: Optional[str] = None,
     instructor_id: str = Depends(get_current_instructor)
 ):
     """Get courses created by the current instructor"""
-    courses = filter_courses_by_instructor(instructor_id)
-    
-    # Apply status filter if provided
-    if status:
-        courses = [c for c in courses if c["status"] == status]
-    
-    # Apply pagination
-    total = len(courses)
-    start = (page - 1) * limit
-    end = start + limit
-    courses = courses[start:end]
-    
-    return CourseListResponse(
-        total=total,
-        courses=[Course(**course) for course in courses],
-        page=page,
-        limit=limit
-    )
+    return paginate_courses({"instructor_id": instructor_id, "status": status}, page, limit, cursor)
 
 @app.put("/courses/{course_id}/publish")
 async def publish_course(
@@ -428,8 +1653,12 @@ async def publish_course(
             detail="Only draft courses can be published"
         )
     
+    course_changing(course)
     course["status"] = CourseStatus.PUBLISHED
     course["updated_at"] = datetime.utcnow()
+    course_index.add(course)
+    course_changed(course)
+    record_change("publish", course)
     
     return {
         "message": "Course published successfully",
@@ -437,6 +1666,60 @@ async def publish_course(
         "status": CourseStatus.PUBLISHED
     }
 
+@app.post("/courses/{course_id}/enroll")
+async def enroll_in_course(
+    course_id: str,
+    user_id: str = Depends(get_current_user)
+):
+    """Enroll the current user in a published course"""
+    course = get_course_by_id(course_id)
+    if not course:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Course not found"
+        )
+    
+    if course["status"] != CourseStatus.PUBLISHED:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only published courses accept enrollments"
+        )
+    
+    enrolled = course_enrollments.setdefault(course_id, set())
+    if user_id in enrolled:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Already enrolled in this course"
+        )
+    
+    enrolled.add(user_id)
+    enrollment = {"course_id": course_id, "user_id": user_id, "enrolled_at": datetime.utcnow()}
+    enrollments_db[f"{course_id}:{user_id}"] = enrollment
+    course_store.put("enrollments", f"{course_id}:{user_id}", enrollment)
+    enrollment_counter.increment(course_id)
+    
+    return {
+        "message": "Enrolled successfully",
+        "course_id": course_id,
+        "enrollment_count": live_enrollment_count(course)
+    }
+
+@app.get("/courses/{course_id}/enrollments")
+async def get_enrollment_count(course_id: str):
+    """Current enrollment count, including enrollments not yet written to the course record"""
+    course = get_course_by_id(course_id)
+    if not course:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Course not found"
+        )
+    
+    return {
+        "course_id": course_id,
+        "enrollment_count": live_enrollment_count(course),
+        "pending": enrollment_counter.pending(course_id)
+    }
+
 @app.get("/categories")
 async def get_categories():
     """Get available course categories"""
@@ -467,6 +1750,65 @@ async def get_instructors():
         ]
     }
 
+@app.get("/changes")
+async def get_changes(
+    since: int = Query(0, ge=0, description="Sequence number of the last change already applied"),
+    epoch: Optional[str] = Query(None, description="Epoch that the sequence number belongs to"),
+    timeout: float = Query(0, ge=0, le=CHANGES_MAX_WAIT_SECONDS, description="Seconds to wait when there is nothing new"),
+    limit: int = Query(1000, ge=1, le=10000)
+):
+    """Course creates, updates, publishes and deletes after ``since``, oldest first.
+
+    Each change carries the course as it was after the write. With a timeout
+    the request is held until a change arrives. ``reset`` means changes after
+    ``since`` are no longer available (or come from an earlier run): reload the
+    catalogue, then continue from ``next_since``.
+    """
+    if not course_changes.is_stale(since, epoch):
+        await course_changes.wait(since, timeout)
+    reset = course_changes.is_stale(since, epoch)
+    if reset:
+        course_changes.resets += 1
+        fragments, next_since, has_more = [], course_changes.seq, False
+    else:
+        fragments, next_since, has_more = course_changes.read(since, limit)
+    return json_response(course_list_body(
+        {"epoch": course_changes.epoch, "reset": reset},
+        fragments,
+        {"next_since": next_since, "has_more": has_more},
+        key="changes",
+    ))
+
+@app.get("/metrics")
+async def get_metrics():
+    """Operational metrics for the course service"""
+    return {
+        "serialization_cache": course_json_cache.stats(),
+        "list_cache": course_list_cache.stats(),
+        "enrollments": {**enrollment_counter.stats(), "flush_interval_seconds": ENROLLMENT_FLUSH_SECONDS},
+        "changes": course_changes.stats(),
+        "durable_store": course_store.stats(),
+        "conditional_get": {"course": course_versions.stats()}
+    }
+
+@app.on_event("startup")
+async def start_enrollment_flusher():
+    global enrollment_flush_task
+    enrollment_flush_task = asyncio.create_task(flush_enrollments_periodically())
+
+@app.on_event("shutdown")
+async def stop_enrollment_flusher():
+    if enrollment_flush_task is not None:
+        enrollment_flush_task.cancel()
+
+@app.on_event("shutdown")
+async def close_course_store():
+    await course_store.sync()
+    course_store.close()
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8002)
\ No newline at end of file
+    workers = int(os.getenv("WORKERS", "1"))
+    if workers > 1 and not course_store.shared:
+        raise SystemExit("WORKERS > 1 needs SHARED_STATE_URL, or each worker would have its own copy of the courses")
+    uvicorn.run("course_service:app" if workers > 1 else app, host="0.0.0.0", port=8002, workers=workers)
\ No newline at end of file
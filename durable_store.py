@@ -0,0 +1,563 @@
+"""Snapshot plus write-ahead log persistence for the services' in-memory stores.
+
+Services keep serving from their plain dicts; this module only makes those
+dicts survive a restart. ``DATA_DIR`` opts in: without it every store is
+in-memory only, as before. ``SHARED_STATE_URL`` selects the store in
+shared_state.py instead, which keeps the dicts of several workers in step
+through the same put()/delete() calls and middleware.
+
+- Every put or delete is encoded on the caller's thread and appended to the
+  current write-ahead log segment by a single writer thread. Whatever queues
+  up while one write and fsync is in progress goes out in the next write,
+  so concurrent requests share fsyncs (group commit).
+- ``StoreMiddleware`` holds each response until the writes queued before it
+  are on disk, so a client never sees a write that a crash loses.
+- Once a segment reaches ``SNAPSHOT_WAL_BYTES`` the writer starts a new one,
+  and a background thread folds the closed segments into a new snapshot. It
+  merges raw records keyed by (table, key) and never touches the live dicts.
+- At startup the snapshot is read through mmap, then the segments written
+  after it are replayed. A torn record at the end of the last segment (a crash
+  mid-write) is cut off. A corrupt record anywhere else - in the snapshot or
+  in an earlier segment - would leave a gap in the history, so loading stops
+  with an error instead.
+
+Both files are sequences of frames: payload length and CRC-32 (little-endian
+uint32 each), then the payload. A payload is op, table and key lengths
+(``<BHH``), the table and key as UTF-8, then the pickled record. Enum members
+are pickled as (class name, value), so records load back the same whether a
+service runs as ``python course_service.py`` or ``uvicorn course_service:app``.
+"""
+import asyncio
+import io
+import mmap
+import os
+import pickle
+import threading
+import time
+import zlib
+from enum import Enum
+from struct import Struct
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Configuration
+DATA_DIR = os.getenv("DATA_DIR")
+# Log segment size that triggers a new snapshot
+SNAPSHOT_WAL_BYTES = int(os.getenv("SNAPSHOT_WAL_BYTES", str(64 * 1024 * 1024)))
+# With 0, commits are written but not fsynced: they survive a process crash, not a power loss
+WAL_FSYNC = os.getenv("WAL_FSYNC", "1") != "0"
+# Redis-protocol server shared by a service's workers (see shared_state.py); takes precedence over DATA_DIR
+SHARED_STATE_URL = os.getenv("SHARED_STATE_URL")
+
+FRAME_HEADER = Struct("<II")  # payload length, CRC-32 of the payload
+RECORD_HEADER = Struct("<BHH")  # op, table name length, key length
+PUT = 1
+DELETE = 2
+SNAPSHOT_MAGIC = b"LXSNAP1\n"
+SNAPSHOT_HEADER = Struct("<Q")  # last log segment folded into the snapshot
+
+# class name -> value -> member, for the enums that appear in stored records
+ENUM_MEMBERS: Dict[str, Dict[Any, Enum]] = {}
+
+def register_enums(enum_types: Iterable[type]):
+    for enum_type in enum_types:
+        ENUM_MEMBERS[enum_type.__name__] = {member.value: member for member in enum_type}
+
+def restore_enum(type_name: str, value: Any) -> Enum:
+    return ENUM_MEMBERS[type_name][value]
+
+class RecordPickler(pickle.Pickler):
+    """Pickler that stores enum members by class name and value instead of by module path"""
+
+    def reducer_override(self, obj):
+        if isinstance(obj, Enum):
+            return restore_enum, (type(obj).__name__, obj.value)
+        return NotImplemented
+
+class RecordEncoder:
+    """Encodes records as frames, reusing one pickler and buffer"""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+        self.pickler = RecordPickler(self.buffer, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def frame(self, op: int, table: str, key: str, value: Any = None) -> bytes:
+        table_bytes = table.encode()
+        key_bytes = key.encode()
+        payload = RECORD_HEADER.pack(op, len(table_bytes), len(key_bytes)) + table_bytes + key_bytes
+        if op == PUT:
+            self.buffer.seek(0)
+            self.buffer.truncate()
+            self.pickler.clear_memo()
+            self.pickler.dump(value)
+            payload += self.buffer.getvalue()
+        return FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+def iter_frames(data, offset: int = 0) -> Iterator[Tuple[int, int, bytes]]:
+    """(start, end, payload) of each intact frame from ``offset``, stopping at the first torn or corrupt one"""
+    size = len(data)
+    while offset + FRAME_HEADER.size <= size:
+        length, crc = FRAME_HEADER.unpack_from(data, offset)
+        end = offset + FRAME_HEADER.size + length
+        if end > size:
+            return
+        payload = data[offset + FRAME_HEADER.size:end]
+        if zlib.crc32(payload) != crc:
+            return
+        yield offset, end, payload
+        offset = end
+
+def parse_payload(payload: bytes) -> Tuple[int, str, str, int]:
+    """(op, table, key, offset of the pickled record) of a frame payload"""
+    op, table_length, key_length = RECORD_HEADER.unpack_from(payload)
+    key_start = RECORD_HEADER.size + table_length
+    value_start = key_start + key_length
+    return op, payload[RECORD_HEADER.size:key_start].decode(), payload[key_start:value_start].decode(), value_start
+
+class InMemoryStore:
+    """Keeps nothing beyond the service's dicts; used when DATA_DIR is unset"""
+
+    name = "memory"
+    durable = False
+    shared = False
+
+    def __init__(self, tables: Dict[str, Dict[str, Any]]):
+        self.tables = tables
+
+    def load(self) -> bool:
+        """Fill the tables from disk; returns False when there was nothing to load"""
+        return False
+
+    def put(self, table: str, key: str, value: Any):
+        pass
+
+    def delete(self, table: str, key: str):
+        pass
+
+    def watch(self, table: str, callback: Callable[[str, Any, Any], None]):
+        """Call ``callback(key, old, new)`` after a write made elsewhere changes ``table``"""
+
+    def follow(self, table: str, callback: Callable[[str, int, Any], None], restart: Callable[[str, int], None]):
+        """Report every write to ``table`` with its position in a change list shared between workers.
+
+        ``callback(key, position, record)`` runs in list order, this worker's own
+        writes included, and ``restart(epoch, position)`` when the store joins or
+        rejoins the list. Stores without a shared list never call either.
+        """
+
+    async def refresh(self):
+        """Pick up writes made elsewhere before a request reads the tables"""
+
+    async def sync(self):
+        """Wait until every write queued so far is durable (or, for a shared store, pushed)"""
+
+    def snapshot(self):
+        pass
+
+    def close(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+class DurableStore(InMemoryStore):
+    """Snapshot plus write-ahead log for a set of named tables under ``data_dir``"""
+
+    name = "durable"
+    durable = True
+
+    def __init__(
+        self,
+        store_name: str,
+        tables: Dict[str, Dict[str, Any]],
+        data_dir: str,
+        snapshot_wal_bytes: int = SNAPSHOT_WAL_BYTES,
+        fsync: bool = WAL_FSYNC,
+    ):
+        super().__init__(tables)
+        self.store_name = store_name
+        self.data_dir = data_dir
+        self.snapshot_wal_bytes = snapshot_wal_bytes
+        self.fsync = fsync
+        self.snapshot_path = os.path.join(data_dir, f"{store_name}.snapshot")
+        self.encoder = RecordEncoder()
+
+        # Shared with the writer and compaction threads; guarded by lock
+        self.lock = threading.Condition()
+        self.pending: List[bytes] = []
+        self.enqueued = 0  # Records queued by put() and delete()
+        self.committed = 0  # Records written (and fsynced) to the log
+        self.waiters: List[Tuple[int, asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self.snapshot_requested = False
+        # Records queued before the requested snapshot, which it has to include
+        self.snapshot_target = 0
+        self.compacting = False
+        self.closing = False
+        # Set once the log or a snapshot cannot be written; every later sync() raises it
+        self.error: Optional[Exception] = None
+
+        self.segment = 0  # Log segment being appended to
+        self.covered = 0  # Last segment folded into the snapshot
+        self.wal = None
+        self.segment_bytes = 0
+        self.writer: Optional[threading.Thread] = None
+        self.compactor: Optional[threading.Thread] = None
+
+        self.commits = 0
+        self.committed_bytes = 0
+        self.snapshots = 0
+        self.snapshot_records = 0
+        self.snapshot_bytes = 0
+        self.last_snapshot_ms = 0.0
+        self.load_ms = 0.0
+        self.loaded_records = 0
+        self.replayed_records = 0
+
+    def segment_path(self, segment: int) -> str:
+        return os.path.join(self.data_dir, f"{self.store_name}.wal.{segment:08d}")
+
+    def segments(self) -> List[int]:
+        prefix = f"{self.store_name}.wal."
+        return sorted(
+            int(filename[len(prefix):]) for filename in os.listdir(self.data_dir)
+            if filename.startswith(prefix) and filename[len(prefix):].isdigit()
+        )
+
+    def load(self) -> bool:
+        """Load the snapshot and replay the log, then start accepting writes.
+
+        With nothing on disk the tables keep their current contents (the seed
+        data), which become the first snapshot.
+        """
+        started_at = time.perf_counter()
+        os.makedirs(self.data_dir, exist_ok=True)
+        segments = self.segments()
+        found = os.path.exists(self.snapshot_path) or bool(segments)
+        if found:
+            for table in self.tables.values():
+                table.clear()
+            if os.path.exists(self.snapshot_path):
+                self.covered = self.load_snapshot()
+            for segment in segments:
+                if segment <= self.covered:
+                    # Already folded in; left behind by a crash before it was deleted
+                    os.remove(self.segment_path(segment))
+                else:
+                    self.replay_segment(segment, newest=segment == segments[-1])
+            self.segment = max(segments[-1] if segments else 0, self.covered)
+        else:
+            self.write_snapshot(
+                (self.encoder.frame(PUT, table, key, value) for table, rows in self.tables.items() for key, value in rows.items()),
+                0,
+            )
+        self.open_segment(self.segment + 1)
+        self.load_ms = (time.perf_counter() - started_at) * 1000
+        self.writer = threading.Thread(target=self.write_loop, name=f"{self.store_name}-wal", daemon=True)
+        self.writer.start()
+        if self.segment - 1 > self.covered:
+            # Fold the replayed segments in now rather than once the new one fills up
+            self.start_compaction()
+        return found
+
+    def load_snapshot(self) -> int:
+        with open(self.snapshot_path, "rb") as snapshot_file, \
+                mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+                raise ValueError(f"{self.snapshot_path} is not a snapshot")
+            (covered,) = SNAPSHOT_HEADER.unpack_from(data, len(SNAPSHOT_MAGIC))
+            tables = self.tables
+            valid = len(SNAPSHOT_MAGIC) + SNAPSHOT_HEADER.size
+            for _, valid, payload in iter_frames(data, valid):
+                _, table, key, value_start = parse_payload(payload)
+                tables[table][key] = pickle.loads(payload[value_start:])
+                self.loaded_records += 1
+            if valid < len(data):
+                # Snapshots are renamed into place whole, so a bad frame is damage, not a crash
+                raise ValueError(f"{self.snapshot_path} is corrupt at byte {valid}")
+        return covered
+
+    def replay_segment(self, segment: int, newest: bool = True):
+        """Apply a segment's records; only the newest segment may end in a torn record"""
+        path = self.segment_path(segment)
+        size = os.path.getsize(path)
+        valid = 0
+        if size:
+            with open(path, "rb") as segment_file, \
+                    mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                tables = self.tables
+                for _, valid, payload in iter_frames(data):
+                    op, table, key, value_start = parse_payload(payload)
+                    if op == PUT:
+                        tables[table][key] = pickle.loads(payload[value_start:])
+                    else:
+                        tables[table].pop(key, None)
+                    self.replayed_records += 1
+        if valid < size and not newest:
+            # Later segments were written after this one; skipping the rest would leave a gap
+            raise ValueError(f"{path} is corrupt at byte {valid} and later segments exist")
+        if valid < size:
+            # Drop the torn tail so later appends are not stranded behind it
+            with open(path, "r+b") as segment_file:
+                segment_file.truncate(valid)
+
+    def open_segment(self, segment: int):
+        if self.wal is not None:
+            self.wal.close()
+        self.segment = segment
+        self.wal = open(self.segment_path(segment), "ab")
+        self.segment_bytes = self.wal.tell()
+
+    def write_snapshot(self, frames: Iterable[bytes], covered: int) -> int:
+        """Atomically replace the snapshot; returns the number of records written"""
+        temporary_path = self.snapshot_path + ".tmp"
+        records = 0
+        with open(temporary_path, "wb") as snapshot_file:
+            snapshot_file.write(SNAPSHOT_MAGIC + SNAPSHOT_HEADER.pack(covered))
+            for frame in frames:
+                snapshot_file.write(frame)
+                records += 1
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+            self.snapshot_bytes = snapshot_file.tell()
+        os.replace(temporary_path, self.snapshot_path)
+        directory = os.open(self.data_dir, os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        self.snapshot_records = records
+        return records
+
+    def put(self, table: str, key: str, value: Any):
+        self.append(self.encoder.frame(PUT, table, key, value))
+
+    def delete(self, table: str, key: str):
+        self.append(self.encoder.frame(DELETE, table, key))
+
+    def append(self, frame: bytes):
+        with self.lock:
+            self.pending.append(frame)
+            self.enqueued += 1
+            self.lock.notify_all()
+
+    async def sync(self):
+        target = self.enqueued
+        if self.committed >= target:
+            return
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self.lock:
+            if self.error is not None:
+                raise self.error
+            if self.committed >= target:
+                return
+            self.waiters.append((target, loop, future))
+        await future
+
+    def write_loop(self):
+        while True:
+            with self.lock:
+                while not self.pending and not self.snapshot_requested and not self.closing:
+                    self.lock.wait()
+                if not self.pending and self.closing:
+                    return
+                frames, self.pending = self.pending, []
+                target = self.enqueued
+            if frames:
+                self.commit(frames, target)
+            if self.snapshot_requested or self.segment_bytes >= self.snapshot_wal_bytes:
+                try:
+                    self.rotate()
+                except Exception as exc:
+                    # E.g. ENOSPC or EMFILE opening the next segment: fail the waiting writes instead of hanging them
+                    self.fail(exc)
+
+    def commit(self, frames: List[bytes], target: int):
+        data = b"".join(frames)
+        # After a failed write nothing more is acknowledged: later records would follow a gap
+        error = self.error
+        if error is None:
+            try:
+                self.wal.write(data)
+                self.wal.flush()
+                if self.fsync:
+                    os.fsync(self.wal.fileno())
+            except OSError as exc:
+                error = exc
+        with self.lock:
+            if error is None:
+                self.committed = target
+                self.segment_bytes += len(data)
+                self.commits += 1
+                self.committed_bytes += len(data)
+            else:
+                self.error = error
+            ready = [waiter for waiter in self.waiters if waiter[0] <= target]
+            self.waiters = [waiter for waiter in self.waiters if waiter[0] > target]
+        for _, loop, future in ready:
+            loop.call_soon_threadsafe(self.resolve, future, error)
+
+    def fail(self, error: Exception):
+        """Stop acknowledging writes and raise ``error`` to everyone waiting on one"""
+        with self.lock:
+            if self.error is None:
+                self.error = error
+            error = self.error
+            waiters, self.waiters = self.waiters, []
+            self.snapshot_requested = False
+            self.lock.notify_all()
+        for _, loop, future in waiters:
+            loop.call_soon_threadsafe(self.resolve, future, error)
+
+    @staticmethod
+    def resolve(future: asyncio.Future, error: Optional[Exception]):
+        if future.done():
+            return
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(error)
+
+    def rotate(self):
+        """Start a new segment and fold the closed ones into a snapshot in the background"""
+        self.open_segment(self.segment + 1)
+        with self.lock:
+            # A rotation for size alone does not answer a snapshot() still waiting for queued records
+            if self.committed >= self.snapshot_target or self.error:
+                self.snapshot_requested = False
+            self.lock.notify_all()
+        self.start_compaction()
+
+    def start_compaction(self):
+        with self.lock:
+            if self.compacting:
+                return  # The running compaction picks up the newly closed segments too
+            self.compacting = True
+        self.compactor = threading.Thread(target=self.compact_loop, name=f"{self.store_name}-snapshot", daemon=True)
+        self.compactor.start()
+
+    def compact_loop(self):
+        while True:
+            with self.lock:
+                through = self.segment - 1
+                if through <= self.covered or self.error is not None:
+                    self.compacting = False
+                    self.lock.notify_all()
+                    return
+            try:
+                self.compact(through)
+            except Exception as exc:
+                self.fail(exc)
+
+    def compact(self, through: int):
+        started_at = time.perf_counter()
+        # Encoded (table, key) -> its latest frame
+        records: Dict[bytes, bytes] = {}
+        sources = [self.snapshot_path] if os.path.exists(self.snapshot_path) else []
+        segments = [segment for segment in self.segments() if self.covered < segment <= through]
+        sources += [self.segment_path(segment) for segment in segments]
+        for path in sources:
+            if not os.path.getsize(path):
+                continue
+            with open(path, "rb") as source, mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                offset = len(SNAPSHOT_MAGIC) + SNAPSHOT_HEADER.size if path == self.snapshot_path else 0
+                for start, end, payload in iter_frames(data, offset):
+                    op, table_length, key_length = RECORD_HEADER.unpack_from(payload)
+                    # The two lengths, the table and the key
+                    record_key = payload[1:RECORD_HEADER.size + table_length + key_length]
+                    if op == PUT:
+                        records[record_key] = data[start:end]
+                    else:
+                        records.pop(record_key, None)
+        self.write_snapshot(records.values(), through)
+        for segment in segments:
+            os.remove(self.segment_path(segment))
+        with self.lock:
+            self.covered = through
+            self.snapshots += 1
+            self.last_snapshot_ms = (time.perf_counter() - started_at) * 1000
+            self.lock.notify_all()
+
+    def snapshot(self):
+        """Fold everything queued so far into a new snapshot; blocks until it is written"""
+        with self.lock:
+            if self.error is None:
+                self.snapshot_requested = True
+                self.snapshot_target = self.enqueued
+                self.lock.notify_all()
+                while self.snapshot_requested:
+                    self.lock.wait()
+                target = self.segment - 1
+                while self.covered < target and self.error is None:
+                    self.lock.wait()
+            if self.error is not None:
+                raise self.error
+
+    def close(self):
+        """Write out queued records and stop the writer"""
+        with self.lock:
+            self.closing = True
+            self.lock.notify_all()
+        if self.writer is not None:
+            self.writer.join()
+        if self.compactor is not None:
+            self.compactor.join()
+        if self.wal is not None:
+            self.wal.close()
+            self.wal = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "data_dir": self.data_dir,
+            "records": sum(len(table) for table in self.tables.values()),
+            "segment": self.segment,
+            "segment_bytes": self.segment_bytes,
+            "pending": self.enqueued - self.committed,
+            "commits": self.commits,
+            "records_per_commit": round(self.committed / self.commits, 2) if self.commits else 0.0,
+            "committed_bytes": self.committed_bytes,
+            "snapshots": self.snapshots,
+            "snapshot_records": self.snapshot_records,
+            "snapshot_bytes": self.snapshot_bytes,
+            "last_snapshot_ms": round(self.last_snapshot_ms, 3),
+            "load_ms": round(self.load_ms, 3),
+            "loaded_records": self.loaded_records,
+            "replayed_records": self.replayed_records,
+            "fsync": self.fsync,
+        }
+
+class StoreMiddleware:
+    """Refreshes the store before each request and holds the response until its writes are synced"""
+
+    def __init__(self, app, store: InMemoryStore):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_when_synced(message):
+            if message["type"] == "http.response.start":
+                await self.store.sync()
+            await send(message)
+
+        await self.store.refresh()
+        await self.app(scope, receive, send_when_synced)
+
+def create_store(
+    name: str,
+    tables: Dict[str, Dict[str, Any]],
+    enums: Iterable[type] = (),
+    data_dir: Optional[str] = DATA_DIR,
+    shared_state_url: Optional[str] = SHARED_STATE_URL,
+) -> InMemoryStore:
+    """The store for a service's tables: shared between workers under ``shared_state_url``, else durable under ``data_dir``"""
+    register_enums(enums)
+    if shared_state_url:
+        from shared_state import SharedStore
+        return SharedStore(name, tables, shared_state_url)
+    if not data_dir:
+        return InMemoryStore(tables)
+    return DurableStore(name, tables, data_dir)
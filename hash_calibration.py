@@ -0,0 +1,67 @@
+"""Calibration of the bcrypt cost to this machine's speed.
+
+``calibrate_bcrypt_rounds()`` times a few hashes at each cost from
+``MIN_BCRYPT_ROUNDS`` upwards and picks the highest cost that stays within the
+latency budget (``DEFAULT_TARGET_MS`` per hash unless told otherwise). The auth
+service runs it at startup when ``BCRYPT_ROUNDS=auto``; run this module to pick
+a fixed value offline instead:
+
+    python hash_calibration.py --target-ms 250
+
+New passwords are hashed at the chosen cost only. A stored hash at any other
+cost still verifies, and is rehashed at the current cost on the user's next
+successful login, while the plaintext is at hand, so raising or lowering the
+cost never needs a password reset.
+"""
+import argparse
+import statistics
+import time
+from typing import Any, Dict
+
+from passlib.hash import bcrypt
+
+# Never recommend a cost below this, however slow the machine
+MIN_BCRYPT_ROUNDS = 10
+MAX_BCRYPT_ROUNDS = 16
+DEFAULT_TARGET_MS = 250.0
+SAMPLES_PER_COST = 3
+
+def measure_hash_ms(rounds: int, samples: int = SAMPLES_PER_COST) -> float:
+    """Median milliseconds to hash one password at the given bcrypt cost"""
+    hasher = bcrypt.using(rounds=rounds)
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        hasher.hash("calibration-password")
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def calibrate_bcrypt_rounds(target_ms: float = DEFAULT_TARGET_MS, samples: int = SAMPLES_PER_COST) -> Dict[str, Any]:
+    """Pick the highest bcrypt cost whose hash time fits the latency budget.
+
+    Each extra round doubles the work, so costs are measured from the minimum
+    upwards and the walk stops at the first one over budget.
+    """
+    measurements: Dict[int, float] = {}
+    chosen = MIN_BCRYPT_ROUNDS
+    for rounds in range(MIN_BCRYPT_ROUNDS, MAX_BCRYPT_ROUNDS + 1):
+        measurements[rounds] = round(measure_hash_ms(rounds, samples), 3)
+        if measurements[rounds] > target_ms:
+            break
+        chosen = rounds
+    return {"rounds": chosen, "target_ms": target_ms, "measured_ms": measurements}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate the bcrypt cost for this machine")
+    parser.add_argument("--target-ms", type=float, default=DEFAULT_TARGET_MS,
+                        help="latency budget for a single password hash")
+    parser.add_argument("--samples", type=int, default=SAMPLES_PER_COST,
+                        help="hashes timed per cost")
+    args = parser.parse_args()
+
+    result = calibrate_bcrypt_rounds(args.target_ms, args.samples)
+    print(f"Target: {result['target_ms']:.0f} ms per hash")
+    for rounds, elapsed_ms in result["measured_ms"].items():
+        marker = "  <- chosen" if rounds == result["rounds"] else ""
+        print(f"  rounds {rounds:>2}: {elapsed_ms:9.1f} ms{marker}")
+    print(f"\nexport BCRYPT_ROUNDS={result['rounds']}")
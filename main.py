@@ -1,14 +1,36 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, status, Query, Request
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, ValidationError
 from passlib.context import CryptContext
-from jose import JWTError, jwt
+from jose import JWTError, jwk, jwt
+from jose.utils import base64url_encode
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from enum import Enum
+from typing import Optional, Dict, Any, Callable, Set, List
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import asyncio
+import base64
+import binascii
+import csv
+import hashlib
+import json
+import math
+import os
 import secrets
+import time
 import uuid
 
+from durable_store import InMemoryStore, StoreMiddleware, create_store
+from hash_calibration import DEFAULT_TARGET_MS, calibrate_bcrypt_rounds
+from oauth_verifier import OAuthProviderError, create_oauth_verifier
+from request_body import iter_body_lines
+from user_store import DuplicateEmailError, create_user_store, normalize_email
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Authentication Microservice",
@@ -26,16 +48,95 @@ app.add_middleware(
 )
 
 # Security configuration
-SECRET_KEY = "your-secret-key-change-in-production"
-ALGORITHM = "HS256"
+ALGORITHM = "RS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = 7
+# PEM-encoded RSA private key; without one an ephemeral key is generated at startup
+JWT_PRIVATE_KEY_FILE = os.getenv("JWT_PRIVATE_KEY_FILE")
+
+def load_signing_key() -> str:
+    """Load the RSA private key used to sign access tokens"""
+    if JWT_PRIVATE_KEY_FILE:
+        with open(JWT_PRIVATE_KEY_FILE) as key_file:
+            return key_file.read()
+    # Development fallback: tokens stop validating when the process restarts
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode()
+
+def build_public_jwk(private_key_pem: str) -> Dict[str, str]:
+    """Public half of the signing key as a JWK, with an RFC 7638 thumbprint as kid"""
+    public_jwk = jwk.construct(private_key_pem, ALGORITHM).public_key().to_dict()
+    thumbprint_input = json.dumps(
+        {"e": public_jwk["e"], "kty": public_jwk["kty"], "n": public_jwk["n"]},
+        separators=(",", ":"), sort_keys=True
+    )
+    kid = base64url_encode(hashlib.sha256(thumbprint_input.encode()).digest()).decode()
+    return {**public_jwk, "kid": kid, "use": "sig"}
+
+PRIVATE_KEY_PEM = load_signing_key()
+PUBLIC_JWK = build_public_jwk(PRIVATE_KEY_PEM)
+# Parse the keys once: loading an RSA PEM costs tens of milliseconds
+SIGNING_KEY = jwk.construct(PRIVATE_KEY_PEM, ALGORITHM)
+VERIFYING_KEY = jwk.construct(PUBLIC_JWK, ALGORITHM)
+
+# Password hashing. BCRYPT_ROUNDS pins the cost; "auto" calibrates it at startup
+# against PASSWORD_HASH_TARGET_MS (run hash_calibration.py to pick a value offline).
+BCRYPT_ROUNDS = os.getenv("BCRYPT_ROUNDS", "12")
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS", str(DEFAULT_TARGET_MS)))
 
-# Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hash_policy: Dict[str, Any] = {}
+
+def configure_password_hashing(rounds: int, **details: Any):
+    """Hash new passwords at this cost; hashes at any other cost are upgraded on login"""
+    pwd_context.update(bcrypt__rounds=rounds, bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds)
+    password_hash_policy.clear()
+    password_hash_policy.update({"scheme": "bcrypt", "rounds": rounds, **details})
+
+if BCRYPT_ROUNDS == "auto":
+    calibration = calibrate_bcrypt_rounds(PASSWORD_HASH_TARGET_MS)
+    configure_password_hashing(calibration.pop("rounds"), source="calibrated", **calibration)
+else:
+    configure_password_hashing(int(BCRYPT_ROUNDS), source="configured")
+
 security = HTTPBearer()
 
-# In-memory user storage
-users_db: Dict[str, Dict[str, Any]] = {}
+# Password hashing pool (bcrypt releases the GIL, so threads run hashes in parallel)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+
+# Maximum number of tokens accepted by one introspection call
+MAX_INTROSPECTION_TOKENS = 1000
+
+# Bulk import: rows handled per batch and processes hashing passwords
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+IMPORT_HASH_PROCESSES = int(os.getenv("IMPORT_HASH_PROCESSES", str(os.cpu_count() or 1)))
+
+# Users fetched per store query while streaming /users
+USERS_STREAM_BATCH_SIZE = 500
+
+# Revocation list sizing and pruning
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+REVOCATION_BLOOM_ERROR_RATE = 0.001
+REVOCATION_PRUNE_INTERVAL_SECONDS = 60
+
+# Verified token claims cache (0 disables caching)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+# User storage (USER_STORE_BACKEND selects "memory" or "sqlite")
+user_store = create_user_store()
+
+# OAuth token verification (OAUTH_VERIFIER selects "mock" or "http")
+oauth_verifier = create_oauth_verifier()
+
+# Enums
+class ListFormat(str, Enum):
+    JSON = "json"
+    NDJSON = "ndjson"
 
 # Pydantic models
 class UserSignup(BaseModel):
@@ -57,6 +158,13 @@ class TokenResponse(BaseModel):
     access_token: str
     token_type: str
     expires_in: int
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class RevokeRequest(BaseModel):
+    token: str
 
 class UserResponse(BaseModel):
     id: str
@@ -69,6 +177,288 @@ class UserResponse(BaseModel):
 class Enable2FARequest(BaseModel):
     enable: bool
 
+class ImportRowResult(BaseModel):
+    row: int
+    email: Optional[str] = None
+    status: str  # "created" or "error"
+    id: Optional[str] = None
+    detail: Optional[str] = None
+
+class ImportResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[ImportRowResult]
+
+class TokenIntrospectionRequest(BaseModel):
+    tokens: List[str]
+
+class TokenIntrospection(BaseModel):
+    active: bool
+    sub: Optional[str] = None
+    exp: Optional[int] = None
+
+class TokenIntrospectionResponse(BaseModel):
+    results: List[TokenIntrospection]
+
+class PasswordHashPool:
+    """Runs bcrypt work on a bounded thread pool so it never blocks the event loop"""
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.total_hash_seconds = 0.0
+        self.max_hash_seconds = 0.0
+        self.rehashed = 0
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        # Jobs beyond the busy workers wait in the executor queue; shed load once it is full
+        if self.in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Password hashing is overloaded, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+
+        submitted_at = time.perf_counter()
+
+        def timed_call():
+            started_at = time.perf_counter()
+            result = func(*args)
+            return result, started_at - submitted_at, time.perf_counter() - started_at
+
+        self.in_flight += 1
+        try:
+            result, wait_seconds, hash_seconds = await asyncio.get_running_loop().run_in_executor(
+                self.executor, timed_call
+            )
+        finally:
+            self.in_flight -= 1
+
+        self.completed += 1
+        self.total_wait_seconds += wait_seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+        self.total_hash_seconds += hash_seconds
+        self.max_hash_seconds = max(self.max_hash_seconds, hash_seconds)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        completed = self.completed or 1
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.max_workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_queue_wait_ms": round(self.total_wait_seconds * 1000 / completed, 3),
+            "max_queue_wait_ms": round(self.max_wait_seconds * 1000, 3),
+            "avg_hash_ms": round(self.total_hash_seconds * 1000 / completed, 3),
+            "max_hash_ms": round(self.max_hash_seconds * 1000, 3),
+            "rehashed_on_login": self.rehashed,
+        }
+
+password_hash_pool = PasswordHashPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
+
+# Bulk imports hash on their own process pool so they never starve interactive logins
+import_hash_pool: Optional[ProcessPoolExecutor] = None
+
+class TokenClaimsCache:
+    """Bounded LRU cache of verified token -> claims, each entry expiring at the token's exp"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.tokens_by_user: Dict[str, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        claims = self.entries.get(token)
+        if claims is None:
+            self.misses += 1
+            return None
+        if claims["exp"] <= time.time():
+            self._remove(token)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(token)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: Dict[str, Any]) -> None:
+        if self.max_size <= 0 or "exp" not in claims:
+            return
+        self.entries[token] = claims
+        self.entries.move_to_end(token)
+        self.tokens_by_user.setdefault(claims.get("sub"), set()).add(token)
+        while len(self.entries) > self.max_size:
+            oldest_token = next(iter(self.entries))
+            self._remove(oldest_token)
+            self.evictions += 1
+
+    def invalidate_user(self, user_id: str) -> None:
+        for token in self.tokens_by_user.pop(user_id, set()):
+            self.entries.pop(token, None)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.tokens_by_user.clear()
+
+    def _remove(self, token: str) -> None:
+        claims = self.entries.pop(token)
+        user_tokens = self.tokens_by_user.get(claims.get("sub"))
+        if user_tokens is not None:
+            user_tokens.discard(token)
+            if not user_tokens:
+                del self.tokens_by_user[claims.get("sub")]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+token_claims_cache = TokenClaimsCache(TOKEN_CACHE_SIZE)
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings: no false negatives, tunable false positives"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+class RevocationList:
+    """Revoked token ids (jti) kept until the token would have expired anyway.
+
+    A Bloom filter sits in front of the exact set, so checking a token that was
+    never revoked - the common case - costs a few hash probes and no dict lookup.
+    Expired entries are pruned periodically and the filter is rebuilt from what remains.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, prune_interval_seconds: int, store: InMemoryStore):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.prune_interval_seconds = prune_interval_seconds
+        # Revocations and prunes go through the store, which shares them with other workers
+        self.store = store
+        self.revoked: Dict[str, float] = store.tables["revoked"]
+        self.bloom = BloomFilter(capacity, error_rate)
+        self._rebuild_bloom()
+        store.watch("revoked", self._revoked_elsewhere)
+        self.last_pruned = time.time()
+        self.checks = 0
+        self.bloom_negatives = 0
+        self.false_positives = 0
+        self.pruned = 0
+
+    def revoke(self, jti: str, expires_at: float) -> None:
+        self._maybe_prune()
+        self.revoked[jti] = expires_at
+        self.store.put("revoked", jti, expires_at)
+        self._add_to_bloom(jti)
+
+    def _revoked_elsewhere(self, jti: str, old: Optional[float], expires_at: Optional[float]) -> None:
+        # Deletes are prunes of expired entries; a stale Bloom bit only costs a dict lookup
+        if expires_at is not None:
+            self._add_to_bloom(jti)
+
+    def _add_to_bloom(self, jti: str) -> None:
+        if len(self.revoked) > self.capacity:
+            self._rebuild_bloom()
+        else:
+            self.bloom.add(jti)
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        if jti is None:
+            return False
+        self._maybe_prune()
+        self.checks += 1
+        if jti not in self.bloom:
+            self.bloom_negatives += 1
+            return False
+        if jti not in self.revoked:
+            self.false_positives += 1
+            return False
+        return True
+
+    def prune(self) -> None:
+        now = time.time()
+        expired = [jti for jti, expires_at in self.revoked.items() if expires_at <= now]
+        for jti in expired:
+            del self.revoked[jti]
+            self.store.delete("revoked", jti)
+        self.pruned += len(expired)
+        self.last_pruned = now
+        if expired:
+            self._rebuild_bloom()
+
+    def _maybe_prune(self) -> None:
+        if time.time() - self.last_pruned >= self.prune_interval_seconds:
+            self.prune()
+
+    def _rebuild_bloom(self) -> None:
+        # Keep the false-positive rate bounded as the list grows
+        while len(self.revoked) > self.capacity:
+            self.capacity *= 2
+        self.bloom = BloomFilter(self.capacity, self.error_rate)
+        for jti in self.revoked:
+            self.bloom.add(jti)
+
+    def revoked_access_tokens(self) -> Dict[str, float]:
+        """Revoked jtis that may still be live access tokens, for the other services' verifiers"""
+        self._maybe_prune()
+        # Anything expiring later than a fresh access token would can only be a refresh token
+        latest_access_expiry = time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        return {jti: expires_at for jti, expires_at in self.revoked.items() if expires_at <= latest_access_expiry}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "revoked": len(self.revoked),
+            "bloom_capacity": self.capacity,
+            "checks": self.checks,
+            "bloom_negatives": self.bloom_negatives,
+            "false_positives": self.false_positives,
+            "pruned": self.pruned,
+        }
+
+# Shared between workers under SHARED_STATE_URL, else persisted under DATA_DIR
+revocation_store = create_store("auth", {"revoked": {}})
+revocation_store.load()
+if revocation_store.durable or revocation_store.shared:
+    app.add_middleware(StoreMiddleware, store=revocation_store)
+
+revocation_list = RevocationList(
+    REVOCATION_BLOOM_CAPACITY, REVOCATION_BLOOM_ERROR_RATE, REVOCATION_PRUNE_INTERVAL_SECONDS, revocation_store
+)
+
 # Utility functions
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -76,30 +466,86 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hash_pool.run(verify_password, plain_password, hashed_password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str):
+    """Verify a password, returning (valid, new hash if the stored one is at an outdated cost)"""
+    return await password_hash_pool.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hash_pool.run(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    to_encode.update({"exp": expire, "jti": secrets.token_urlsafe(16)})
+    encoded_jwt = jwt.encode(
+        to_encode, SIGNING_KEY, algorithm=ALGORITHM, headers={"kid": PUBLIC_JWK["kid"]}
+    )
     return encoded_jwt
 
-def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
-    for user_id, user_data in users_db.items():
-        if user_data["email"] == email:
-            return {"id": user_id, **user_data}
-    return None
+def create_refresh_token(user_id: str) -> str:
+    return create_access_token(
+        data={"sub": user_id, "type": "refresh"},
+        expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    )
 
-def authenticate_user(email: str, password: str) -> Optional[Dict[str, Any]]:
-    user = get_user_by_email(email)
-    if not user:
+def issue_tokens(user_id: str) -> Dict[str, Any]:
+    """Build the token response for a freshly authenticated user"""
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": user_id}, expires_delta=access_token_expires
+    )
+    
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        "refresh_token": create_refresh_token(user_id)
+    }
+
+async def delete_user(user_id: str) -> None:
+    """Remove a user along with its cached token claims"""
+    await user_store.delete(user_id)
+    token_claims_cache.invalidate_user(user_id)
+
+async def authenticate_user(email: str, password: str) -> Optional[Dict[str, Any]]:
+    user = await user_store.get_by_email(email)
+    if not user or not user["hashed_password"]:
         return None
-    if not verify_password(password, user["hashed_password"]):
+    valid, new_hash = await verify_and_update_password_async(password, user["hashed_password"])
+    if not valid:
         return None
+    if new_hash:
+        # Move the stored hash to the current cost while we have the plaintext
+        await user_store.update(user["id"], {"hashed_password": new_hash})
+        password_hash_pool.rehashed += 1
     return user
 
+def decode_access_token(token: str) -> Dict[str, Any]:
+    """Verify a token, serving repeat verifications from the claims cache"""
+    claims = token_claims_cache.get(token)
+    if claims is None:
+        claims = jwt.decode(token, VERIFYING_KEY, algorithms=[ALGORITHM])
+        if claims.get("type") == "refresh":
+            raise JWTError("Refresh tokens cannot be used as access tokens")
+        token_claims_cache.put(token, claims)
+    if revocation_list.is_revoked(claims.get("jti")):
+        raise JWTError("Token has been revoked")
+    return claims
+
+def decode_refresh_token(token: str) -> Dict[str, Any]:
+    claims = jwt.decode(token, VERIFYING_KEY, algorithms=[ALGORITHM])
+    if claims.get("type") != "refresh":
+        raise JWTError("Not a refresh token")
+    if revocation_list.is_revoked(claims.get("jti")):
+        raise JWTError("Token has been revoked")
+    return claims
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -107,26 +553,165 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(credentials.credentials)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    user = users_db.get(user_id)
+    user = await user_store.get(user_id)
     if user is None:
         raise credentials_exception
-    return {"id": user_id, **user}
-
-# Mock OAuth verification
-def verify_oauth_token(provider: str, access_token: str, email: str) -> bool:
-    # Mock verification - in production, you'd verify with actual OAuth providers
-    mock_tokens = {
-        "google": "mock_google_token_12345",
-        "facebook": "mock_facebook_token_67890"
+    return user
+
+def encode_cursor(position: int) -> str:
+    return base64.urlsafe_b64encode(str(position).encode()).decode()
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        position = int(base64.urlsafe_b64decode(cursor.encode()).decode())
+        if position < 0:
+            raise ValueError("negative position")
+        return position
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def public_user_fields(user_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": user_data["id"],
+        "email": user_data["email"],
+        "full_name": user_data["full_name"],
+        "is_verified": user_data["is_verified"],
+        "two_fa_enabled": user_data["two_fa_enabled"],
+        "oauth_provider": user_data.get("oauth_provider")
     }
-    return access_token == mock_tokens.get(provider, "")
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """Hash a chunk of passwords (runs inside an import worker process)"""
+    return [pwd_context.hash(password) for password in passwords]
+
+async def hash_passwords_in_parallel(passwords: List[str]) -> List[str]:
+    """Spread a batch of passwords across the import process pool"""
+    global import_hash_pool
+    if import_hash_pool is None:
+        import_hash_pool = ProcessPoolExecutor(max_workers=IMPORT_HASH_PROCESSES)
+    
+    loop = asyncio.get_running_loop()
+    chunk_size = max(1, -(-len(passwords) // IMPORT_HASH_PROCESSES))
+    chunks = [passwords[start:start + chunk_size] for start in range(0, len(passwords), chunk_size)]
+    hashed_chunks = await asyncio.gather(
+        *[loop.run_in_executor(import_hash_pool, hash_passwords, chunk) for chunk in chunks]
+    )
+    return [hashed for chunk in hashed_chunks for hashed in chunk]
+
+async def iter_import_rows(request: Request):
+    """Parse a CSV (header row first) or NDJSON import body into (row number, fields) pairs"""
+    is_csv = request.headers.get("content-type", "").startswith("text/csv")
+    header: Optional[List[str]] = None
+    row_number = 0
+    async for line in iter_body_lines(request):
+        if not line.strip():
+            continue
+        if is_csv and header is None:
+            header = [column.strip() for column in next(csv.reader([line]))]
+            continue
+        row_number += 1
+        try:
+            if is_csv:
+                fields = dict(zip(header, next(csv.reader([line]))))
+            else:
+                fields = json.loads(line)
+                if not isinstance(fields, dict):
+                    raise ValueError("expected a JSON object")
+        except ValueError as exc:
+            yield row_number, None, f"Malformed row: {exc}"
+            continue
+        yield row_number, fields, None
+
+async def import_batch(batch: List[tuple]) -> List[Dict[str, Any]]:
+    """Validate, de-duplicate, hash and insert one batch of import rows"""
+    results: Dict[int, Dict[str, Any]] = {}
+    candidates = []
+    for row_number, fields, error in batch:
+        if error:
+            results[row_number] = {"row": row_number, "status": "error", "detail": error}
+            continue
+        try:
+            candidates.append((row_number, UserSignup(**fields)))
+        except ValidationError as exc:
+            results[row_number] = {
+                "row": row_number,
+                "email": fields.get("email"),
+                "status": "error",
+                "detail": "; ".join(error["msg"] for error in exc.errors())
+            }
+    
+    # One store query checks the whole batch against registered emails
+    registered = await user_store.existing_emails(signup.email for _, signup in candidates)
+    seen_in_batch = set()
+    accepted = []
+    for row_number, signup in candidates:
+        email_key = normalize_email(signup.email)
+        if email_key in registered or email_key in seen_in_batch:
+            results[row_number] = {
+                "row": row_number, "email": signup.email, "status": "error", "detail": "Email already registered"
+            }
+        else:
+            seen_in_batch.add(email_key)
+            accepted.append((row_number, signup))
+    
+    hashed_passwords = await hash_passwords_in_parallel([signup.password for _, signup in accepted])
+    created_at = datetime.utcnow()
+    new_users = [
+        {
+            "id": str(uuid.uuid4()),
+            "email": signup.email,
+            "full_name": signup.full_name,
+            "hashed_password": hashed_password,
+            "is_verified": False,
+            "two_fa_enabled": False,
+            "created_at": created_at,
+            "oauth_provider": None
+        }
+        for (_, signup), hashed_password in zip(accepted, hashed_passwords)
+    ]
+    
+    try:
+        await user_store.add_many(new_users)
+        inserted = [True] * len(new_users)
+    except DuplicateEmailError:
+        # A concurrent signup claimed one of the emails; fall back to row-by-row inserts
+        inserted = []
+        for user in new_users:
+            try:
+                await user_store.add(user["id"], {field: value for field, value in user.items() if field != "id"})
+                inserted.append(True)
+            except DuplicateEmailError:
+                inserted.append(False)
+    
+    for (row_number, signup), user, ok in zip(accepted, new_users, inserted):
+        if ok:
+            results[row_number] = {"row": row_number, "email": signup.email, "status": "created", "id": user["id"]}
+        else:
+            results[row_number] = {
+                "row": row_number, "email": signup.email, "status": "error", "detail": "Email already registered"
+            }
+    
+    return [results[row_number] for row_number, _, _ in batch]
+
+async def verify_oauth_token(provider: str, access_token: str, email: str) -> bool:
+    try:
+        return await oauth_verifier.verify(provider, access_token, email)
+    except OAuthProviderError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="OAuth provider is unavailable, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
 
 # Routes
 @app.get("/")
@@ -134,13 +719,23 @@ async def root():
     return {
         "message": "Authentication Microservice",
         "version": "1.0.0",
-        "endpoints": ["/signup", "/login", "/oauth", "/enable-2fa", "/profile"]
+        "endpoints": ["/signup", "/login", "/oauth", "/enable-2fa", "/profile", "/tokens/refresh", "/tokens/revoke", "/tokens/revoked", "/tokens/introspect", "/metrics", "/.well-known/jwks.json"]
     }
 
+@app.get("/.well-known/jwks.json")
+async def get_jwks():
+    """Public signing keys, so other services can verify access tokens locally"""
+    return {"keys": [PUBLIC_JWK]}
+
+@app.get("/tokens/revoked")
+async def get_revoked_tokens():
+    """Revoked access token ids and their expiry, polled by the other services next to the JWKS"""
+    return {"revoked": revocation_list.revoked_access_tokens()}
+
 @app.post("/signup", response_model=TokenResponse)
 async def signup(user_data: UserSignup):
     # Check if user already exists
-    if get_user_by_email(user_data.email):
+    if await user_store.get_by_email(user_data.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
@@ -148,33 +743,31 @@ async def signup(user_data: UserSignup):
     
     # Create new user
     user_id = str(uuid.uuid4())
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     
-    users_db[user_id] = {
-        "email": user_data.email,
-        "full_name": user_data.full_name,
-        "hashed_password": hashed_password,
-        "is_verified": False,
-        "two_fa_enabled": False,
-        "created_at": datetime.utcnow(),
-        "oauth_provider": None
-    }
-    
-    # Generate access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user_id}, expires_delta=access_token_expires
-    )
+    # Another signup for the same email may complete while we are hashing
+    try:
+        await user_store.add(user_id, {
+            "email": user_data.email,
+            "full_name": user_data.full_name,
+            "hashed_password": hashed_password,
+            "is_verified": False,
+            "two_fa_enabled": False,
+            "created_at": datetime.utcnow(),
+            "oauth_provider": None
+        })
+    except DuplicateEmailError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered"
+        )
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
-    }
+    # Generate access and refresh tokens
+    return issue_tokens(user_id)
 
 @app.post("/login", response_model=TokenResponse)
 async def login(user_credentials: UserLogin):
-    user = authenticate_user(user_credentials.email, user_credentials.password)
+    user = await authenticate_user(user_credentials.email, user_credentials.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -187,56 +780,82 @@ async def login(user_credentials: UserLogin):
         # Mock 2FA check - in production, you'd verify OTP
         pass
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user["id"]}, expires_delta=access_token_expires
-    )
-    
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
-    }
+    # Generate access and refresh tokens
+    return issue_tokens(user["id"])
 
 @app.post("/oauth", response_model=TokenResponse)
 async def oauth_login(oauth_data: OAuthRequest):
-    # Verify OAuth token (mock implementation)
-    if not verify_oauth_token(oauth_data.provider, oauth_data.access_token, oauth_data.email):
+    # Verify OAuth token with the provider
+    if not await verify_oauth_token(oauth_data.provider, oauth_data.access_token, oauth_data.email):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid OAuth token"
         )
     
     # Check if user exists
-    user = get_user_by_email(oauth_data.email)
+    user = await user_store.get_by_email(oauth_data.email)
     
     if not user:
         # Create new user from OAuth
         user_id = str(uuid.uuid4())
-        users_db[user_id] = {
-            "email": oauth_data.email,
-            "full_name": oauth_data.full_name,
-            "hashed_password": None,  # OAuth users don't have passwords
-            "is_verified": True,  # OAuth users are pre-verified
-            "two_fa_enabled": False,
-            "created_at": datetime.utcnow(),
-            "oauth_provider": oauth_data.provider
-        }
-        user_id_for_token = user_id
+        try:
+            await user_store.add(user_id, {
+                "email": oauth_data.email,
+                "full_name": oauth_data.full_name,
+                "hashed_password": None,  # OAuth users don't have passwords
+                "is_verified": True,  # OAuth users are pre-verified
+                "two_fa_enabled": False,
+                "created_at": datetime.utcnow(),
+                "oauth_provider": oauth_data.provider
+            })
+            user_id_for_token = user_id
+        except DuplicateEmailError:
+            # A concurrent request registered the same email first
+            user_id_for_token = (await user_store.get_by_email(oauth_data.email))["id"]
     else:
         user_id_for_token = user["id"]
     
-    # Generate access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user_id_for_token}, expires_delta=access_token_expires
+    # Generate access and refresh tokens
+    return issue_tokens(user_id_for_token)
+
+@app.post("/tokens/refresh", response_model=TokenResponse)
+async def refresh_tokens(request: RefreshRequest):
+    """Exchange a refresh token for a new token pair, revoking the one presented"""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
     )
+    try:
+        claims = decode_refresh_token(request.refresh_token)
+    except JWTError:
+        raise credentials_exception
     
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
-    }
+    user_id = claims.get("sub")
+    if user_id is None or await user_store.get(user_id) is None:
+        raise credentials_exception
+    
+    # Rotation: each refresh token can be used exactly once
+    revocation_list.revoke(claims["jti"], claims["exp"])
+    return issue_tokens(user_id)
+
+@app.post("/tokens/revoke")
+async def revoke_token(request: RevokeRequest):
+    """Revoke an access or refresh token until it expires.
+
+    The other services learn of revoked access tokens by polling /tokens/revoked,
+    so they reject them within their REVOCATION_REFRESH_SECONDS.
+    """
+    try:
+        claims = jwt.decode(request.token, VERIFYING_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        # Invalid or expired tokens need no revocation (RFC 7009)
+        return {"message": "Token revoked successfully"}
+    
+    if claims.get("jti"):
+        revocation_list.revoke(claims["jti"], claims["exp"])
+    
+    return {"message": "Token revoked successfully"}
 
 @app.post("/enable-2fa")
 async def enable_2fa(
@@ -244,13 +863,46 @@ async def enable_2fa(
     current_user: dict = Depends(get_current_user)
 ):
     user_id = current_user["id"]
-    users_db[user_id]["two_fa_enabled"] = request.enable
+    await user_store.update(user_id, {"two_fa_enabled": request.enable})
+    token_claims_cache.invalidate_user(user_id)
     
     return {
         "message": f"2FA {'enabled' if request.enable else 'disabled'} successfully",
         "two_fa_enabled": request.enable
     }
 
+@app.post("/tokens/introspect", response_model=TokenIntrospectionResponse)
+async def introspect_tokens(request: TokenIntrospectionRequest):
+    """Validate a batch of access tokens in one round trip (results follow request order)"""
+    if len(request.tokens) > MAX_INTROSPECTION_TOKENS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_INTROSPECTION_TOKENS} tokens can be introspected per request"
+        )
+    
+    # Each distinct token is verified once, going through the claims cache
+    verified: Dict[str, Optional[Dict[str, Any]]] = {}
+    for token in request.tokens:
+        if token in verified:
+            continue
+        try:
+            verified[token] = decode_access_token(token)
+        except JWTError:
+            verified[token] = None
+    
+    # One store lookup confirms that every subject still exists
+    subjects = {claims.get("sub") for claims in verified.values() if claims}
+    existing_users = await user_store.existing_ids(subject for subject in subjects if subject)
+    
+    results: Dict[str, Dict[str, Any]] = {}
+    for token, claims in verified.items():
+        if claims is None or claims.get("sub") not in existing_users:
+            results[token] = {"active": False}
+        else:
+            results[token] = {"active": True, "sub": claims["sub"], "exp": claims["exp"]}
+    
+    return {"results": [results[token] for token in request.tokens]}
+
 @app.get("/profile", response_model=UserResponse)
 async def get_profile(current_user: dict = Depends(get_current_user)):
     return UserResponse(
@@ -262,24 +914,93 @@ async def get_profile(current_user: dict = Depends(get_current_user)):
         created_at=current_user["created_at"]
     )
 
+@app.delete("/profile")
+async def delete_profile(current_user: dict = Depends(get_current_user)):
+    """Delete the caller's account; its cached token claims are dropped with it"""
+    await delete_user(current_user["id"])
+    return {"message": "Account deleted successfully", "id": current_user["id"]}
+
 @app.get("/users")
-async def list_users():
-    """Debug endpoint to see all registered users"""
+async def list_users(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    format: ListFormat = ListFormat.JSON,
+    include_total: bool = False
+):
+    """Debug endpoint to see registered users.
+
+    JSON responses are one page of ``limit`` users plus a ``next_cursor``.
+    ``total_users`` costs a full count, so it is only filled in on the first
+    page or with ``include_total=true``, and is null otherwise.
+    ``format=ndjson`` streams every user from the cursor onwards, one JSON object
+    per line, reading the store in fixed-size batches so memory stays constant.
+    """
+    after = decode_cursor(cursor) if cursor else 0
+    
+    if format == ListFormat.NDJSON:
+        async def stream_users():
+            position = after
+            while position is not None:
+                page, position = await user_store.list_page(position, USERS_STREAM_BATCH_SIZE)
+                if page:
+                    yield "".join(json.dumps(public_user_fields(user)) + "\n" for user in page)
+        
+        return StreamingResponse(stream_users(), media_type="application/x-ndjson")
+    
+    page, next_position = await user_store.list_page(after, limit)
     return {
-        "total_users": len(users_db),
-        "users": [
-            {
-                "id": user_id,
-                "email": user_data["email"],
-                "full_name": user_data["full_name"],
-                "is_verified": user_data["is_verified"],
-                "two_fa_enabled": user_data["two_fa_enabled"],
-                "oauth_provider": user_data.get("oauth_provider")
-            }
-            for user_id, user_data in users_db.items()
-        ]
+        "total_users": await user_store.count() if cursor is None or include_total else None,
+        "users": [public_user_fields(user_data) for user_data in page],
+        "next_cursor": encode_cursor(next_position) if next_position is not None else None
     }
 
+@app.post("/users/import", response_model=ImportResponse)
+async def import_users(request: Request):
+    """Admin endpoint: bulk-create accounts from a streamed CSV or NDJSON body.
+
+    Send ``Content-Type: text/csv`` with an ``email,password,full_name`` header
+    row, or ``application/x-ndjson`` with one JSON object per line. Rows are
+    processed in batches of IMPORT_BATCH_SIZE; each row gets its own result.
+    """
+    results: List[Dict[str, Any]] = []
+    batch: List[tuple] = []
+    async for row in iter_import_rows(request):
+        batch.append(row)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            results.extend(await import_batch(batch))
+            batch = []
+    if batch:
+        results.extend(await import_batch(batch))
+    
+    created = sum(1 for result in results if result["status"] == "created")
+    return {"created": created, "failed": len(results) - created, "results": results}
+
+@app.get("/metrics")
+async def get_metrics():
+    """Operational metrics for the authentication service"""
+    return {
+        "password_hashing": {**password_hash_pool.stats(), "policy": password_hash_policy},
+        "token_cache": token_claims_cache.stats(),
+        "revocation": {**revocation_list.stats(), "store": revocation_store.stats()},
+        "user_store": {"backend": user_store.name},
+        "oauth": oauth_verifier.stats()
+    }
+
+@app.on_event("shutdown")
+async def close_connections():
+    await user_store.close()
+    await oauth_verifier.close()
+    if import_hash_pool is not None:
+        import_hash_pool.shutdown()
+    await revocation_store.sync()
+    revocation_store.close()
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    workers = int(os.getenv("WORKERS", "1"))
+    if workers > 1 and not (JWT_PRIVATE_KEY_FILE and user_store.name != "memory" and revocation_store.shared):
+        raise SystemExit(
+            "WORKERS > 1 needs JWT_PRIVATE_KEY_FILE, USER_STORE_BACKEND=sqlite and SHARED_STATE_URL, "
+            "so every worker signs with the same key and sees the same users and revocations"
+        )
+    uvicorn.run("main:app" if workers > 1 else app, host="0.0.0.0", port=8000, workers=workers)
\ No newline at end of file
@@ -1,12 +1,17 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, status, Header, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, HttpUrl
 from datetime import datetime
 from typing import Optional, Dict, Any, List, Union
 from enum import Enum
+import os
 import uuid
 
+from auth_verifier import authenticate
+from conditional_get import EntityVersions
+from durable_store import StoreMiddleware, create_store
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Course Media Management Microservice",
@@ -221,9 +226,30 @@ media_db: Dict[str, Dict[str, Any]] = {
     }
 }
 
+# Shared between workers under SHARED_STATE_URL, else persisted under DATA_DIR
+media_store = create_store("media", {"media": media_db}, enums=[MediaType, VideoProvider, DocumentType, QuestionType])
+media_store.load()
+if media_store.durable or media_store.shared:
+    app.add_middleware(StoreMiddleware, store=media_store)
+
+def media_for_course(course_id: str) -> List[Dict[str, Any]]:
+    """A course's media items, in media id order"""
+    return [media_db[media_id] for media_id in sorted(media_db) if media_db[media_id]["course_id"] == course_id]
+
+# ETags for GET /course/{course_id}/media, reset whenever a course's media changes
+media_versions = EntityVersions("course-media", media_for_course)
+
+def media_changed_elsewhere(key: str, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]):
+    """Bump the ETags of the courses a media item written by another worker was and is in"""
+    for item in (old, new):
+        if item is not None:
+            media_versions.bump(item["course_id"])
+
+media_store.watch("media", media_changed_elsewhere)
+
 # Utility functions
 async def get_current_instructor(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Mock authentication - extract instructor ID from token"""
+    """Authenticate an instructor from an auth service JWT or a mock token"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -231,17 +257,18 @@ async def get_current_instructor(credentials: HTTPAuthorizationCredentials = Dep
     )
     
     try:
-        # Mock token format: "mock_token_instructor_001"
-        if not credentials.credentials.startswith("mock_token_"):
-            raise credentials_exception
-        
-        instructor_id = credentials.credentials.replace("mock_token_", "")
-        if instructor_id not in mock_instructors:
-            raise credentials_exception
-            
-        return instructor_id
+        # Mock token format: "mock_token_instructor_001"; auth service JWTs are verified locally
+        instructor_id = await authenticate(credentials.credentials, mock_instructors)
     except Exception:
         raise credentials_exception
+    
+    # Any auth service account can sign in, but only registered instructors author courses
+    if instructor_id not in mock_instructors:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Instructor access required"
+        )
+    return instructor_id
 
 def validate_course_ownership(course_id: str, instructor_id: str):
     """Validate that instructor owns the course"""
@@ -281,7 +308,8 @@ async def root():
             "/course/{course_id}/add-video",
             "/course/{course_id}/add-document", 
             "/course/{course_id}/add-quiz",
-            "/course/{course_id}/media"
+            "/course/{course_id}/media",
+            "/metrics"
         ]
     }
 
@@ -315,6 +343,8 @@ async def add_video_to_course(
     }
     
     media_db[media_id] = new_media
+    media_store.put("media", media_id, new_media)
+    media_versions.bump(course_id)
     
     return MediaItem(**new_media)
 
@@ -347,6 +377,8 @@ async def add_document_to_course(
     }
     
     media_db[media_id] = new_media
+    media_store.put("media", media_id, new_media)
+    media_versions.bump(course_id)
     
     return MediaItem(**new_media)
 
@@ -394,12 +426,18 @@ async def add_quiz_to_course(
     }
     
     media_db[media_id] = new_media
+    media_store.put("media", media_id, new_media)
+    media_versions.bump(course_id)
     
     return MediaItem(**new_media)
 
 @app.get("/course/{course_id}/media", response_model=CourseMedia)
-async def get_course_media(course_id: str):
-    """Get all media for a course"""
+async def get_course_media(
+    course_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None)
+):
+    """Get all media for a course (answers 304 Not Modified when If-None-Match holds the current ETag)"""
     course = mock_courses.get(course_id)
     if not course:
         raise HTTPException(
@@ -407,14 +445,14 @@ async def get_course_media(course_id: str):
             detail="Course not found"
         )
     
-    # Filter media for this course
-    course_media_items = [
-        item for item in media_db.values() 
-        if item["course_id"] == course_id
-    ]
+    not_modified = media_versions.not_modified_response(course_id, if_none_match)
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = media_versions.etag(course_id)
     
+    # Filter media for this course
     # Sort by order index
-    course_media_items.sort(key=lambda x: x["order_index"])
+    course_media_items = sorted(media_for_course(course_id), key=lambda x: x["order_index"])
     
     # Calculate statistics
     total_videos = len([item for item in course_media_items if item["media_type"] == MediaType.VIDEO])
@@ -476,6 +514,8 @@ async def update_media_item(
         media_item["order_index"] = order_index
     
     media_item["updated_at"] = datetime.utcnow()
+    media_store.put("media", media_id, media_item)
+    media_versions.bump(media_item["course_id"])
     
     return {
         "message": "Media item updated successfully",
@@ -500,6 +540,8 @@ async def delete_media_item(
     validate_course_ownership(media_item["course_id"], instructor_id)
     
     del media_db[media_id]
+    media_store.delete("media", media_id)
+    media_versions.bump(media_item["course_id"])
     
     return {
         "message": "Media item deleted successfully",
@@ -531,6 +573,8 @@ async def reorder_course_media(
     for index, media_id in enumerate(media_order, 1):
         media_db[media_id]["order_index"] = index
         media_db[media_id]["updated_at"] = datetime.utcnow()
+        media_store.put("media", media_id, media_db[media_id])
+    media_versions.bump(course_id)
     
     return {
         "message": "Media order updated successfully",
@@ -578,6 +622,19 @@ async def get_question_types():
         ]
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Operational metrics for the media service"""
+    return {"conditional_get": {"course_media": media_versions.stats()}, "durable_store": media_store.stats()}
+
+@app.on_event("shutdown")
+async def close_media_store():
+    await media_store.sync()
+    media_store.close()
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8003)
\ No newline at end of file
+    workers = int(os.getenv("WORKERS", "1"))
+    if workers > 1 and not media_store.shared:
+        raise SystemExit("WORKERS > 1 needs SHARED_STATE_URL, or each worker would have its own copy of the media")
+    uvicorn.run("media_service:app" if workers > 1 else app, host="0.0.0.0", port=8003, workers=workers)
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""Local stand-in for the Google and Facebook token-info endpoints.
+
+Lets the HTTP OAuth verifier be benchmarked and tested without network access:
+
+    uvicorn oauth_provider_stub:app --port 8010
+    OAUTH_VERIFIER=http \\
+    OAUTH_GOOGLE_TOKENINFO_URL=http://localhost:8010/google/tokeninfo \\
+    OAUTH_FACEBOOK_TOKENINFO_URL=http://localhost:8010/facebook/me \\
+    OAUTH_GOOGLE_CLIENT_ID=learnx-stub-client \\
+    OAUTH_FACEBOOK_APP_SECRET=learnx-stub-secret \\
+    uvicorn main:app --port 8000
+
+Issue a token with POST /tokens, then present it to the auth service's /oauth.
+Tokens belong to STUB_CLIENT_ID unless the request names another client_id;
+Facebook calls must carry an appsecret_proof made with STUB_APP_SECRET.
+STUB_LATENCY_MS adds a delay to every verification to mimic a remote provider.
+"""
+from fastapi import FastAPI, HTTPException, status
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, EmailStr
+from typing import Dict, Optional
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "50"))
+TOKEN_LIFETIME_SECONDS = 3600
+STUB_CLIENT_ID = os.getenv("STUB_CLIENT_ID", "learnx-stub-client")
+STUB_APP_SECRET = os.getenv("STUB_APP_SECRET", "learnx-stub-secret")
+
+app = FastAPI(
+    title="OAuth Provider Stub",
+    description="Offline stand-in for OAuth provider token-info endpoints",
+    version="1.0.0"
+)
+
+class IssueTokenRequest(BaseModel):
+    provider: str  # "google" or "facebook"
+    email: EmailStr
+    client_id: str = STUB_CLIENT_ID
+
+# (provider, access token) -> (email, client id)
+issued_tokens: Dict[tuple, tuple] = {}
+verification_count = 0
+
+@app.post("/tokens")
+async def issue_token(request: IssueTokenRequest):
+    """Mint an access token for an email, as the provider's login flow would"""
+    if request.provider not in ("google", "facebook"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown provider")
+    access_token = f"stub_{request.provider}_{secrets.token_urlsafe(24)}"
+    issued_tokens[(request.provider, access_token)] = (request.email, request.client_id)
+    return {"access_token": access_token, "expires_in": TOKEN_LIFETIME_SECONDS}
+
+async def lookup(provider: str, access_token: str) -> Optional[tuple]:
+    global verification_count
+    verification_count += 1
+    await asyncio.sleep(STUB_LATENCY_MS / 1000)
+    return issued_tokens.get((provider, access_token))
+
+@app.get("/google/tokeninfo")
+async def google_tokeninfo(access_token: str):
+    """Mirrors https://oauth2.googleapis.com/tokeninfo"""
+    issued = await lookup("google", access_token)
+    if issued is None:
+        return JSONResponse(status_code=400, content={"error": "invalid_token"})
+    email, client_id = issued
+    return {
+        "aud": client_id,
+        "azp": client_id,
+        "email": email,
+        "email_verified": "true",
+        "expires_in": str(TOKEN_LIFETIME_SECONDS),
+    }
+
+@app.get("/facebook/me")
+async def facebook_me(access_token: str, fields: str = "id", appsecret_proof: str = ""):
+    """Mirrors https://graph.facebook.com/me?fields=email with appsecret_proof required"""
+    issued = await lookup("facebook", access_token)
+    if issued is None:
+        return JSONResponse(
+            status_code=400,
+            content={"error": {"message": "Invalid OAuth access token.", "type": "OAuthException", "code": 190}}
+        )
+    email, client_id = issued
+    expected_proof = hmac.new(STUB_APP_SECRET.encode(), access_token.encode(), hashlib.sha256).hexdigest()
+    if client_id != STUB_CLIENT_ID or not hmac.compare_digest(appsecret_proof, expected_proof):
+        return JSONResponse(
+            status_code=400,
+            content={"error": {
+                "message": "Invalid appsecret_proof provided in the API argument",
+                "type": "GraphMethodException",
+                "code": 100,
+            }}
+        )
+    return {"id": str(abs(hash(email))), "email": email}
+
+@app.get("/stats")
+async def get_stats():
+    return {"issued_tokens": len(issued_tokens), "verifications": verification_count}
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8010)
@@ -0,0 +1,266 @@
+"""Verification of OAuth access tokens presented to the authentication service's /oauth endpoint.
+
+``OAUTH_VERIFIER`` selects the implementation:
+
+- ``mock`` (default) accepts the fixed development tokens.
+- ``http`` asks each provider's token-info endpoint who the token belongs to. It
+  uses one shared keep-alive connection pool, per-provider timeouts and a
+  short-TTL cache, so repeat logins with the same token skip the network.
+  Point the provider URLs at oauth_provider_stub.py to run it offline.
+
+A token is only accepted if it was issued to this application: Google's
+``aud``/``azp`` must equal ``OAUTH_GOOGLE_CLIENT_ID``, and Facebook calls carry an
+``appsecret_proof`` made with ``OAUTH_FACEBOOK_APP_SECRET``, which Facebook
+rejects for tokens of other apps. A provider without its credential configured
+rejects every token.
+"""
+import asyncio
+import hashlib
+import hmac
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from user_store import normalize_email
+
+# Configuration
+OAUTH_VERIFIER = os.getenv("OAUTH_VERIFIER", "mock")
+OAUTH_CACHE_SECONDS = int(os.getenv("OAUTH_CACHE_SECONDS", "300"))
+OAUTH_CACHE_SIZE = int(os.getenv("OAUTH_CACHE_SIZE", "10000"))
+OAUTH_MAX_CONNECTIONS = int(os.getenv("OAUTH_MAX_CONNECTIONS", "100"))
+OAUTH_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OAUTH_MAX_KEEPALIVE_CONNECTIONS", "20"))
+
+class OAuthProviderError(Exception):
+    """Raised when a provider cannot be reached or answers with a server error or an unreadable body"""
+
+class OAuthProvider:
+    """Where and how long to wait when verifying one provider's tokens"""
+
+    def __init__(
+        self,
+        name: str,
+        tokeninfo_url: str,
+        timeout_seconds: float,
+        params: Optional[Dict[str, str]] = None,
+        client_id: Optional[str] = None,
+        audience_fields: Tuple[str, ...] = (),
+        app_secret: Optional[str] = None,
+    ):
+        self.name = name
+        self.tokeninfo_url = tokeninfo_url
+        self.timeout_seconds = timeout_seconds
+        # Extra query parameters sent alongside access_token
+        self.params = params or {}
+        # Our client id, matched against any of audience_fields in the token-info response
+        self.client_id = client_id
+        self.audience_fields = audience_fields
+        # Signs each call with appsecret_proof so the provider checks the token's app itself
+        self.app_secret = app_secret
+
+    @property
+    def configured(self) -> bool:
+        if self.audience_fields:
+            return bool(self.client_id)
+        return bool(self.app_secret)
+
+def provider_from_env(
+    name: str,
+    default_url: str,
+    default_timeout: str,
+    params: Optional[Dict[str, str]] = None,
+    audience_fields: Tuple[str, ...] = (),
+) -> OAuthProvider:
+    prefix = f"OAUTH_{name.upper()}"
+    return OAuthProvider(
+        name=name,
+        tokeninfo_url=os.getenv(f"{prefix}_TOKENINFO_URL", default_url),
+        timeout_seconds=float(os.getenv(f"{prefix}_TIMEOUT_SECONDS", default_timeout)),
+        params=params,
+        client_id=os.getenv(f"{prefix}_CLIENT_ID"),
+        audience_fields=audience_fields,
+        app_secret=os.getenv(f"{prefix}_APP_SECRET"),
+    )
+
+DEFAULT_PROVIDERS = {
+    "google": provider_from_env(
+        "google", "https://oauth2.googleapis.com/tokeninfo", "2.0", audience_fields=("aud", "azp")
+    ),
+    "facebook": provider_from_env("facebook", "https://graph.facebook.com/me", "3.0", {"fields": "email"}),
+}
+
+class OAuthVerifier(ABC):
+    """Checks that an OAuth access token was issued by ``provider`` for ``email``"""
+
+    name = "base"
+
+    @abstractmethod
+    async def verify(self, provider: str, access_token: str, email: str) -> bool:
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        return {"verifier": self.name}
+
+    async def close(self) -> None:
+        pass
+
+class MockOAuthVerifier(OAuthVerifier):
+    """Development verifier: accepts one fixed token per provider"""
+
+    name = "mock"
+
+    mock_tokens = {
+        "google": "mock_google_token_12345",
+        "facebook": "mock_facebook_token_67890"
+    }
+
+    async def verify(self, provider: str, access_token: str, email: str) -> bool:
+        return access_token == self.mock_tokens.get(provider, "")
+
+class HTTPOAuthVerifier(OAuthVerifier):
+    """Verifies tokens against the providers' token-info endpoints"""
+
+    name = "http"
+
+    def __init__(
+        self,
+        providers: Dict[str, OAuthProvider],
+        cache_seconds: int = OAUTH_CACHE_SECONDS,
+        cache_size: int = OAUTH_CACHE_SIZE,
+        max_connections: int = OAUTH_MAX_CONNECTIONS,
+        max_keepalive_connections: int = OAUTH_MAX_KEEPALIVE_CONNECTIONS,
+    ):
+        self.providers = providers
+        self.cache_seconds = cache_seconds
+        self.cache_size = cache_size
+        self.limits = httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_keepalive_connections
+        )
+        self.client: Optional[httpx.AsyncClient] = None
+        # (provider, token digest) -> (normalized email, expires at)
+        self.cache: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        # Concurrent verifications of the same token share one provider call
+        self.in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.provider_calls = 0
+        self.provider_errors = 0
+        self.total_call_seconds = 0.0
+
+    def get_client(self) -> httpx.AsyncClient:
+        # Created lazily so the client binds to the running event loop
+        if self.client is None:
+            self.client = httpx.AsyncClient(limits=self.limits)
+        return self.client
+
+    async def fetch_identity(self, provider: OAuthProvider, access_token: str) -> Tuple[Optional[str], float]:
+        """Ask the provider who owns the token; returns (email or None, seconds to cache it)"""
+        params = {**provider.params, "access_token": access_token}
+        if provider.app_secret:
+            params["appsecret_proof"] = hmac.new(
+                provider.app_secret.encode(), access_token.encode(), hashlib.sha256
+            ).hexdigest()
+        self.provider_calls += 1
+        started_at = time.perf_counter()
+        try:
+            response = await self.get_client().get(
+                provider.tokeninfo_url, params=params, timeout=provider.timeout_seconds
+            )
+        except httpx.HTTPError as exc:
+            self.provider_errors += 1
+            raise OAuthProviderError(f"{provider.name} token verification failed: {exc}")
+        finally:
+            self.total_call_seconds += time.perf_counter() - started_at
+
+        return self.parse_identity(provider, response)
+
+    def parse_identity(self, provider: OAuthProvider, response: httpx.Response) -> Tuple[Optional[str], float]:
+        if response.status_code >= 500:
+            self.provider_errors += 1
+            raise OAuthProviderError(f"{provider.name} token verification failed: HTTP {response.status_code}")
+        if response.status_code != 200:
+            return None, 0
+
+        try:
+            identity = response.json()
+            if not isinstance(identity, dict):
+                raise ValueError(f"expected an object, got {type(identity).__name__}")
+            expires_in = int(identity["expires_in"]) if "expires_in" in identity else None
+        except (ValueError, TypeError) as exc:
+            self.provider_errors += 1
+            raise OAuthProviderError(f"{provider.name} token verification failed: unreadable response ({exc})")
+
+        if provider.audience_fields and not any(
+            identity.get(field) == provider.client_id for field in provider.audience_fields
+        ):
+            # Issued to another application; it must not log in here
+            return None, 0
+        email = identity.get("email")
+        # Google reports email_verified as the string "true"; Facebook only returns verified emails
+        if not isinstance(email, str) or not email or str(identity.get("email_verified", "true")).lower() != "true":
+            return None, 0
+        ttl = self.cache_seconds
+        if expires_in is not None:
+            ttl = min(ttl, expires_in)
+        return normalize_email(email), ttl
+
+    async def verify(self, provider: str, access_token: str, email: str) -> bool:
+        config = self.providers.get(provider)
+        if config is None or not config.configured:
+            return False
+
+        key = (provider, hashlib.sha256(access_token.encode()).hexdigest())
+        cached = self.cache.get(key)
+        if cached is not None and cached[1] > time.monotonic():
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return cached[0] == normalize_email(email)
+        self.misses += 1
+
+        pending = self.in_flight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self.fetch_identity(config, access_token))
+            self.in_flight[key] = pending
+            try:
+                token_email, ttl = await asyncio.shield(pending)
+            finally:
+                del self.in_flight[key]
+            if token_email is not None and ttl > 0 and self.cache_size > 0:
+                self.cache[key] = (token_email, time.monotonic() + ttl)
+                self.cache.move_to_end(key)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        else:
+            token_email, _ = await asyncio.shield(pending)
+
+        return token_email is not None and token_email == normalize_email(email)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        calls = self.provider_calls or 1
+        return {
+            "verifier": self.name,
+            "cache_entries": len(self.cache),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "provider_calls": self.provider_calls,
+            "provider_errors": self.provider_errors,
+            "avg_provider_call_ms": round(self.total_call_seconds * 1000 / calls, 3),
+        }
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+def create_oauth_verifier(verifier: str = OAUTH_VERIFIER) -> OAuthVerifier:
+    """Build the verifier selected by OAUTH_VERIFIER"""
+    if verifier == "mock":
+        return MockOAuthVerifier()
+    if verifier == "http":
+        return HTTPOAuthVerifier(DEFAULT_PROVIDERS)
+    raise ValueError(f"Unknown OAuth verifier: {verifier}")
@@ -1,13 +1,17 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, status, Header, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, HttpUrl
-from jose import JWTError, jwt
 from datetime import datetime
 from typing import Optional, Dict, Any, List
 from enum import Enum
+import os
 import uuid
 
+from auth_verifier import authenticate
+from conditional_get import EntityVersions
+from durable_store import StoreMiddleware, create_store
+
 # Initialize FastAPI app
 app = FastAPI(
     title="User Profile Management Microservice",
@@ -25,8 +29,6 @@ app.add_middleware(
 )
 
 # Security configuration
-SECRET_KEY = "your-secret-key-change-in-production"
-ALGORITHM = "HS256"
 security = HTTPBearer()
 
 # Enums
@@ -181,27 +183,30 @@ settings_db: Dict[str, Dict[str, Any]] = {
     }
 }
 
+# Shared between workers under SHARED_STATE_URL, else persisted under DATA_DIR
+profile_store = create_store(
+    "profiles", {"profiles": profiles_db, "settings": settings_db}, enums=[UserRole, Language, Timezone]
+)
+profile_store.load()
+if profile_store.durable or profile_store.shared:
+    app.add_middleware(StoreMiddleware, store=profile_store)
+
+# ETags for GET /profile/{user_id}, reset whenever a profile changes
+profile_versions = EntityVersions("profile", lambda user_id: profiles_db.get(user_id))
+profile_store.watch("profiles", lambda user_id, old, new: profile_versions.bump(user_id))
+
 # Utility functions
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Mock authentication - in production, verify JWT token"""
+    """Authenticate a user from an auth service JWT or a mock token"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    # Mock JWT verification - in production, decode and verify the token
-    # For demo purposes, we'll extract user_id from a mock token format
     try:
-        # Mock token format: "mock_token_user_001"
-        if not credentials.credentials.startswith("mock_token_"):
-            raise credentials_exception
-        
-        user_id = credentials.credentials.replace("mock_token_", "")
-        if user_id not in profiles_db:
-            raise credentials_exception
-            
-        return user_id
+        # Mock token format: "mock_token_user_001"; auth service JWTs are verified locally
+        return await authenticate(credentials.credentials, profiles_db)
     except Exception:
         raise credentials_exception
 
@@ -219,12 +224,12 @@ async def root():
     return {
         "message": "User Profile Management Microservice",
         "version": "1.0.0",
-        "endpoints": ["/profile/{user_id}", "/profile/update", "/settings/{user_id}", "/settings/update", "/roles"]
+        "endpoints": ["/profile/{user_id}", "/profile/update", "/settings/{user_id}", "/settings/update", "/roles", "/metrics"]
     }
 
 @app.get("/profile/{user_id}", response_model=UserProfile)
-async def get_profile(user_id: str):
-    """Get user profile by ID"""
+async def get_profile(user_id: str, response: Response, if_none_match: Optional[str] = Header(None)):
+    """Get user profile by ID (answers 304 Not Modified when If-None-Match holds the current ETag)"""
     profile = get_profile_by_id(user_id)
     if not profile:
         raise HTTPException(
@@ -232,6 +237,11 @@ async def get_profile(user_id: str):
             detail="User profile not found"
         )
     
+    not_modified = profile_versions.not_modified_response(user_id, if_none_match)
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = profile_versions.etag(user_id)
+    
     return UserProfile(**profile)
 
 @app.get("/profile/{user_id}/complete", response_model=CompleteProfileResponse)
@@ -256,6 +266,7 @@ async def get_complete_profile(user_id: str):
             "marketing_notifications": False
         }
         settings_db[user_id] = settings
+        profile_store.put("settings", user_id, settings)
     
     return CompleteProfileResponse(
         profile=UserProfile(**profile),
@@ -286,6 +297,8 @@ async def update_profile(
     
     # Update timestamp
     profile["updated_at"] = datetime.utcnow()
+    profile_store.put("profiles", current_user_id, profile)
+    profile_versions.bump(current_user_id)
     
     return {
         "message": "Profile updated successfully",
@@ -306,6 +319,7 @@ async def get_settings(user_id: str):
             "marketing_notifications": False
         }
         settings_db[user_id] = default_settings
+        profile_store.put("settings", user_id, default_settings)
         return UserSettings(**default_settings)
     
     return UserSettings(**settings)
@@ -332,6 +346,7 @@ async def update_settings(
     update_dict = update_data.dict(exclude_unset=True)
     for field, value in update_dict.items():
         settings[field] = value
+    profile_store.put("settings", current_user_id, settings)
     
     return {
         "message": "Settings updated successfully",
@@ -363,6 +378,8 @@ async def update_user_role(
     # Update role
     profiles_db[user_id]["role"] = role_data.role
     profiles_db[user_id]["updated_at"] = datetime.utcnow()
+    profile_store.put("profiles", user_id, profiles_db[user_id])
+    profile_versions.bump(user_id)
     
     return {
         "message": f"User role updated to {role_data.role}",
@@ -443,6 +460,19 @@ async def get_available_timezones():
         ]
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Operational metrics for the profile service"""
+    return {"conditional_get": {"profile": profile_versions.stats()}, "durable_store": profile_store.stats()}
+
+@app.on_event("shutdown")
+async def close_profile_store():
+    await profile_store.sync()
+    profile_store.close()
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    workers = int(os.getenv("WORKERS", "1"))
+    if workers > 1 and not profile_store.shared:
+        raise SystemExit("WORKERS > 1 needs SHARED_STATE_URL, or each worker would have its own copy of the profiles")
+    uvicorn.run("profile_service:app" if workers > 1 else app, host="0.0.0.0", port=8001, workers=workers)
\ No newline at end of file
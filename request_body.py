@@ -0,0 +1,23 @@
+"""Streaming readers for request bodies shared by the services.
+
+Bulk endpoints accept line-oriented bodies (CSV, NDJSON) that can be far larger
+than a single request should hold in memory, so they read them line by line as
+the chunks arrive rather than awaiting the whole body first.
+"""
+import codecs
+from typing import AsyncIterator
+
+from fastapi import Request
+
+async def iter_body_lines(request: Request) -> AsyncIterator[str]:
+    """Yield the request body line by line as it arrives"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    async for chunk in request.stream():
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
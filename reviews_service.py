@@ -1,12 +1,17 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Query
+from fastapi import FastAPI, HTTPException, Depends, status, Query, Header, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from datetime import datetime
 from typing import Optional, Dict, Any, List
 from enum import Enum
+import os
 import uuid
 
+from auth_verifier import authenticate
+from conditional_get import EntityVersions
+from durable_store import StoreMiddleware, create_store
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Course Reviews and Ratings Microservice",
@@ -100,6 +105,13 @@ mock_users = {
     "user_008": {"name": "Henry Chen", "role": "student", "avatar": "https://images.pexels.com/photos/1681010/pexels-photo-1681010.jpeg?auto=compress&cs=tinysrgb&w=150"},
 }
 
+# Auth service accounts without an entry above review as students under this name
+DEFAULT_REVIEWER = {"name": "LearnX Learner", "role": UserRole.STUDENT, "avatar": None}
+
+def reviewer(user_id: str) -> Dict[str, Any]:
+    """Display name, role and avatar of a user, falling back to DEFAULT_REVIEWER"""
+    return mock_users.get(user_id, DEFAULT_REVIEWER)
+
 # Mock course data for validation
 mock_courses = {
     "course_001": {"title": "Complete Web Development Bootcamp", "instructor_id": "user_001"},
@@ -184,9 +196,30 @@ reviews_db: Dict[str, Dict[str, Any]] = {
     }
 }
 
+# Shared between workers under SHARED_STATE_URL, else persisted under DATA_DIR
+review_store = create_store("reviews", {"reviews": reviews_db})
+review_store.load()
+if review_store.durable or review_store.shared:
+    app.add_middleware(StoreMiddleware, store=review_store)
+
+def reviews_for_course(course_id: str) -> List[Dict[str, Any]]:
+    """A course's reviews, in review id order"""
+    return [reviews_db[review_id] for review_id in sorted(reviews_db) if reviews_db[review_id]["course_id"] == course_id]
+
+# ETags for GET /reviews/course/{course_id}, reset whenever a course's reviews change
+review_versions = EntityVersions("course-reviews", reviews_for_course)
+
+def review_changed_elsewhere(key: str, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]):
+    """Bump the ETags of the courses a review written by another worker was and is in"""
+    for item in (old, new):
+        if item is not None:
+            review_versions.bump(item["course_id"])
+
+review_store.watch("reviews", review_changed_elsewhere)
+
 # Utility functions
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Mock authentication - extract user ID from token"""
+    """Authenticate a user from an auth service JWT or a mock token"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -194,15 +227,8 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     )
     
     try:
-        # Mock token format: "mock_token_user_001"
-        if not credentials.credentials.startswith("mock_token_"):
-            raise credentials_exception
-        
-        user_id = credentials.credentials.replace("mock_token_", "")
-        if user_id not in mock_users:
-            raise credentials_exception
-            
-        return user_id
+        # Mock token format: "mock_token_user_001"; auth service JWTs are verified locally
+        return await authenticate(credentials.credentials, mock_users)
     except Exception:
         raise credentials_exception
 
@@ -273,7 +299,8 @@ async def root():
             "/reviews/create",
             "/reviews/course/{course_id}",
             "/reviews/{review_id}",
-            "/courses/{course_id}/rating-stats"
+            "/courses/{course_id}/rating-stats",
+            "/metrics"
         ]
     }
 
@@ -308,7 +335,7 @@ async def create_review(
         )
     
     review_id = str(uuid.uuid4())
-    user_info = mock_users[user_id]
+    user_info = reviewer(user_id)
     
     new_review = {
         "review_id": review_id,
@@ -324,24 +351,31 @@ async def create_review(
     }
     
     reviews_db[review_id] = new_review
+    review_store.put("reviews", review_id, new_review)
+    review_versions.bump(review_data.course_id)
     
     return Review(**new_review)
 
 @app.get("/reviews/course/{course_id}", response_model=ReviewListResponse)
 async def get_course_reviews(
     course_id: str,
+    response: Response,
     sort_by: SortBy = SortBy.DATE_NEW,
     page: int = Query(1, ge=1),
-    limit: int = Query(10, ge=1, le=100)
+    limit: int = Query(10, ge=1, le=100),
+    if_none_match: Optional[str] = Header(None)
 ):
-    """Get all reviews for a course with sorting and pagination"""
+    """Get all reviews for a course with sorting and pagination (answers 304 Not Modified when If-None-Match holds the current ETag)"""
     validate_course_exists(course_id)
     
-    # Get all reviews for the course
-    course_reviews = [r for r in reviews_db.values() if r["course_id"] == course_id]
+    not_modified = review_versions.not_modified_response(course_id, if_none_match)
+    if not_modified:
+        return not_modified
+    response.headers["ETag"] = review_versions.etag(course_id)
     
+    # Get all reviews for the course
     # Sort reviews
-    sorted_reviews = sort_reviews(course_reviews, sort_by)
+    sorted_reviews = sort_reviews(reviews_for_course(course_id), sort_by)
     
     # Calculate statistics
     stats = calculate_rating_stats(course_id)
@@ -403,6 +437,8 @@ async def update_review(
     
     # Update timestamp
     review["updated_at"] = datetime.utcnow()
+    review_store.put("reviews", review_id, review)
+    review_versions.bump(review["course_id"])
     
     return Review(**review)
 
@@ -420,7 +456,7 @@ async def delete_review(
         )
     
     # Check if user owns the review or is admin
-    user_role = mock_users[user_id]["role"]
+    user_role = reviewer(user_id)["role"]
     if review["user_id"] != user_id and user_role != UserRole.ADMIN:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -428,6 +464,8 @@ async def delete_review(
         )
     
     del reviews_db[review_id]
+    review_store.delete("reviews", review_id)
+    review_versions.bump(review["course_id"])
     
     return {
         "message": "Review deleted successfully",
@@ -461,6 +499,8 @@ async def mark_review_helpful(
         review["helpful_count"] += 1
     else:
         review["helpful_count"] = max(0, review["helpful_count"] - 1)
+    review_store.put("reviews", review_id, review)
+    review_versions.bump(review["course_id"])
     
     return {
         "message": f"Review marked as {'helpful' if helpful_data.helpful else 'not helpful'}",
@@ -494,15 +534,16 @@ async def get_user_reviews(
     limit: int = Query(10, ge=1, le=100)
 ):
     """Get all reviews by a specific user"""
-    if user_id not in mock_users:
+    # Get all reviews by the user
+    user_reviews = [r for r in reviews_db.values() if r["user_id"] == user_id]
+    
+    # Auth service accounts are only known here once they have reviewed something
+    if user_id not in mock_users and not user_reviews:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    # Get all reviews by the user
-    user_reviews = [r for r in reviews_db.values() if r["user_id"] == user_id]
-    
     # Sort by date (newest first)
     sorted_reviews = sorted(user_reviews, key=lambda x: x["created_at"], reverse=True)
     
@@ -517,7 +558,7 @@ async def get_user_reviews(
         "reviews": [Review(**review) for review in paginated_reviews],
         "page": page,
         "limit": limit,
-        "user_name": mock_users[user_id]["name"]
+        "user_name": reviewer(user_id)["name"]
     }
 
 @app.get("/reviews/top-rated")
@@ -547,6 +588,19 @@ async def get_top_rated_courses(limit: int = Query(10, ge=1, le=50)):
         "top_rated_courses": top_courses
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Operational metrics for the reviews service"""
+    return {"conditional_get": {"course_reviews": review_versions.stats()}, "durable_store": review_store.stats()}
+
+@app.on_event("shutdown")
+async def close_review_store():
+    await review_store.sync()
+    review_store.close()
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8004)
\ No newline at end of file
+    workers = int(os.getenv("WORKERS", "1"))
+    if workers > 1 and not review_store.shared:
+        raise SystemExit("WORKERS > 1 needs SHARED_STATE_URL, or each worker would have its own copy of the reviews")
+    uvicorn.run("reviews_service:app" if workers > 1 else app, host="0.0.0.0", port=8004, workers=workers)
\ No newline at end of file
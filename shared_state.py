@@ -0,0 +1,667 @@
+"""Shared state so a service can run several uvicorn workers.
+
+Each worker keeps serving reads from its own dicts, the same way a single
+process does. ``SharedStore`` turns those dicts into replicas of a shared
+keyspace on a Redis-protocol server: Redis itself, or the stand-in in this
+module (``python shared_state.py``). Point ``SHARED_STATE_URL`` at it, e.g.
+``redis://localhost:6379/learnx``.
+
+- Writes go through the same ``put()``/``delete()`` calls the durable store
+  uses. When the response starts, a worker pushes them in one MULTI/EXEC that
+  appends them to a change list and updates one hash per table.
+- Before each request a worker reads the change list from where it left off,
+  in one round trip, and applies the other workers' writes. A watcher per
+  table keeps derived state (indexes, caches, ETag versions) in step. A
+  follower sees every write, this worker's own included, in change-list order
+  with its position, which every worker numbers the same way.
+- The first worker to start against an empty server uploads its seed data.
+  Later workers download the hashes and follow the change list from there. A
+  worker that falls behind the trimmed list, or finds the server emptied by a
+  restart, does the same download or upload again.
+
+Concurrent writes to the same record from different workers are
+last-writer-wins. The stand-in keeps everything in memory; use Redis with
+``appendonly yes`` when the shared state has to survive a restart.
+"""
+import asyncio
+import os
+import pickle
+import socket
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from durable_store import DELETE, FRAME_HEADER, PUT, InMemoryStore, RecordEncoder, iter_frames, parse_payload
+
+# Configuration
+# Change-list entries kept once the list has grown to twice this size
+SHARED_CHANGE_LOG_SIZE = int(os.getenv("SHARED_CHANGE_LOG_SIZE", "100000"))
+# How long a starting worker waits for another worker's seed upload
+SHARED_STATE_READY_SECONDS = float(os.getenv("SHARED_STATE_READY_SECONDS", "30"))
+
+class RESPError(Exception):
+    """An error reply"""
+
+class WrongType(Exception):
+    """A command was used on a key holding another type"""
+
+class Incomplete(Exception):
+    """The buffer ends part-way through a value"""
+
+def encode_command(*args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif isinstance(arg, int):
+            arg = b"%d" % arg
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+def encode_reply(value: Any) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, RESPError):
+        return b"-%s\r\n" % str(value).encode()
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode()
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    return b"*%d\r\n" % len(value) + b"".join(encode_reply(item) for item in value)
+
+class RESPParser:
+    """Incremental RESP parser, fed whatever arrives from the socket"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.start = 0
+
+    def feed(self, data: bytes):
+        if self.start and self.start * 2 > len(self.buffer):
+            del self.buffer[:self.start]
+            self.start = 0
+        self.buffer += data
+
+    def pop(self) -> Tuple[bool, Any]:
+        """(True, value) for the next complete value, or (False, None) when more data is needed"""
+        try:
+            value, self.start = self.parse(self.start)
+        except Incomplete:
+            return False, None
+        return True, value
+
+    def parse(self, position: int) -> Tuple[Any, int]:
+        buffer = self.buffer
+        line_end = buffer.find(b"\r\n", position)
+        if line_end < 0:
+            raise Incomplete()
+        kind = buffer[position]
+        body = bytes(buffer[position + 1:line_end])
+        position = line_end + 2
+        if kind == 0x24:  # $ bulk string
+            length = int(body)
+            if length < 0:
+                return None, position
+            if len(buffer) < position + length + 2:
+                raise Incomplete()
+            return bytes(buffer[position:position + length]), position + length + 2
+        if kind == 0x2A:  # * array
+            length = int(body)
+            if length < 0:
+                return None, position
+            items = []
+            for _ in range(length):
+                item, position = self.parse(position)
+                items.append(item)
+            return items, position
+        if kind == 0x3A:  # : integer
+            return int(body), position
+        if kind == 0x2B:  # + simple string
+            return body.decode(), position
+        if kind == 0x2D:  # - error
+            return RESPError(body.decode()), position
+        raise ValueError(f"Protocol error: unexpected {chr(kind)!r}")
+
+def raise_errors(replies: List[Any]) -> List[Any]:
+    for reply in replies:
+        if isinstance(reply, RESPError):
+            raise reply
+    return replies
+
+class BlockingRESPConnection:
+    """Blocking client for startup, which may run inside an event loop that is not ours to use"""
+
+    def __init__(self, host: str, port: int):
+        self.sock = socket.create_connection((host, port))
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.parser = RESPParser()
+
+    def execute(self, *commands: tuple) -> List[Any]:
+        """Send the commands as one pipeline and return their replies"""
+        self.sock.sendall(b"".join(encode_command(*command) for command in commands))
+        replies = []
+        while len(replies) < len(commands):
+            complete, value = self.parser.pop()
+            if complete:
+                replies.append(value)
+                continue
+            data = self.sock.recv(1 << 20)
+            if not data:
+                raise ConnectionError("Shared state server closed the connection")
+            self.parser.feed(data)
+        return raise_errors(replies)
+
+    def close(self):
+        self.sock.close()
+
+class RESPConnection:
+    """asyncio client; pipelines are sent one at a time"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.parser = RESPParser()
+        self.lock = asyncio.Lock()
+
+    async def execute(self, *commands: tuple) -> List[Any]:
+        """Send the commands as one pipeline and return their replies"""
+        async with self.lock:
+            replies = []
+            try:
+                if self.writer is None:
+                    self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+                self.writer.write(b"".join(encode_command(*command) for command in commands))
+                while len(replies) < len(commands):
+                    complete, value = self.parser.pop()
+                    if complete:
+                        replies.append(value)
+                        continue
+                    data = await self.reader.read(1 << 20)
+                    if not data:
+                        raise ConnectionError("Shared state server closed the connection")
+                    self.parser.feed(data)
+            except BaseException:
+                # A half-read pipeline leaves the stream out of step; reconnect next time
+                self.close()
+                raise
+        return raise_errors(replies)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+        self.parser = RESPParser()
+
+def decode_frame(frame: bytes, offset: int = 0) -> Tuple[int, str, str, Any]:
+    """(op, table, key, record or None) of one durable_store frame"""
+    payload = next(iter_frames(frame, offset))[2]
+    op, table, key, value_start = parse_payload(payload)
+    return op, table, key, pickle.loads(payload[value_start:]) if op == PUT else None
+
+class SharedStore(InMemoryStore):
+    """A worker's tables, kept as a replica of shared state on a Redis-protocol server"""
+
+    name = "shared"
+    shared = True
+
+    def __init__(
+        self, store_name: str, tables: Dict[str, Dict[str, Any]], url: str, max_changes: int = SHARED_CHANGE_LOG_SIZE
+    ):
+        super().__init__(tables)
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        prefix = f"{parsed.path.strip('/') or 'learnx'}:{store_name}"
+        self.changes_key = f"{prefix}:changes"
+        self.trimmed_key = f"{prefix}:trimmed"
+        self.epoch_key = f"{prefix}:epoch"
+        self.ready_key = f"{prefix}:ready"
+        self.table_keys = {table: f"{prefix}:table:{table}" for table in tables}
+        self.max_changes = max_changes
+        # Change-list entries are this id followed by a durable_store frame
+        self.worker_id = uuid.uuid4().hex[:8].encode()
+        self.encoder = RecordEncoder()
+        self.connection: Optional[RESPConnection] = None
+        # One refresh at a time: each reads from the position the previous one applied up to
+        self.refresh_lock = asyncio.Lock()
+        # table -> callback(key, old record, new record or None), run after applying another worker's write
+        self.watchers: Dict[str, Callable[[str, Any, Any], None]] = {}
+        # table -> (callback(key, position, record or None), restart(epoch, position)); see follow()
+        self.followers: Dict[str, Tuple[Callable[[str, int, Any], None], Callable[[str, int], None]]] = {}
+
+        self.epoch: Optional[bytes] = None
+        self.seq = 0  # Change-list position, counting trimmed entries, applied up to
+        self.trimmed = 0  # Entries trimmed off the front of the list as of the last read
+        self.pending: List[Tuple[str, str, bytes]] = []  # (table, key, frame) not yet pushed
+        # (table, key) -> local writes not yet pushed; older writes from other workers must not overwrite them
+        self.unpushed: Dict[Tuple[str, str], int] = {}
+        # (table, key) -> position of this worker's latest pushed write
+        self.written: Dict[Tuple[str, str], int] = {}
+
+        self.pushes = 0
+        self.pushed = 0
+        self.pulls = 0
+        self.coalesced = 0
+        self.applied = 0
+        self.skipped_own = 0
+        self.trims = 0
+        self.uploads = 0
+        self.resyncs = 0
+
+    def watch(self, table: str, callback: Callable[[str, Any, Any], None]):
+        self.watchers[table] = callback
+
+    def follow(self, table: str, callback: Callable[[str, int, Any], None], restart: Callable[[str, int], None]):
+        self.followers[table] = (callback, restart)
+        if self.epoch is not None:
+            restart(self.epoch.decode()[:8], self.seq)
+
+    def put(self, table: str, key: str, value: Any):
+        self.queue(table, key, self.encoder.frame(PUT, table, key, value))
+
+    def delete(self, table: str, key: str):
+        self.queue(table, key, self.encoder.frame(DELETE, table, key))
+
+    def queue(self, table: str, key: str, frame: bytes):
+        self.pending.append((table, key, frame))
+        self.unpushed[(table, key)] = self.unpushed.get((table, key), 0) + 1
+
+    # Joining
+    def load(self) -> bool:
+        """Upload the tables if the server has none, otherwise replace them with the server's"""
+        connection = BlockingRESPConnection(self.host, self.port)
+        try:
+            epoch = uuid.uuid4().hex.encode()
+            if connection.execute(("SET", self.epoch_key, epoch, "NX"))[0] == "OK":
+                connection.execute(*self.upload_commands())
+                self.joined(epoch, 0)
+                return False
+            deadline = time.monotonic() + SHARED_STATE_READY_SECONDS
+            while connection.execute(("GET", self.ready_key))[0] is None:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"{self.epoch_key} was claimed but its tables were never uploaded")
+                time.sleep(0.05)
+            self.apply_download(connection.execute(*self.download_commands())[-1], notify=False)
+            return True
+        finally:
+            connection.close()
+
+    def upload_commands(self) -> List[tuple]:
+        """Replace the server's tables with this worker's and start an empty change list"""
+        self.uploads += 1
+        commands = [("MULTI",), ("DEL", self.changes_key, *self.table_keys.values()), ("SET", self.trimmed_key, 0)]
+        for table, rows in self.tables.items():
+            fields = []
+            for key, value in rows.items():
+                fields += [key, self.encoder.frame(PUT, table, key, value)]
+                if len(fields) >= 2000:
+                    commands.append(("HSET", self.table_keys[table], *fields))
+                    fields = []
+            if fields:
+                commands.append(("HSET", self.table_keys[table], *fields))
+        commands += [("SET", self.ready_key, 1), ("EXEC",)]
+        return commands
+
+    def download_commands(self) -> List[tuple]:
+        return [
+            ("MULTI",),
+            ("GET", self.epoch_key),
+            ("GET", self.trimmed_key),
+            ("LLEN", self.changes_key),
+            *(("HGETALL", key) for key in self.table_keys.values()),
+            ("EXEC",),
+        ]
+
+    def apply_download(self, results: List[Any], notify: bool = True):
+        epoch, trimmed, length, *hashes = results
+        for table, fields in zip(self.table_keys, hashes):
+            downloaded = {fields[index].decode(): decode_frame(fields[index + 1])[3] for index in range(0, len(fields), 2)}
+            rows = self.tables[table]
+            if not notify:
+                rows.clear()
+                rows.update(downloaded)
+                continue
+            for key in [key for key in rows if key not in downloaded]:
+                self.apply(table, key, None)
+            for key, value in downloaded.items():
+                if rows.get(key) != value:
+                    self.apply(table, key, value)
+        self.joined(epoch, int(trimmed or 0) + length)
+
+    def joined(self, epoch: bytes, seq: int):
+        self.epoch = epoch
+        self.seq = seq
+        self.trimmed = seq
+        self.written.clear()
+        for _, restart in self.followers.values():
+            restart(epoch.decode()[:8], seq)
+
+    # Request path
+    def get_connection(self) -> RESPConnection:
+        # Opened on first use so it belongs to the worker's event loop
+        if self.connection is None:
+            self.connection = RESPConnection(self.host, self.port)
+        return self.connection
+
+    async def refresh(self):
+        """Apply the writes other workers pushed since the last refresh"""
+        started = self.pulls
+        async with self.refresh_lock:
+            if self.pulls > started:
+                # A pull that started after this call has finished; it saw everything this one would
+                self.coalesced += 1
+                return
+            await self.pull()
+
+    async def pull(self):
+        self.pulls += 1
+        while True:
+            epoch, trimmed, entries = (await self.get_connection().execute(
+                ("MULTI",),
+                ("GET", self.epoch_key),
+                ("GET", self.trimmed_key),
+                ("LRANGE", self.changes_key, max(self.seq - self.trimmed, 0), -1),
+                ("EXEC",),
+            ))[-1]
+            trimmed = int(trimmed or 0)
+            if epoch != self.epoch or trimmed > self.seq:
+                await self.resync(epoch)
+                return
+            if trimmed == self.trimmed:
+                break
+            # Trimmed since the last read, so the range started at the wrong entry
+            self.trimmed = trimmed
+        self.apply_entries(entries)
+
+    async def sync(self):
+        """Push this worker's writes, then pick up everyone else's"""
+        if self.pending:
+            pending, self.pending = self.pending, []
+            entries = [self.worker_id + frame for _, _, frame in pending]
+            commands = [("MULTI",), ("GET", self.trimmed_key), ("RPUSH", self.changes_key, *entries)]
+            for table, key, frame in pending:
+                if frame[FRAME_HEADER.size] == PUT:
+                    commands.append(("HSET", self.table_keys[table], key, frame))
+                else:
+                    commands.append(("HDEL", self.table_keys[table], key))
+            commands.append(("EXEC",))
+            try:
+                trimmed, length = (await self.get_connection().execute(*commands))[-1][:2]
+            except BaseException:
+                # Retried with the next sync; a write that did land is pushed twice, which is harmless
+                self.pending[:0] = pending
+                raise
+            for table, key, _ in pending:
+                count = self.unpushed.pop((table, key)) - 1
+                if count:
+                    self.unpushed[(table, key)] = count
+            first = int(trimmed or 0) + length - len(pending) + 1
+            for position, (table, key, _) in enumerate(pending, first):
+                self.written[(table, key)] = position
+            self.pushes += 1
+            self.pushed += len(pending)
+            if length > 2 * self.max_changes:
+                excess = length - self.max_changes
+                await self.get_connection().execute(
+                    ("MULTI",), ("LTRIM", self.changes_key, excess, -1), ("INCRBY", self.trimmed_key, excess), ("EXEC",)
+                )
+                self.trims += 1
+        await self.refresh()
+
+    def apply_entries(self, entries: List[bytes]):
+        id_length = len(self.worker_id)
+        decoded = []
+        # (table, key) -> index of its last entry; only a record's final state in the batch is applied
+        latest: Dict[Tuple[str, str], int] = {}
+        for index, entry in enumerate(entries):
+            payload = next(iter_frames(entry, id_length))[2]
+            op, table, key, value_start = parse_payload(payload)
+            decoded.append((entry[:id_length], op, table, key, payload, value_start))
+            latest[(table, key)] = index
+        for index, (author, op, table, key, payload, value_start) in enumerate(decoded):
+            if latest[(table, key)] != index:
+                continue
+            position = self.seq + index + 1
+            written = self.written.get((table, key))
+            if written is not None and written > position:
+                # This worker wrote the record again after this entry; its dicts already have the newer write
+                continue
+            follower = self.followers.get(table)
+            value = pickle.loads(payload[value_start:]) if op == PUT and (follower or author != self.worker_id) else None
+            if written is not None:
+                del self.written[(table, key)]
+            if written == position and author == self.worker_id:
+                # This worker's own latest write, already in its dicts
+                self.skipped_own += 1
+            else:
+                self.apply(table, key, value)
+            if follower is not None:
+                follower[0](key, position, value)
+        self.seq += len(entries)
+
+    def apply(self, table: str, key: str, value: Any):
+        if (table, key) in self.unpushed:
+            # A newer local write is about to be pushed after this one
+            return
+        rows = self.tables[table]
+        old = rows.get(key)
+        if value is None:
+            if old is None:
+                return
+            del rows[key]
+        else:
+            rows[key] = value
+        self.applied += 1
+        watcher = self.watchers.get(table)
+        if watcher is not None:
+            watcher(key, old, value)
+
+    async def resync(self, epoch: Optional[bytes]):
+        """Reload the server's tables, or upload this worker's if the server lost them"""
+        self.resyncs += 1
+        connection = self.get_connection()
+        if epoch is None:
+            new_epoch = uuid.uuid4().hex.encode()
+            if (await connection.execute(("SET", self.epoch_key, new_epoch, "NX")))[0] == "OK":
+                await connection.execute(*self.upload_commands())
+                self.joined(new_epoch, 0)
+                return
+        while (await connection.execute(("GET", self.ready_key)))[0] is None:
+            await asyncio.sleep(0.05)
+        self.apply_download((await connection.execute(*self.download_commands()))[-1])
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "server": f"{self.host}:{self.port}",
+            "worker_id": self.worker_id.decode(),
+            "records": sum(len(table) for table in self.tables.values()),
+            "seq": self.seq,
+            "pending": len(self.pending),
+            "pushes": self.pushes,
+            "pushed": self.pushed,
+            "pulls": self.pulls,
+            "coalesced": self.coalesced,
+            "applied": self.applied,
+            "skipped_own": self.skipped_own,
+            "trims": self.trims,
+            "uploads": self.uploads,
+            "resyncs": self.resyncs,
+        }
+
+class SharedStateServer:
+    """In-memory stand-in for the subset of Redis that SharedStore uses"""
+
+    def __init__(self):
+        self.data: Dict[bytes, Any] = {}
+        self.connections = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        parser = RESPParser()
+        transaction: Optional[List[List[bytes]]] = None
+        try:
+            while True:
+                data = await reader.read(1 << 20)
+                if not data:
+                    break
+                parser.feed(data)
+                replies = []
+                while True:
+                    complete, command = parser.pop()
+                    if not complete:
+                        break
+                    name = command[0].upper()
+                    if name == b"MULTI":
+                        transaction = []
+                        replies.append("OK")
+                    elif name == b"EXEC":
+                        # Nothing else runs between queued commands: the server is single-threaded
+                        replies.append([self.execute(queued) for queued in transaction or []])
+                        transaction = None
+                    elif name == b"DISCARD":
+                        transaction = None
+                        replies.append("OK")
+                    elif transaction is not None:
+                        transaction.append(command)
+                        replies.append("QUEUED")
+                    else:
+                        replies.append(self.execute(command))
+                writer.write(b"".join(encode_reply(reply) for reply in replies))
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def execute(self, command: List[bytes]) -> Any:
+        name = command[0].decode().lower()
+        handler = getattr(self, f"command_{name}", None)
+        if handler is None:
+            return RESPError(f"ERR unknown command '{name}'")
+        try:
+            return handler(*command[1:])
+        except TypeError:
+            return RESPError(f"ERR wrong number of arguments for '{name}' command")
+        except WrongType:
+            return RESPError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        except ValueError:
+            return RESPError("ERR value is not an integer or out of range")
+
+    def typed(self, key: bytes, kind: type, create: bool = False):
+        value = self.data.get(key)
+        if value is None:
+            if create:
+                value = self.data[key] = kind()
+        elif not isinstance(value, kind):
+            raise WrongType()
+        return value
+
+    def command_ping(self, *args):
+        return args[0] if args else "PONG"
+
+    def command_dbsize(self):
+        return len(self.data)
+
+    def command_flushall(self, *options):
+        self.data.clear()
+        return "OK"
+
+    def command_del(self, *keys):
+        if not keys:
+            raise TypeError()
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    # Strings
+    def command_get(self, key):
+        return self.typed(key, bytes)
+
+    def command_set(self, key, value, *options):
+        if b"NX" in (option.upper() for option in options) and key in self.data:
+            return None
+        self.data[key] = value
+        return "OK"
+
+    def command_incrby(self, key, amount):
+        value = int(self.typed(key, bytes) or 0) + int(amount)
+        self.data[key] = b"%d" % value
+        return value
+
+    def command_incr(self, key):
+        return self.command_incrby(key, b"1")
+
+    # Lists
+    def command_rpush(self, key, *values):
+        if not values:
+            raise TypeError()
+        items = self.typed(key, list, create=True)
+        items.extend(values)
+        return len(items)
+
+    def command_llen(self, key):
+        return len(self.typed(key, list) or ())
+
+    def command_lrange(self, key, start, stop):
+        items = self.typed(key, list) or []
+        start, stop = int(start), int(stop)
+        if start < 0:
+            start = max(start + len(items), 0)
+        if stop < 0:
+            stop += len(items)
+        return items[start:stop + 1]
+
+    def command_ltrim(self, key, start, stop):
+        items = self.typed(key, list)
+        if items is not None:
+            items[:] = self.command_lrange(key, start, stop)
+            if not items:
+                del self.data[key]
+        return "OK"
+
+    # Hashes
+    def command_hset(self, key, *fields):
+        if not fields or len(fields) % 2:
+            raise TypeError()
+        table = self.typed(key, dict, create=True)
+        added = 0
+        for index in range(0, len(fields), 2):
+            added += fields[index] not in table
+            table[fields[index]] = fields[index + 1]
+        return added
+
+    def command_hget(self, key, field):
+        return (self.typed(key, dict) or {}).get(field)
+
+    def command_hdel(self, key, *fields):
+        table = self.typed(key, dict)
+        if table is None:
+            return 0
+        removed = sum(table.pop(field, None) is not None for field in fields)
+        if not table:
+            del self.data[key]
+        return removed
+
+    def command_hlen(self, key):
+        return len(self.typed(key, dict) or ())
+
+    def command_hgetall(self, key):
+        return [item for pair in (self.typed(key, dict) or {}).items() for item in pair]
+
+async def serve(host: str, port: int):
+    listener = await asyncio.start_server(SharedStateServer().handle, host, port)
+    print(f"Shared state server listening on {host}:{port}")
+    async with listener:
+        await listener.serve_forever()
+
+if __name__ == "__main__":
+    asyncio.run(serve(os.getenv("SHARED_STATE_HOST", "0.0.0.0"), int(os.getenv("SHARED_STATE_PORT", "6379"))))
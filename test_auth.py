@@ -1,8 +1,12 @@
+import base64
 import requests
 import json
+import time
 
 # Base URL for the API
 BASE_URL = "http://localhost:8000"
+# oauth_provider_stub.py; the auth service must run with OAUTH_VERIFIER=http pointed at it
+OAUTH_STUB_URL = "http://localhost:8010"
 
 def test_signup():
     """Test user signup"""
@@ -39,6 +43,57 @@ def test_login():
         return response.json()["access_token"]
     return None
 
+def test_login_email_case_insensitive():
+    """Test that login matches emails regardless of case"""
+    print("\nTesting case-insensitive email login...")
+    
+    login_data = {
+        "email": "John.Doe@Example.com",
+        "password": "securepassword123"
+    }
+    
+    response = requests.post(f"{BASE_URL}/login", json=login_data)
+    print(f"Case-insensitive Login Response: {response.status_code}")
+    print(f"Response: {response.json()}")
+    return response.status_code == 200
+
+def test_refresh_token():
+    """Test refresh token rotation"""
+    print("\nTesting token refresh...")
+    
+    login_data = {
+        "email": "john.doe@example.com",
+        "password": "securepassword123"
+    }
+    refresh_token = requests.post(f"{BASE_URL}/login", json=login_data).json()["refresh_token"]
+    
+    response = requests.post(f"{BASE_URL}/tokens/refresh", json={"refresh_token": refresh_token})
+    print(f"Refresh Response: {response.status_code}")
+    print(f"Response: {response.json()}")
+    
+    # A rotated refresh token must not be accepted again
+    reuse_response = requests.post(f"{BASE_URL}/tokens/refresh", json={"refresh_token": refresh_token})
+    print(f"Refresh Token Reuse Response: {reuse_response.status_code}")
+    return response.status_code == 200 and reuse_response.status_code == 401
+
+def test_revoke_token():
+    """Test that a revoked access token is rejected"""
+    print("\nTesting token revocation...")
+    
+    login_data = {
+        "email": "john.doe@example.com",
+        "password": "securepassword123"
+    }
+    access_token = requests.post(f"{BASE_URL}/login", json=login_data).json()["access_token"]
+    
+    response = requests.post(f"{BASE_URL}/tokens/revoke", json={"token": access_token})
+    print(f"Revoke Response: {response.status_code}")
+    
+    headers = {"Authorization": f"Bearer {access_token}"}
+    profile_response = requests.get(f"{BASE_URL}/profile", headers=headers)
+    print(f"Profile With Revoked Token: {profile_response.status_code}")
+    return profile_response.status_code == 401
+
 def test_oauth():
     """Test OAuth login"""
     print("\nTesting OAuth login...")
@@ -58,6 +113,39 @@ def test_oauth():
         return response.json()["access_token"]
     return None
 
+def test_oauth_provider_stub():
+    """Test OAuth login verified against the local provider stub"""
+    print("\nTesting OAuth login via provider stub...")
+    
+    email = f"stub-user-{int(time.time())}@example.com"
+    try:
+        issued = requests.post(f"{OAUTH_STUB_URL}/tokens", json={"provider": "google", "email": email})
+    except requests.exceptions.ConnectionError:
+        print("Provider stub not running, skipping")
+        return
+    
+    oauth_data = {
+        "provider": "google",
+        "access_token": issued.json()["access_token"],
+        "email": email,
+        "full_name": "Stub User"
+    }
+    response = requests.post(f"{BASE_URL}/oauth", json=oauth_data)
+    print(f"OAuth (stub) Response: {response.status_code}")
+    
+    # The same token must not log in a different account
+    oauth_data["email"] = "someone-else@example.com"
+    response = requests.post(f"{BASE_URL}/oauth", json=oauth_data)
+    print(f"OAuth (stub, wrong email) Response: {response.status_code}")
+
+    # A token issued to another application must not log in here either
+    issued = requests.post(
+        f"{OAUTH_STUB_URL}/tokens", json={"provider": "google", "email": email, "client_id": "another-app"}
+    )
+    oauth_data.update(email=email, access_token=issued.json()["access_token"])
+    response = requests.post(f"{BASE_URL}/oauth", json=oauth_data)
+    print(f"OAuth (stub, other client) Response: {response.status_code}")
+
 def test_enable_2fa(token):
     """Test enabling 2FA"""
     print("\nTesting 2FA enable...")
@@ -79,6 +167,36 @@ def test_profile(token):
     print(f"Profile Response: {response.status_code}")
     print(f"Response: {response.json()}")
 
+def test_introspect_tokens(token):
+    """Test validating a batch of tokens in one call"""
+    print("\nTesting token introspection...")
+    
+    introspect_data = {"tokens": [token, "not-a-valid-token", token]}
+    
+    response = requests.post(f"{BASE_URL}/tokens/introspect", json=introspect_data)
+    print(f"Introspection Response: {response.status_code}")
+    print(f"Response: {response.json()}")
+
+def test_delete_account():
+    """Test deleting an account, which drops its cached token claims"""
+    print("\nTesting account deletion...")
+    
+    signup_data = {"email": f"delete-me-{int(time.time())}@example.com", "password": "DeleteMe123!", "full_name": "Delete Me"}
+    token = requests.post(f"{BASE_URL}/signup", json=signup_data).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    # Verifying the token caches its claims
+    requests.get(f"{BASE_URL}/profile", headers=headers)
+    cached_before = requests.get(f"{BASE_URL}/metrics").json()["token_cache"]["size"]
+    
+    response = requests.delete(f"{BASE_URL}/profile", headers=headers)
+    print(f"Delete Account Response: {response.status_code}")
+    cached_after = requests.get(f"{BASE_URL}/metrics").json()["token_cache"]["size"]
+    print(f"Cached claims dropped (expect 1): {cached_before - cached_after}")
+    
+    response = requests.get(f"{BASE_URL}/profile", headers=headers)
+    print(f"Profile After Delete Response (expect 401): {response.status_code}")
+
 def test_list_users():
     """Test listing all users (debug endpoint)"""
     print("\nTesting user list...")
@@ -87,6 +205,56 @@ def test_list_users():
     print(f"Users Response: {response.status_code}")
     print(f"Response: {response.json()}")
 
+    response = requests.get(f"{BASE_URL}/users", params={"limit": 1})
+    next_cursor = response.json()["next_cursor"]
+    if next_cursor:
+        response = requests.get(f"{BASE_URL}/users", params={"cursor": next_cursor, "limit": 1})
+        print(f"Second page total (expect None): {response.json()['total_users']}")
+
+    negative_cursor = base64.urlsafe_b64encode(b"-5").decode()
+    response = requests.get(f"{BASE_URL}/users", params={"cursor": negative_cursor})
+    print(f"Negative Cursor Response (expect 400): {response.status_code}")
+
+def test_jwks():
+    """Test the public signing keys endpoint"""
+    print("\nTesting JWKS...")
+    
+    response = requests.get(f"{BASE_URL}/.well-known/jwks.json")
+    print(f"JWKS Response: {response.status_code}")
+    print(f"Key IDs: {[key['kid'] for key in response.json()['keys']]}")
+
+def test_stream_users():
+    """Test streaming the user list as NDJSON"""
+    print("\nTesting streamed user list...")
+    
+    response = requests.get(f"{BASE_URL}/users", params={"format": "ndjson"}, stream=True)
+    print(f"Stream Users Response: {response.status_code}")
+    users = [json.loads(line) for line in response.iter_lines() if line]
+    print(f"Streamed users: {len(users)}")
+
+def test_import_users():
+    """Test bulk user import from CSV"""
+    print("\nTesting bulk user import...")
+    
+    suffix = int(time.time())
+    body = "email,password,full_name\n"
+    body += f"import-a-{suffix}@example.com,securepassword123,Import A\n"
+    body += f"import-b-{suffix}@example.com,securepassword123,Import B\n"
+    body += "not-an-email,securepassword123,Broken Row\n"
+    
+    response = requests.post(f"{BASE_URL}/users/import", data=body, headers={"Content-Type": "text/csv"})
+    print(f"Import Users Response: {response.status_code}")
+    result = response.json()
+    print(f"Created: {result['created']}, Failed: {result['failed']}")
+
+def test_metrics():
+    """Test the operational metrics endpoint"""
+    print("\nTesting metrics...")
+    
+    response = requests.get(f"{BASE_URL}/metrics")
+    print(f"Metrics Response: {response.status_code}")
+    print(f"Response: {response.json()}")
+
 if __name__ == "__main__":
     print("Starting Authentication API Tests")
     print("=" * 50)
@@ -97,8 +265,16 @@ if __name__ == "__main__":
     # Test login
     login_token = test_login()
     
+    # Test email normalization
+    test_login_email_case_insensitive()
+    
+    # Test refresh and revocation
+    test_refresh_token()
+    test_revoke_token()
+    
     # Test OAuth
     oauth_token = test_oauth()
+    test_oauth_provider_stub()
     
     # Use the first available token for authenticated requests
     token = signup_token or login_token or oauth_token
@@ -109,9 +285,25 @@ if __name__ == "__main__":
         
         # Test profile
         test_profile(token)
+        
+        # Test batch introspection
+        test_introspect_tokens(token)
+    
+    # Test account deletion
+    test_delete_account()
     
     # Test user listing
     test_list_users()
+    test_stream_users()
+    
+    # Test bulk import
+    test_import_users()
+    
+    # Test public signing keys
+    test_jwks()
+    
+    # Test metrics
+    test_metrics()
     
     print("\n" + "=" * 50)
     print("Tests completed!")
\ No newline at end of file
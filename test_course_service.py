@@ -1,8 +1,12 @@
 import requests
 import json
+import threading
+import time
 
 # Base URL for the Course API
 BASE_URL = "http://localhost:8002"
+# The authentication service (main.py), for tests that need a real access token
+AUTH_URL = "http://localhost:8000"
 
 # Mock authentication tokens for testing
 MOCK_TOKENS = {
@@ -55,6 +59,25 @@ def test_get_course():
     print(f"Response: {json.dumps(response.json(), indent=2, default=str)}")
     return response.status_code == 200
 
+def test_conditional_get():
+    """Test that an unchanged course answers 304 and an updated one gets a new ETag"""
+    print("\nTesting conditional get...")
+    
+    course_id = "course_001"
+    response = requests.get(f"{BASE_URL}/courses/{course_id}")
+    etag = response.headers.get("ETag")
+    print(f"ETag: {etag}")
+    
+    response = requests.get(f"{BASE_URL}/courses/{course_id}", headers={"If-None-Match": etag})
+    print(f"Unchanged Course Response: {response.status_code}")
+    not_modified = response.status_code == 304 and response.headers.get("ETag") == etag
+    
+    headers = {"Authorization": f"Bearer {MOCK_TOKENS['instructor_001']}"}
+    requests.put(f"{BASE_URL}/courses/{course_id}/update", json={"duration_hours": 40}, headers=headers)
+    response = requests.get(f"{BASE_URL}/courses/{course_id}", headers={"If-None-Match": etag})
+    print(f"Updated Course Response: {response.status_code} (ETag: {response.headers.get('ETag')})")
+    return etag is not None and not_modified and response.status_code == 200 and response.headers.get("ETag") != etag
+
 def test_update_course():
     """Test updating a course"""
     print("\nTesting course update...")
@@ -76,6 +99,28 @@ def test_update_course():
     print(f"Response: {json.dumps(response.json(), indent=2, default=str)}")
     return response.status_code == 200
 
+def test_update_rejects_null():
+    """Test that fields a course cannot be without are not cleared by explicit nulls"""
+    print("\nTesting null updates...")
+    
+    headers = {"Authorization": f"Bearer {MOCK_TOKENS['instructor_001']}"}
+    response = requests.put(f"{BASE_URL}/courses/course_001/update", json={"price": None}, headers=headers)
+    print(f"Null Price Response: {response.status_code}")
+    rejected = response.status_code == 422
+    
+    items = [{"course_id": "course_001", "title": None}]
+    response = requests.post(f"{BASE_URL}/courses/batch/update", json=items, headers=headers)
+    print(f"Null Title Batch Response: {response.status_code}")
+    batch_rejected = response.status_code == 422 and not response.json()["applied"]
+    
+    response = requests.put(f"{BASE_URL}/courses/course_001/update", json={"duration_hours": None}, headers=headers)
+    cleared = response.status_code == 200 and response.json()["duration_hours"] is None
+    requests.put(f"{BASE_URL}/courses/course_001/update", json={"duration_hours": 55}, headers=headers)
+    
+    listed = requests.get(f"{BASE_URL}/courses").status_code == 200
+    course = requests.get(f"{BASE_URL}/courses/course_001").json()
+    return rejected and batch_rejected and cleared and listed and course["price"] is not None and course["title"] is not None
+
 def test_list_courses():
     """Test listing courses with filters"""
     print("\nTesting course listing...")
@@ -90,6 +135,11 @@ def test_list_courses():
     print(f"List Web Development Courses Response: {response.status_code}")
     print(f"Web development courses: {response.json().get('total', 0)}")
     
+    # Test sorting by rating
+    response = requests.get(f"{BASE_URL}/courses?sort=rating_high&limit=3")
+    print(f"List Top Rated Courses Response: {response.status_code}")
+    print(f"Top rated: {[course['rating'] for course in response.json().get('courses', [])]}")
+    
     # Test with level filter
     response = requests.get(f"{BASE_URL}/courses?level=beginner")
     print(f"List Beginner Courses Response: {response.status_code}")
@@ -97,6 +147,83 @@ def test_list_courses():
     
     return response.status_code == 200
 
+def test_range_filters():
+    """Test price and duration range filters"""
+    print("\nTesting range filters...")
+    
+    params = {"min_price": 80, "max_price": 100, "max_hours": 50}
+    response = requests.get(f"{BASE_URL}/courses", params=params)
+    print(f"Range Filter Response: {response.status_code}")
+    courses = response.json()["courses"]
+    print(f"Matched: {[(course['price'], course['duration_hours']) for course in courses]}")
+    in_range = all(
+        80 <= course["price"] <= 100 and course["duration_hours"] is not None and course["duration_hours"] <= 50
+        for course in courses
+    )
+    
+    response = requests.get(f"{BASE_URL}/courses", params={"min_price": 100, "max_price": 10})
+    print(f"Inverted Range Response: {response.status_code}")
+    return in_range and response.status_code == 400
+
+def test_cursor_pagination():
+    """Test walking the course list with cursors"""
+    print("\nTesting cursor pagination...")
+    
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = requests.get(f"{BASE_URL}/courses", params=params)
+        if response.status_code != 200:
+            print(f"Cursor Page Response: {response.status_code}")
+            return False
+        data = response.json()
+        seen.extend(course["course_id"] for course in data["courses"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+    
+    print(f"Courses seen across pages: {len(seen)} of {data['total']}")
+    return len(seen) == data["total"] and len(set(seen)) == len(seen)
+
+def test_search_courses():
+    """Test full-text course search"""
+    print("\nTesting course search...")
+    
+    response = requests.get(f"{BASE_URL}/courses/search", params={"q": "react development"})
+    print(f"Search Courses Response: {response.status_code}")
+    results = response.json()
+    print(f"Matches: {results.get('total', 0)}")
+    for course in results.get("courses", []):
+        print(f"  {course['score']:.3f}  {course['title']}")
+    
+    # Search combined with a filter
+    response = requests.get(f"{BASE_URL}/courses/search", params={"q": "design", "status": "published"})
+    print(f"Filtered Search Response: {response.status_code}")
+    
+    return response.status_code == 200
+
+def test_course_facets():
+    """Test facet counts agree with filtered listings"""
+    print("\nTesting course facets...")
+    
+    response = requests.get(f"{BASE_URL}/courses/facets", params={"status": "published"})
+    print(f"Facets Response: {response.status_code}")
+    print(f"Response: {json.dumps(response.json(), indent=2, default=str)}")
+    facets = response.json()
+    
+    published = requests.get(f"{BASE_URL}/courses", params={"status": "published"}).json()["total"]
+    design = requests.get(f"{BASE_URL}/courses", params={"status": "published", "category": "design"}).json()["total"]
+    drafts = requests.get(f"{BASE_URL}/courses", params={"status": "draft"}).json()["total"]
+    return (
+        response.status_code == 200
+        and facets["total"] == published
+        and facets["facets"]["category"]["design"] == design
+        and facets["facets"]["status"]["draft"] == drafts
+    )
+
 def test_my_courses():
     """Test getting instructor's own courses"""
     print("\nTesting my courses...")
@@ -130,6 +257,95 @@ def test_publish_course():
     print(f"Response: {json.dumps(response.json(), indent=2, default=str)}")
     return response.status_code == 200
 
+def test_batch_operations():
+    """Test batch create and update, and that an invalid item rejects the whole batch"""
+    print("\nTesting batch operations...")
+    
+    headers = {"Authorization": f"Bearer {MOCK_TOKENS['instructor_002']}"}
+    new_courses = [
+        {"title": f"Batch Course {i}", "description": "Created in a batch.", "category": "design", "level": "beginner"}
+        for i in range(3)
+    ]
+    response = requests.post(f"{BASE_URL}/courses/batch/create", json=new_courses, headers=headers)
+    print(f"Batch Create Response: {response.status_code}")
+    created = response.status_code == 200 and response.json()["succeeded"] == 3
+    course_ids = [result["course_id"] for result in response.json()["results"]]
+    
+    ndjson = "\n".join(json.dumps({"course_id": course_id, "price": 15.0}) for course_id in course_ids)
+    response = requests.post(
+        f"{BASE_URL}/courses/batch/update", data=ndjson,
+        headers={**headers, "Content-Type": "application/x-ndjson"}
+    )
+    print(f"Batch Update Response: {response.status_code}")
+    updated = response.status_code == 200 and requests.get(f"{BASE_URL}/courses/{course_ids[0]}").json()["price"] == 15.0
+    
+    # course_001 belongs to another instructor, so nothing in this batch may be applied
+    items = [{"course_id": course_ids[0], "price": 20.0}, {"course_id": "course_001", "price": 1.0}]
+    response = requests.post(f"{BASE_URL}/courses/batch/update", json=items, headers=headers)
+    print(f"Rejected Batch Response: {response.status_code}")
+    print(f"Response: {json.dumps(response.json(), indent=2, default=str)}")
+    rejected = response.status_code == 422 and not response.json()["applied"]
+    unchanged = requests.get(f"{BASE_URL}/courses/{course_ids[0]}").json()["price"] == 15.0
+    
+    return created and updated and rejected and unchanged
+
+def test_enrollment():
+    """Test enrolling in a course, duplicate enrollment and the live count"""
+    print("\nTesting enrollment...")
+    
+    headers = {"Authorization": "Bearer mock_token_user_005"}
+    course_id = "course_002"
+    before = requests.get(f"{BASE_URL}/courses/{course_id}/enrollments").json()["enrollment_count"]
+    
+    response = requests.post(f"{BASE_URL}/courses/{course_id}/enroll", headers=headers)
+    print(f"Enroll Response: {response.status_code}")
+    print(f"Response: {json.dumps(response.json(), indent=2, default=str)}")
+    enrolled = response.status_code == 200 and response.json()["enrollment_count"] == before + 1
+    
+    response = requests.post(f"{BASE_URL}/courses/{course_id}/enroll", headers=headers)
+    print(f"Duplicate Enroll Response: {response.status_code}")
+    duplicate_rejected = response.status_code == 409
+    
+    response = requests.post(f"{BASE_URL}/courses/{course_id}/enroll", headers={"Authorization": "Bearer mock_token_nobody"})
+    print(f"Unknown Mock User Response: {response.status_code}")
+    unknown_rejected = response.status_code == 401
+    
+    live_count = requests.get(f"{BASE_URL}/courses/{course_id}/enrollments").json()["enrollment_count"]
+    return enrolled and duplicate_rejected and unknown_rejected and live_count == before + 1
+
+def test_change_feed():
+    """Test following the change feed: reset, long-poll wake-up and the change itself"""
+    print("\nTesting change feed...")
+    
+    headers = {"Authorization": f"Bearer {MOCK_TOKENS['instructor_001']}"}
+    course_id = "course_001"
+    
+    # An unknown epoch forces a reset, which hands back the current position
+    response = requests.get(f"{BASE_URL}/changes", params={"since": 0, "epoch": "unknown"})
+    print(f"Reset Response: {response.status_code}")
+    feed = response.json()
+    reset = feed["reset"] and feed["changes"] == []
+    
+    # Update the course while a long-poll is waiting for the next change
+    update = threading.Timer(0.5, requests.put, args=(f"{BASE_URL}/courses/{course_id}/update",), kwargs={
+        "json": {"price": 119.99}, "headers": headers
+    })
+    update.start()
+    started_at = time.perf_counter()
+    response = requests.get(
+        f"{BASE_URL}/changes", params={"since": feed["next_since"], "epoch": feed["epoch"], "timeout": 10}
+    )
+    waited = time.perf_counter() - started_at
+    update.join()
+    changes = response.json()["changes"]
+    print(f"Long-poll Response: {response.status_code} after {waited:.2f}s")
+    print(f"Changes: {json.dumps(changes, indent=2)}")
+    
+    woke = response.status_code == 200 and waited < 5
+    return reset and woke and len(changes) == 1 and changes[0]["op"] == "update" \
+        and changes[0]["course_id"] == course_id and changes[0]["course"]["price"] == 119.99 \
+        and changes[0]["seq"] == response.json()["next_since"]
+
 def test_delete_course(course_id):
     """Test deleting a course"""
     print(f"\nTesting course deletion for course {course_id}...")
@@ -164,6 +380,33 @@ def test_get_metadata():
     
     return response.status_code == 200
 
+def test_auth_service_token():
+    """Test an auth service account: it may enroll but not author, and its revoked token is rejected"""
+    print("\nTesting auth service token...")
+    
+    signup = {"email": f"revoke-{int(time.time() * 1000)}@example.com", "password": "RevokeMe123!", "full_name": "Revoke Test"}
+    try:
+        access_token = requests.post(f"{AUTH_URL}/signup", json=signup).json()["access_token"]
+    except requests.exceptions.ConnectionError:
+        print("Auth service not running, skipping")
+        return True
+    headers = {"Authorization": f"Bearer {access_token}"}
+    
+    response = requests.post(f"{BASE_URL}/courses/course_001/enroll", headers=headers)
+    print(f"Enroll Before Revoke: {response.status_code}")
+    accepted = response.status_code == 200
+    
+    response = requests.get(f"{BASE_URL}/my-courses", headers=headers)
+    print(f"Instructor Endpoint (expect 403): {response.status_code}")
+    not_instructor = response.status_code == 403
+    
+    requests.post(f"{AUTH_URL}/tokens/revoke", json={"token": access_token})
+    # Verifiers poll the revocation list every REVOCATION_REFRESH_SECONDS (5 by default)
+    time.sleep(6)
+    response = requests.post(f"{BASE_URL}/courses/course_003/enroll", headers=headers)
+    print(f"Enroll After Revoke: {response.status_code}")
+    return accepted and not_instructor and response.status_code == 401
+
 def test_unauthorized_access():
     """Test unauthorized access scenarios"""
     print("\nTesting unauthorized access...")
@@ -192,11 +435,21 @@ if __name__ == "__main__":
     
     tests = [
         ("Get Course", test_get_course),
+        ("Conditional Get", test_conditional_get),
         ("Update Course", test_update_course),
+        ("Update Rejects Null", test_update_rejects_null),
         ("List Courses", test_list_courses),
+        ("Range Filters", test_range_filters),
+        ("Cursor Pagination", test_cursor_pagination),
+        ("Search Courses", test_search_courses),
+        ("Course Facets", test_course_facets),
         ("My Courses", test_my_courses),
         ("Publish Course", test_publish_course),
+        ("Batch Operations", test_batch_operations),
+        ("Enrollment", test_enrollment),
+        ("Change Feed", test_change_feed),
         ("Get Metadata", test_get_metadata),
+        ("Auth Service Token", test_auth_service_token),
         ("Unauthorized Access", test_unauthorized_access)
     ]
     
@@ -0,0 +1,224 @@
+import asyncio
+import errno
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from enum import Enum
+
+from durable_store import DurableStore, register_enums
+
+class Level(str, Enum):
+    BEGINNER = "beginner"
+    ADVANCED = "advanced"
+
+register_enums([Level])
+
+SEED = {
+    "course_001": {"title": "Complete Web Development Bootcamp", "level": Level.BEGINNER, "created_at": datetime(2024, 1, 15)},
+    "course_002": {"title": "Data Science with Python", "level": Level.ADVANCED, "created_at": datetime(2024, 1, 10)},
+}
+
+def open_store(data_dir, courses, **options):
+    store = DurableStore("courses", {"courses": courses}, data_dir, **options)
+    return store, store.load()
+
+def reload(data_dir, courses):
+    """Load a closed store into ``courses`` as a restart would, then close it again"""
+    store, loaded = open_store(data_dir, courses)
+    store.close()
+    return store, loaded
+
+def test_seed_and_restart():
+    """Test that seed data becomes the first snapshot and writes survive a restart"""
+    print("\nTesting seed data and restart...")
+    data_dir = tempfile.mkdtemp()
+    try:
+        courses = {key: dict(value) for key, value in SEED.items()}
+        store, loaded = open_store(data_dir, courses)
+        courses["course_003"] = {"title": "UI/UX Design Fundamentals", "level": Level.BEGINNER, "tags": ["design"]}
+        store.put("courses", "course_003", courses["course_003"])
+        courses["course_001"]["title"] = "Complete Web Development Bootcamp (Updated)"
+        store.put("courses", "course_001", courses["course_001"])
+        del courses["course_002"]
+        store.delete("courses", "course_002")
+        store.close()
+
+        restored = {"stale": {}}
+        _, reloaded = reload(data_dir, restored)
+        print(f"First load found data: {loaded}, second: {reloaded}")
+        print(f"Restored: {restored}")
+        return not loaded and reloaded and restored == courses and restored["course_001"]["level"] is Level.BEGINNER
+    finally:
+        shutil.rmtree(data_dir)
+
+def test_torn_tail():
+    """Test that a record cut off by a crash is dropped and later appends still load"""
+    print("\nTesting recovery from a torn log record...")
+    data_dir = tempfile.mkdtemp()
+    try:
+        courses = {key: dict(value) for key, value in SEED.items()}
+        store, _ = open_store(data_dir, courses)
+        store.put("courses", "course_003", {"title": "Kept"})
+        store.put("courses", "course_004", {"title": "Torn"})
+        store.close()
+        segment = store.segment_path(store.segment)
+        with open(segment, "r+b") as segment_file:
+            segment_file.truncate(os.path.getsize(segment) - 3)
+
+        restored = {}
+        store, _ = open_store(data_dir, restored)
+        store.put("courses", "course_005", {"title": "After the crash"})
+        store.close()
+        restored_again = {}
+        reload(data_dir, restored_again)
+        print(f"Restored ids: {sorted(restored_again)}")
+        return sorted(restored_again) == ["course_001", "course_002", "course_003", "course_005"]
+    finally:
+        shutil.rmtree(data_dir)
+
+def test_corrupt_earlier_segment():
+    """Test that a corrupt record before the newest segment stops the load instead of leaving a gap"""
+    print("\nTesting a corrupt record in an earlier segment...")
+    data_dir = tempfile.mkdtemp()
+    try:
+        courses = {key: dict(value) for key, value in SEED.items()}
+        store, _ = open_store(data_dir, courses)
+        store.put("courses", "course_003", {"title": "Earlier"})
+        store.put("courses", "course_004", {"title": "Earlier"})
+        store.close()
+        earlier = store.segment_path(store.segment)
+        shutil.copy(earlier, store.segment_path(store.segment + 1))
+        with open(earlier, "r+b") as segment_file:
+            segment_file.seek(os.path.getsize(earlier) - 1)
+            segment_file.write(b"\xff")
+
+        try:
+            open_store(data_dir, {})
+        except ValueError as exc:
+            print(f"Load refused: {exc}")
+            return True
+        return False
+    finally:
+        shutil.rmtree(data_dir)
+
+def test_snapshot_folds_log():
+    """Test that snapshots replace the log segments and keep only the latest record per key"""
+    print("\nTesting snapshots...")
+    data_dir = tempfile.mkdtemp()
+    try:
+        courses = {}
+        store, _ = open_store(data_dir, courses, snapshot_wal_bytes=4096)
+        for i in range(2000):
+            key = f"course_{i % 300:03d}"
+            courses[key] = {"title": f"Course {i}", "revision": i}
+            store.put("courses", key, courses[key])
+            if i % 7 == 0:
+                courses.pop(f"course_{(i * 3) % 300:03d}", None)
+                store.delete("courses", f"course_{(i * 3) % 300:03d}")
+        store.snapshot()
+        stats = store.stats()
+        store.close()
+
+        restored = {}
+        store, _ = reload(data_dir, restored)
+        print(f"Snapshots: {stats['snapshots']}, records in last snapshot: {stats['snapshot_records']}, "
+              f"segments left: {len(store.segments())}")
+        return restored == courses and stats["snapshots"] >= 1 and stats["snapshot_records"] == len(courses) \
+            and store.replayed_records == 0
+    finally:
+        shutil.rmtree(data_dir)
+
+def test_group_commit():
+    """Test that concurrent writers are acknowledged only after their records are written, sharing commits"""
+    print("\nTesting group commit...")
+    data_dir = tempfile.mkdtemp()
+    try:
+        courses = {}
+        store, _ = open_store(data_dir, courses)
+
+        async def writer(worker):
+            for i in range(50):
+                key = f"course_{worker}_{i}"
+                courses[key] = {"title": key}
+                store.put("courses", key, courses[key])
+                await store.sync()
+
+        async def run():
+            await asyncio.gather(*(writer(worker) for worker in range(20)))
+
+        asyncio.run(run())
+        stats = store.stats()
+        store.close()
+        print(f"Records: {stats['records']}, commits: {stats['commits']}, per commit: {stats['records_per_commit']}")
+        restored = {}
+        reload(data_dir, restored)
+        return restored == courses and stats["commits"] < 1000 and stats["pending"] == 0
+    finally:
+        shutil.rmtree(data_dir)
+
+def test_write_failure():
+    """Test that a segment or snapshot that cannot be written fails the waiting writes instead of hanging them"""
+    print("\nTesting write failures...")
+    data_dir = tempfile.mkdtemp()
+    outcomes = {}
+    try:
+        for failing in ("open_segment", "compact"):
+            courses = {}
+            store, _ = open_store(data_dir, courses, snapshot_wal_bytes=512)
+
+            def no_space(*args):
+                raise OSError(errno.ENOSPC, "No space left on device")
+            setattr(store, failing, no_space)
+
+            async def write():
+                for i in range(100):
+                    store.put("courses", f"course_{i:03d}", {"title": "x" * 100})
+                    await asyncio.wait_for(store.sync(), 5)
+
+            try:
+                asyncio.run(write())
+                outcomes[failing] = "acknowledged"
+            except OSError:
+                outcomes[failing] = "failed"
+            except asyncio.TimeoutError:
+                outcomes[failing] = "hung"
+            try:
+                store.snapshot()
+            except OSError:
+                outcomes[failing] += ", snapshot failed"
+            store.close()
+            shutil.rmtree(data_dir)
+            os.makedirs(data_dir)
+        print(f"Outcomes: {outcomes}")
+        return all(outcome == "failed, snapshot failed" for outcome in outcomes.values())
+    finally:
+        shutil.rmtree(data_dir)
+
+if __name__ == "__main__":
+    print("Starting Durable Store Tests")
+    print("=" * 60)
+
+    tests = [
+        ("Seed and Restart", test_seed_and_restart),
+        ("Torn Tail", test_torn_tail),
+        ("Corrupt Earlier Segment", test_corrupt_earlier_segment),
+        ("Snapshot Folds Log", test_snapshot_folds_log),
+        ("Group Commit", test_group_commit),
+        ("Write Failure", test_write_failure),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        try:
+            result = test_func()
+            results.append((test_name, "PASS" if result else "FAIL"))
+        except Exception as e:
+            print(f"Error in {test_name}: {e}")
+            results.append((test_name, "ERROR"))
+
+    print("\n" + "=" * 60)
+    print("Test Results Summary:")
+    print("=" * 60)
+    for test_name, status in results:
+        print(f"{test_name:<25} {status}")
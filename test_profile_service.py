@@ -23,6 +23,25 @@ def test_get_profile():
     print(f"Response: {json.dumps(response.json(), indent=2, default=str)}")
     return response.status_code == 200
 
+def test_conditional_get():
+    """Test that an unchanged profile answers 304 and an updated one gets a new ETag"""
+    print("\nTesting conditional get...")
+    
+    user_id = "user_005"
+    response = requests.get(f"{BASE_URL}/profile/{user_id}")
+    etag = response.headers.get("ETag")
+    print(f"ETag: {etag}")
+    
+    response = requests.get(f"{BASE_URL}/profile/{user_id}", headers={"If-None-Match": etag})
+    print(f"Unchanged Profile Response: {response.status_code}")
+    not_modified = response.status_code == 304 and response.headers.get("ETag") == etag
+    
+    headers = {"Authorization": f"Bearer {MOCK_TOKENS[user_id]}"}
+    requests.put(f"{BASE_URL}/profile/update", json={"bio": "Lifelong learner."}, headers=headers)
+    response = requests.get(f"{BASE_URL}/profile/{user_id}", headers={"If-None-Match": etag})
+    print(f"Updated Profile Response: {response.status_code} (ETag: {response.headers.get('ETag')})")
+    return etag is not None and not_modified and response.status_code == 200 and response.headers.get("ETag") != etag
+
 def test_get_complete_profile():
     """Test getting complete user profile with settings"""
     print("\nTesting get complete profile...")
@@ -160,6 +179,7 @@ if __name__ == "__main__":
     
     tests = [
         ("Get Profile", test_get_profile),
+        ("Conditional Get", test_conditional_get),
         ("Get Complete Profile", test_get_complete_profile),
         ("Update Profile", test_update_profile),
         ("Get Settings", test_get_settings),
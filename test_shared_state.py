@@ -0,0 +1,211 @@
+import asyncio
+import threading
+from datetime import datetime
+
+from shared_state import BlockingRESPConnection, SharedStateServer, SharedStore
+
+SEED = {
+    "course_001": {"course_id": "course_001", "title": "Complete Web Development Bootcamp", "created_at": datetime(2024, 1, 15)},
+    "course_002": {"course_id": "course_002", "title": "Data Science with Python", "created_at": datetime(2024, 1, 10)},
+}
+
+def start_server():
+    """Run a stand-in server on a free port in a background thread; returns its URL"""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    ports = []
+
+    async def serve():
+        listener = await asyncio.start_server(SharedStateServer().handle, "127.0.0.1", 0)
+        ports.append(listener.sockets[0].getsockname()[1])
+        ready.set()
+        await listener.serve_forever()
+
+    threading.Thread(target=loop.run_until_complete, args=(serve(),), daemon=True).start()
+    ready.wait()
+    return f"redis://127.0.0.1:{ports[0]}/test"
+
+def worker(url, seed=SEED, **options):
+    """A worker's courses table, its store and the watcher calls it has seen"""
+    courses = {key: dict(value) for key, value in seed.items()}
+    store = SharedStore("courses", {"courses": courses}, url, **options)
+    changes = []
+    store.watch("courses", lambda key, old, new: changes.append((key, old is not None, new is not None)))
+    return courses, store, changes, store.load()
+
+def test_join():
+    """Test that the first worker uploads its tables and later workers download them"""
+    print("\nTesting workers joining...")
+    url = start_server()
+    first, _, _, first_found = worker(url)
+    second, _, changes, second_found = worker(url, seed={"course_999": {"course_id": "course_999", "title": "Stale"}})
+    print(f"First found data: {first_found}, second: {second_found}, second has: {sorted(second)}")
+    return not first_found and second_found and second == first and not changes
+
+def test_replication():
+    """Test that puts and deletes reach other workers and their watchers, and own writes are not re-applied"""
+    print("\nTesting replication between workers...")
+    url = start_server()
+    a_courses, a_store, a_changes, _ = worker(url)
+    b_courses, b_store, b_changes, _ = worker(url)
+
+    async def run():
+        a_courses["course_001"]["title"] = "Updated by A"
+        a_store.put("courses", "course_001", a_courses["course_001"])
+        a_courses["course_003"] = {"course_id": "course_003", "title": "Created by A"}
+        a_store.put("courses", "course_003", a_courses["course_003"])
+        await a_store.sync()
+        del b_courses["course_002"]
+        b_store.delete("courses", "course_002")
+        await b_store.sync()
+        await a_store.refresh()
+
+    asyncio.run(run())
+    print(f"A: {a_courses}\nB: {b_courses}")
+    print(f"A saw {a_changes}, B saw {b_changes}")
+    return a_courses == b_courses and sorted(a_courses) == ["course_001", "course_003"] \
+        and a_changes == [("course_002", True, False)] \
+        and sorted(b_changes) == [("course_001", True, True), ("course_003", False, True)] \
+        and a_store.stats()["skipped_own"] == 2
+
+def test_unpushed_write_wins():
+    """Test that an older write from another worker does not overwrite a local write still waiting to be pushed"""
+    print("\nTesting unpushed local writes...")
+    url = start_server()
+    a_courses, a_store, _, _ = worker(url)
+    b_courses, b_store, _, _ = worker(url)
+
+    async def run():
+        a_courses["course_001"]["title"] = "Written by A first"
+        a_store.put("courses", "course_001", a_courses["course_001"])
+        await a_store.sync()
+        b_courses["course_001"]["title"] = "Written by B second"
+        b_store.put("courses", "course_001", b_courses["course_001"])
+        # Another request on B reads before this one has pushed
+        await b_store.refresh()
+        title_before_push = b_courses["course_001"]["title"]
+        await b_store.sync()
+        await a_store.refresh()
+        return title_before_push
+
+    title_before_push = asyncio.run(run())
+    print(f"B before its push: {title_before_push!r}, A after: {a_courses['course_001']['title']!r}")
+    return title_before_push == "Written by B second" and a_courses["course_001"]["title"] == "Written by B second"
+
+def test_concurrent_refreshes():
+    """Test that overlapping refreshes in one worker apply every write exactly once"""
+    print("\nTesting concurrent refreshes...")
+    url = start_server()
+    a_courses, a_store, _, _ = worker(url)
+    b_courses, b_store, _, _ = worker(url)
+
+    async def run():
+        for i in range(20):
+            key = f"course_{i % 5 + 100}"
+            a_courses[key] = {"course_id": key, "revision": i}
+            a_store.put("courses", key, a_courses[key])
+            await asyncio.gather(b_store.refresh(), a_store.sync(), b_store.refresh(), b_store.refresh())
+        await b_store.refresh()
+
+    asyncio.run(run())
+    print(f"Positions: A {a_store.seq}, B {b_store.seq}; B pulls {b_store.pulls}, coalesced {b_store.coalesced}")
+    return a_store.seq == b_store.seq == 20 and a_courses == b_courses
+
+def test_followers_agree():
+    """Test that every worker's follower sees the same writes at the same positions, its own included"""
+    print("\nTesting followers...")
+    url = start_server()
+    a_courses, a_store, _, _ = worker(url)
+    b_courses, b_store, _, _ = worker(url)
+    a_feed, b_feed = [], []
+    a_store.follow("courses", lambda key, position, record: a_feed.append((position, key, record is not None)), lambda *_: None)
+    b_store.follow("courses", lambda key, position, record: b_feed.append((position, key, record is not None)), lambda *_: None)
+
+    async def run():
+        for i in range(10):
+            courses, store = (a_courses, a_store) if i % 2 else (b_courses, b_store)
+            key = f"course_{i % 3 + 100}"
+            courses[key] = {"course_id": key, "revision": i}
+            store.put("courses", key, courses[key])
+            if i == 7:
+                del courses["course_001"]
+                store.delete("courses", "course_001")
+            await asyncio.gather(a_store.sync(), b_store.sync())
+        await asyncio.gather(a_store.refresh(), b_store.refresh())
+
+    asyncio.run(run())
+    print(f"A followed {len(a_feed)} writes, B {len(b_feed)}; last: {a_feed[-1:]}")
+    positions = [position for position, _, _ in a_feed]
+    return a_feed == b_feed and positions == sorted(positions) and ("course_001", False) in [(key, live) for _, key, live in a_feed] \
+        and a_courses == b_courses
+
+def test_trimmed_log_resync():
+    """Test that a worker that fell behind the trimmed change list reloads the tables"""
+    print("\nTesting resync after the change list is trimmed...")
+    url = start_server()
+    a_courses, a_store, _, _ = worker(url, max_changes=10)
+    b_courses, b_store, b_changes, _ = worker(url, max_changes=10)
+
+    async def run():
+        for i in range(50):
+            key = f"course_{i % 15 + 100}"
+            a_courses[key] = {"course_id": key, "revision": i}
+            a_store.put("courses", key, a_courses[key])
+            await a_store.sync()
+        await b_store.refresh()
+
+    asyncio.run(run())
+    print(f"A trims: {a_store.trims}, B resyncs: {b_store.resyncs}, records: {len(a_courses)} / {len(b_courses)}, "
+          f"B notified: {len(b_changes)}")
+    # Only the 15 written records changed; the seed records were downloaded again unchanged
+    return a_store.trims > 0 and b_store.resyncs == 1 and a_courses == b_courses and len(b_changes) == 15
+
+def test_server_restart():
+    """Test that a worker re-uploads its tables when the server comes back empty, and others follow"""
+    print("\nTesting recovery after the server loses its data...")
+    url = start_server()
+    a_courses, a_store, _, _ = worker(url)
+    b_courses, b_store, _, _ = worker(url)
+    host, port = url.split("//")[1].split("/")[0].split(":")
+    connection = BlockingRESPConnection(host, int(port))
+    connection.execute(("FLUSHALL",))
+    connection.close()
+
+    async def run():
+        a_courses["course_004"] = {"course_id": "course_004", "title": "Written after the restart"}
+        a_store.put("courses", "course_004", a_courses["course_004"])
+        await a_store.sync()
+        await b_store.refresh()
+
+    asyncio.run(run())
+    print(f"A uploads: {a_store.uploads}, B resyncs: {b_store.resyncs}, B has: {sorted(b_courses)}")
+    return a_store.uploads == 2 and b_store.resyncs == 1 and a_courses == b_courses
+
+if __name__ == "__main__":
+    print("Starting Shared State Tests")
+    print("=" * 60)
+
+    tests = [
+        ("Join", test_join),
+        ("Replication", test_replication),
+        ("Unpushed Write Wins", test_unpushed_write_wins),
+        ("Concurrent Refreshes", test_concurrent_refreshes),
+        ("Followers Agree", test_followers_agree),
+        ("Trimmed Log Resync", test_trimmed_log_resync),
+        ("Server Restart", test_server_restart),
+    ]
+
+    results = []
+    for test_name, test_func in tests:
+        try:
+            result = test_func()
+            results.append((test_name, "PASS" if result else "FAIL"))
+        except Exception as e:
+            print(f"Error in {test_name}: {e}")
+            results.append((test_name, "ERROR"))
+
+    print("\n" + "=" * 60)
+    print("Test Results Summary:")
+    print("=" * 60)
+    for test_name, status in results:
+        print(f"{test_name:<25} {status}")
@@ -0,0 +1,406 @@
+"""Storage backends for the authentication service's user accounts.
+
+``InMemoryUserStore`` keeps users in process memory (lost on restart, private
+to one worker). ``SQLiteUserStore`` persists them to a SQLite database in WAL
+mode that every uvicorn worker can share; queries run on a small thread pool
+with one pooled connection per thread, so they never block the event loop.
+"""
+import asyncio
+import os
+import queue
+import sqlite3
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# Configuration
+USER_STORE_BACKEND = os.getenv("USER_STORE_BACKEND", "memory")
+USER_DB_PATH = os.getenv("USER_DB_PATH", "users.db")
+USER_DB_POOL_SIZE = int(os.getenv("USER_DB_POOL_SIZE", "4"))
+
+# Columns that callers may change through update()
+UPDATABLE_FIELDS = {"email", "full_name", "hashed_password", "is_verified", "two_fa_enabled", "oauth_provider"}
+
+class DuplicateEmailError(Exception):
+    """Raised when adding or updating a user would reuse a registered email"""
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+def check_updatable(fields: Dict[str, Any]) -> None:
+    """Reject updates to columns outside UPDATABLE_FIELDS, the same way in every backend"""
+    unknown = set(fields) - UPDATABLE_FIELDS
+    if unknown:
+        raise ValueError(f"Cannot update fields: {sorted(unknown)}")
+
+def is_duplicate_email(error: sqlite3.IntegrityError) -> bool:
+    """Whether ``error`` is the unique email index failing, as opposed to another constraint"""
+    return "users.email_normalized" in str(error)
+
+class UserStore(ABC):
+    """Interface shared by the user storage backends.
+
+    Users are plain dicts; reads return them with their ``id`` included.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def existing_ids(self, user_ids: Iterable[str]) -> Set[str]:
+        ...
+
+    @abstractmethod
+    async def existing_emails(self, emails: Iterable[str]) -> Set[str]:
+        """The normalized forms of ``emails`` that are already registered"""
+
+    @abstractmethod
+    async def add(self, user_id: str, user_data: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    async def add_many(self, users: List[Dict[str, Any]]) -> None:
+        """Insert users (each carrying its ``id``) as one batch"""
+
+    @abstractmethod
+    async def update(self, user_id: str, fields: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, user_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def count(self) -> int:
+        ...
+
+    @abstractmethod
+    async def list_page(self, after: int, limit: int) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Users in insertion order whose position is past ``after`` (0 starts at the beginning).
+
+        Returns the page and the position to resume from, or None once the table is exhausted.
+        """
+
+    async def close(self) -> None:
+        pass
+
+class InMemoryUserStore(UserStore):
+    """Dict-backed store with a normalized-email -> id secondary index"""
+
+    name = "memory"
+
+    def __init__(self):
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.ids_by_email: Dict[str, str] = {}
+        # Insertion order for keyset pagination: ids and their positions (the cursor values),
+        # in parallel. Deleted users leave a None tombstone until _compact_order() drops it; positions
+        # are never reused, so cursors stay valid across compactions.
+        self.order: List[Optional[str]] = []
+        self.order_positions: List[int] = []
+        self.positions: Dict[str, int] = {}
+        self.last_position = 0
+        self.tombstones = 0
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        user = self.users.get(user_id)
+        if user is None:
+            return None
+        return {"id": user_id, **user}
+
+    async def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        user_id = self.ids_by_email.get(normalize_email(email))
+        if user_id is None:
+            return None
+        return {"id": user_id, **self.users[user_id]}
+
+    async def existing_ids(self, user_ids: Iterable[str]) -> Set[str]:
+        return {user_id for user_id in user_ids if user_id in self.users}
+
+    async def existing_emails(self, emails: Iterable[str]) -> Set[str]:
+        return {email_key for email_key in map(normalize_email, emails) if email_key in self.ids_by_email}
+
+    async def add(self, user_id: str, user_data: Dict[str, Any]) -> None:
+        email_key = normalize_email(user_data["email"])
+        if email_key in self.ids_by_email:
+            raise DuplicateEmailError(user_data["email"])
+        self.users[user_id] = dict(user_data)
+        self.ids_by_email[email_key] = user_id
+        self._append_order(user_id)
+
+    async def add_many(self, users: List[Dict[str, Any]]) -> None:
+        email_keys = [normalize_email(user["email"]) for user in users]
+        if len(set(email_keys)) != len(email_keys) or any(key in self.ids_by_email for key in email_keys):
+            raise DuplicateEmailError("batch contains a registered email")
+        for email_key, user in zip(email_keys, users):
+            user_data = {field: value for field, value in user.items() if field != "id"}
+            self.users[user["id"]] = user_data
+            self.ids_by_email[email_key] = user["id"]
+            self._append_order(user["id"])
+
+    def _append_order(self, user_id: str) -> None:
+        self.last_position += 1
+        self.order.append(user_id)
+        self.order_positions.append(self.last_position)
+        self.positions[user_id] = self.last_position
+
+    def _compact_order(self) -> None:
+        kept = [index for index, user_id in enumerate(self.order) if user_id is not None]
+        self.order = [self.order[index] for index in kept]
+        self.order_positions = [self.order_positions[index] for index in kept]
+        self.tombstones = 0
+
+    async def update(self, user_id: str, fields: Dict[str, Any]) -> None:
+        check_updatable(fields)
+        user = self.users[user_id]
+        if "email" in fields:
+            old_key, new_key = normalize_email(user["email"]), normalize_email(fields["email"])
+            if new_key != old_key:
+                if new_key in self.ids_by_email:
+                    raise DuplicateEmailError(fields["email"])
+                del self.ids_by_email[old_key]
+                self.ids_by_email[new_key] = user_id
+        user.update(fields)
+
+    async def delete(self, user_id: str) -> Optional[Dict[str, Any]]:
+        user = self.users.pop(user_id, None)
+        if user is None:
+            return None
+        self.ids_by_email.pop(normalize_email(user["email"]), None)
+        self.order[bisect_left(self.order_positions, self.positions.pop(user_id))] = None
+        self.tombstones += 1
+        if self.tombstones * 2 > len(self.order):
+            # Once most of the list is tombstones, pages would mostly scan deleted slots
+            self._compact_order()
+        return {"id": user_id, **user}
+
+    async def count(self) -> int:
+        return len(self.users)
+
+    async def list_page(self, after: int, limit: int) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        page = []
+        index = bisect_right(self.order_positions, after)
+        while index < len(self.order) and len(page) < limit:
+            user_id = self.order[index]
+            index += 1
+            if user_id is not None:
+                page.append({"id": user_id, **self.users[user_id]})
+        # Only hand out a cursor when a live user follows, not just tombstones
+        following = index
+        while following < len(self.order) and self.order[following] is None:
+            following += 1
+        return page, self.order_positions[index - 1] if following < len(self.order) else None
+
+class SQLiteUserStore(UserStore):
+    """SQLite (WAL mode) store with a connection pool and reusable prepared statements"""
+
+    name = "sqlite"
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            email TEXT NOT NULL,
+            email_normalized TEXT NOT NULL,
+            full_name TEXT NOT NULL,
+            hashed_password TEXT,
+            is_verified INTEGER NOT NULL,
+            two_fa_enabled INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            oauth_provider TEXT
+        )""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users (email_normalized)",
+    ]
+    COLUMNS = "id, email, full_name, hashed_password, is_verified, two_fa_enabled, created_at, oauth_provider"
+    SELECT_BY_ID = f"SELECT {COLUMNS} FROM users WHERE id = ?"
+    SELECT_BY_EMAIL = f"SELECT {COLUMNS} FROM users WHERE email_normalized = ?"
+    SELECT_PAGE = f"SELECT rowid, {COLUMNS} FROM users WHERE rowid > ? ORDER BY rowid LIMIT ?"
+    INSERT = (
+        "INSERT INTO users (id, email, email_normalized, full_name, hashed_password, "
+        "is_verified, two_fa_enabled, created_at, oauth_provider) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+    DELETE = "DELETE FROM users WHERE id = ?"
+    COUNT = "SELECT COUNT(*) FROM users"
+    # Batch size for IN (...) lookups, well under SQLite's bound-parameter limit
+    IN_BATCH_SIZE = 500
+
+    def __init__(self, path: str, pool_size: int = USER_DB_POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self.connections: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(pool_size):
+            self.connections.put(self._connect())
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="user-store")
+
+        connection = self.connections.get()
+        try:
+            with connection:
+                for statement in self.SCHEMA:
+                    connection.execute(statement)
+        finally:
+            self.connections.put(connection)
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 keeps a per-connection cache of prepared statements keyed by SQL text
+        connection = sqlite3.connect(self.path, check_same_thread=False, cached_statements=64)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA busy_timeout=5000")
+        return connection
+
+    async def _run(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        def with_connection():
+            connection = self.connections.get()
+            try:
+                return func(connection)
+            finally:
+                self.connections.put(connection)
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, with_connection)
+
+    @staticmethod
+    def _row_to_user(row) -> Dict[str, Any]:
+        return {
+            "id": row[0],
+            "email": row[1],
+            "full_name": row[2],
+            "hashed_password": row[3],
+            "is_verified": bool(row[4]),
+            "two_fa_enabled": bool(row[5]),
+            "created_at": datetime.fromisoformat(row[6]),
+            "oauth_provider": row[7],
+        }
+
+    @staticmethod
+    def _user_to_row(user_id: str, user_data: Dict[str, Any]) -> tuple:
+        return (
+            user_id,
+            user_data["email"],
+            normalize_email(user_data["email"]),
+            user_data["full_name"],
+            user_data.get("hashed_password"),
+            int(user_data.get("is_verified", False)),
+            int(user_data.get("two_fa_enabled", False)),
+            user_data["created_at"].isoformat(),
+            user_data.get("oauth_provider"),
+        )
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        row = await self._run(lambda connection: connection.execute(self.SELECT_BY_ID, (user_id,)).fetchone())
+        return self._row_to_user(row) if row else None
+
+    async def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        email_key = normalize_email(email)
+        row = await self._run(lambda connection: connection.execute(self.SELECT_BY_EMAIL, (email_key,)).fetchone())
+        return self._row_to_user(row) if row else None
+
+    async def _select_in(self, column: str, values: List[str]) -> Set[str]:
+        def query(connection):
+            found = set()
+            for start in range(0, len(values), self.IN_BATCH_SIZE):
+                batch = values[start:start + self.IN_BATCH_SIZE]
+                placeholders = ", ".join("?" * len(batch))
+                rows = connection.execute(f"SELECT {column} FROM users WHERE {column} IN ({placeholders})", batch)
+                found.update(row[0] for row in rows)
+            return found
+
+        return await self._run(query)
+
+    async def existing_ids(self, user_ids: Iterable[str]) -> Set[str]:
+        return await self._select_in("id", list(user_ids))
+
+    async def existing_emails(self, emails: Iterable[str]) -> Set[str]:
+        return await self._select_in("email_normalized", [normalize_email(email) for email in emails])
+
+    async def add(self, user_id: str, user_data: Dict[str, Any]) -> None:
+        row = self._user_to_row(user_id, user_data)
+
+        def insert(connection):
+            try:
+                with connection:
+                    connection.execute(self.INSERT, row)
+            except sqlite3.IntegrityError as exc:
+                if not is_duplicate_email(exc):
+                    raise
+                raise DuplicateEmailError(user_data["email"])
+
+        await self._run(insert)
+
+    async def add_many(self, users: List[Dict[str, Any]]) -> None:
+        rows = [self._user_to_row(user["id"], user) for user in users]
+
+        def insert(connection):
+            try:
+                with connection:
+                    connection.executemany(self.INSERT, rows)
+            except sqlite3.IntegrityError as exc:
+                if not is_duplicate_email(exc):
+                    raise
+                raise DuplicateEmailError("batch contains a registered email")
+
+        await self._run(insert)
+
+    async def update(self, user_id: str, fields: Dict[str, Any]) -> None:
+        check_updatable(fields)
+        values = dict(fields)
+        if "email" in values:
+            values["email_normalized"] = normalize_email(values["email"])
+        for flag in ("is_verified", "two_fa_enabled"):
+            if flag in values:
+                values[flag] = int(values[flag])
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        statement = f"UPDATE users SET {assignments} WHERE id = ?"
+        parameters = (*values.values(), user_id)
+
+        def execute(connection):
+            try:
+                with connection:
+                    connection.execute(statement, parameters)
+            except sqlite3.IntegrityError as exc:
+                if not is_duplicate_email(exc):
+                    raise
+                raise DuplicateEmailError(fields.get("email", ""))
+
+        await self._run(execute)
+
+    async def delete(self, user_id: str) -> Optional[Dict[str, Any]]:
+        def execute(connection):
+            with connection:
+                row = connection.execute(self.SELECT_BY_ID, (user_id,)).fetchone()
+                if row:
+                    connection.execute(self.DELETE, (user_id,))
+            return row
+
+        row = await self._run(execute)
+        return self._row_to_user(row) if row else None
+
+    async def count(self) -> int:
+        return await self._run(lambda connection: connection.execute(self.COUNT).fetchone()[0])
+
+    async def list_page(self, after: int, limit: int) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        # Fetch one extra row to learn whether another page exists
+        rows = await self._run(
+            lambda connection: connection.execute(self.SELECT_PAGE, (after, limit + 1)).fetchall()
+        )
+        page = [self._row_to_user(row[1:]) for row in rows[:limit]]
+        return page, rows[limit - 1][0] if len(rows) > limit else None
+
+    async def close(self) -> None:
+        self.executor.shutdown(wait=True)
+        while not self.connections.empty():
+            self.connections.get().close()
+
+def create_user_store(backend: str = USER_STORE_BACKEND) -> UserStore:
+    """Build the configured backend ("memory" or "sqlite")"""
+    if backend == "memory":
+        return InMemoryUserStore()
+    if backend == "sqlite":
+        return SQLiteUserStore(USER_DB_PATH)
+    raise ValueError(f"Unknown user store backend: {backend}")
@@ -0,0 +1,54 @@
+"""Write-behind counters: increments are buffered in memory and flushed in batches.
+
+Every request handler runs on the worker's event loop thread, so a single
+dictionary per counter takes the increments without a lock. A periodic flush
+collects what has accumulated since the last one and applies it to the
+records in one pass, instead of rewriting a record on every increment. Each
+uvicorn worker has its own buffer; with shared state the workers combine their
+counts through the shared store, not through this buffer.
+"""
+import time
+from typing import Any, Dict
+
+class WriteBehindCounter:
+    """Per-key counts buffered until the next collect(); used from the event loop thread only"""
+
+    def __init__(self, name: str):
+        self.name = name
+        # Increments since the previous collect()
+        self.buffered: Dict[str, int] = {}
+        # Cumulative count per key already returned by collect()
+        self.flushed: Dict[str, int] = {}
+        self.flushes = 0
+        self.flushed_total = 0
+        self.last_flush_ms = 0.0
+
+    def increment(self, key: str, amount: int = 1):
+        self.buffered[key] = self.buffered.get(key, 0) + amount
+
+    def pending(self, key: str) -> int:
+        """Increments for ``key`` not yet returned by collect()"""
+        return self.buffered.get(key, 0)
+
+    def collected(self, key: str) -> int:
+        """Increments for ``key`` already returned by collect()"""
+        return self.flushed.get(key, 0)
+
+    def collect(self) -> Dict[str, int]:
+        """Increments per key since the previous collect(), for writing to the records"""
+        started_at = time.perf_counter()
+        deltas, self.buffered = self.buffered, {}
+        for key, delta in deltas.items():
+            self.flushed[key] = self.flushed.get(key, 0) + delta
+        self.flushes += 1
+        self.flushed_total += sum(deltas.values())
+        self.last_flush_ms = (time.perf_counter() - started_at) * 1000
+        return deltas
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": sum(self.buffered.values()),
+            "flushes": self.flushes,
+            "flushed": self.flushed_total,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+        }